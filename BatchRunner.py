@@ -0,0 +1,67 @@
+from glob import glob, has_magic
+from os import cpu_count
+from pathlib import Path
+from time import perf_counter
+import sys
+
+
+# Expands glob patterns (shells on Windows do not do that for us); plain paths are kept as they are
+def expandPaths(patterns: list[str]):
+    paths: list[Path] = []
+    for pattern in patterns:
+        if has_magic(pattern):
+            matches = sorted(glob(pattern, recursive=True))
+            if len(matches) == 0: raise Exception("Pattern {0} did not match any file".format(pattern))
+            paths.extend(Path(m) for m in matches)
+        else:
+            paths.append(Path(pattern))
+    return paths
+
+# Called first by every tool entry point. Frozen (PyInstaller) executables start pool workers by
+# running the executable again, and freeze_support() makes such a run serve as the worker instead of
+# calling main(). Scripts never need it, so they skip importing multiprocessing at startup
+def freezeSupport():
+    if getattr(sys, 'frozen', False):
+        from multiprocessing import freeze_support
+        freeze_support()
+
+def defaultWorkerCount():
+    return cpu_count() or 1
+
+# Runs job(path, options) and never raises, so one broken file does not stop the whole batch.
+# job has to return (outPath, timestampCount) or (outPath, timestampCount, details)
+def runTimedJob(job, path: Path, options: dict):
+    start = perf_counter()
+    try:
+        result = job(path, options)
+        details = result[2] if len(result) > 2 else None
+        return path, True, "{0} timestamps -> {1}".format(result[1], result[0]), perf_counter() - start, details
+    except Exception as e:
+        return path, False, str(e), perf_counter() - start, None
+
+# Converts all paths with job on a process pool and prints per-file summary. details returned
+# by jobs are stored in the optional details dict under the file path
+# returns True if all files were converted successfully
+def runBatch(job, paths: list[Path], options: dict, workers: int = 0, details: dict | None = None):
+    if workers <= 0: workers = defaultWorkerCount()
+    workers = min(workers, len(paths))
+
+    start = perf_counter()
+    if workers <= 1:
+        results = [runTimedJob(job, path, options) for path in paths]
+    else:
+        # the process pool pulls in multiprocessing, which single file runs do not need to load
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(runTimedJob, [job] * len(paths), paths, [options] * len(paths),
+                                        chunksize=max(1, len(paths) // (workers * 8))))
+    elapsed = perf_counter() - start
+
+    succeeded = 0
+    for path, ok, message, seconds, jobDetails in results:
+        print("  {0:4s} {1:9.1f}ms  {2}: {3}".format("OK" if ok else "FAIL", seconds * 1000, path, message))
+        if ok: succeeded += 1
+        if details != None and jobDetails != None: details[str(path)] = jobDetails
+
+    print("Converted {0}/{1} files in {2:.2f}s using {3} worker(s)".format(succeeded, len(paths), elapsed, max(workers, 1)))
+    return succeeded == len(paths)
@@ -0,0 +1,133 @@
+from collections import Counter
+from fnmatch import translate
+from pathlib import Path
+from TimestampTable import TimestampColor, TimestampTable
+import re
+
+
+# Bulk recoloring by name patterns. A rules file has one "COLOR PATTERN" rule per line, ex.
+#
+#   # first matching rule wins
+#   Red     Death*
+#   Green   re:Kill( x\d+)?$
+#
+# Patterns are case-sensitive globs matching the whole name, or regular expressions after "re:"
+# matched from the start of the name (like re.match). Empty lines and lines starting with # are
+# skipped. Every rule is compiled on its own when added, so its groups, backreferences and inline
+# flags work as in a standalone regex, and a name is tried against the rules in file order until
+# one matches. Results are memoized per distinct name, so markers repeating a name cost one dict
+# lookup and only distinct names pay for the rule scan.
+REGEX_PREFIX = 're:'
+NO_RULE = -1
+
+class ColorRule:
+    def __init__(self, pattern: str, color: TimestampColor, isRegex: bool = False):
+        self.mPattern = pattern
+        self.mColor = color
+        self.mIsRegex = isRegex
+        self.mMatch = re.compile(self.regex()).match
+        self.mHits = 0
+
+    def regex(self):
+        return self.mPattern if self.mIsRegex else translate(self.mPattern)
+
+    def __str__(self):
+        return "{0} {1}{2}".format(self.mColor, REGEX_PREFIX if self.mIsRegex else "", self.mPattern)
+
+class ColorRules:
+    def __init__(self):
+        self.mRules: list[ColorRule] = []
+        self.mRuleOfName: dict[str, int] = {}
+        self.mUnmatched = 0
+
+    def __len__(self):
+        return len(self.mRules)
+
+    def addRule(self, pattern: str, color: TimestampColor, isRegex: bool = False):
+        try:
+            rule = ColorRule(pattern, color, isRegex)
+        except re.error as e:
+            raise Exception("Invalid pattern {0}: {1}".format(pattern, e))
+        self.mRules.append(rule)
+        self.mRuleOfName.clear()
+
+    # index of the first rule matching name, or NO_RULE
+    def ruleIndex(self, name: str):
+        index = self.mRuleOfName.get(name)
+        if index != None: return index
+
+        index = NO_RULE
+        for i, rule in enumerate(self.mRules):
+            if rule.mMatch(name) != None:
+                index = i
+                break
+        self.mRuleOfName[name] = index
+        return index
+
+    # color of the first rule matching name, or None; counted as a hit of that rule
+    def colorOf(self, name: str):
+        index = self.ruleIndex(name)
+        if index == NO_RULE:
+            self.mUnmatched += 1
+            return None
+        rule = self.mRules[index]
+        rule.mHits += 1
+        return rule.mColor
+
+    # recolors all matching rows of table in a single pass; returns amount of recolored rows
+    def applyToTable(self, table: TimestampTable):
+        nameCounts = Counter(table.mNameIds)
+        colors: list[TimestampColor | None] = []
+        recolored = 0
+        for nameId, name in enumerate(table.mNames):
+            index = self.ruleIndex(name)
+            count = nameCounts.get(nameId, 0)
+            if index == NO_RULE:
+                colors.append(None)
+                self.mUnmatched += count
+            else:
+                colors.append(self.mRules[index].mColor)
+                self.mRules[index].mHits += count
+                recolored += count
+
+        table.setColorsByNameId(colors)
+        return recolored
+
+    def resetHits(self):
+        for rule in self.mRules: rule.mHits = 0
+        self.mUnmatched = 0
+
+    # {counter name: markers} of every rule and of unmatched markers, for PhaseStats counters
+    def hitCounters(self):
+        counters = {"rule{0}".format(i + 1): rule.mHits for i, rule in enumerate(self.mRules)}
+        counters['unmatched'] = self.mUnmatched
+        return counters
+
+    def report(self):
+        lines = ["Color rule hits:"]
+        lines.extend("  {0:3d}. {1:10d}  {2}".format(i + 1, rule.mHits, rule) for i, rule in enumerate(self.mRules))
+        lines.append("       {0:10d}  (no rule matched)".format(self.mUnmatched))
+        return '\n'.join(lines)
+
+
+def loadColorRules(path: Path):
+    rules = ColorRules()
+    with open(path, "rt") as file:
+        for lineNumber, line in enumerate(file, 1):
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'): continue
+
+            parts = line.split(None, 1)
+            if len(parts) < 2: raise Exception("Missing pattern on line {0} of {1}: {2}".format(lineNumber, path, line))
+            try:
+                color = TimestampColor(parts[0])
+            except ValueError:
+                raise Exception("Unknown color {0} on line {1} of {2}".format(parts[0], lineNumber, path))
+
+            pattern = parts[1]
+            isRegex = pattern.startswith(REGEX_PREFIX)
+            try:
+                rules.addRule(pattern[len(REGEX_PREFIX):] if isRegex else pattern, color, isRegex)
+            except Exception as e:
+                raise Exception("{0} on line {1} of {2}".format(e, lineNumber, path))
+    return rules
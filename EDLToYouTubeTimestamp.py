@@ -3,53 +3,30 @@
 from argparse import ArgumentParser
 from enum import IntEnum
 from io import TextIOWrapper
+from locale import getpreferredencoding
 from pathlib import Path
 from sys import exit
-import re
-import traceback
+from BatchRunner import expandPaths, freezeSupport, runBatch
+from MappedReader import iterLineChunks, mapFile
+from MarkerCoalescer import CoalesceKeep, MarkerCoalescer, coalesceTable
+from MarkerFormats import YOUTUBE_MIN_CHAPTER_SPACING, YouTubeWriter
+from ParseCache import fileFingerprint, loadCache, storeCache
+from PhaseStats import DISABLED_STATS, PhaseStats, profileCall, reportStats
+from Timecode import secondsToShortHMS, timecodeToSeconds
+from TimestampPager import DEFAULT_PAGE_SIZE, TimestampPager
+from TimestampTable import TimestampColor, TimestampTable, TimestampView
 
 
-def secondsToHMS(seconds: int):
-    m, sec = divmod(seconds, 60)
-    hr, min = divmod(m, 60)
-    if hr == 0: return "{0:02d}:{1:02d}".format(min, sec)
-    else: return "{0:d}:{1:02d}:{2:02d}".format(hr, min, sec)
-
-def secondsToHMSF(seconds: int, frame: int = 0):
-    m, sec = divmod(seconds, 60)
-    hr, min = divmod(m, 60)
-    return "{0:02d}:{1:02d}:{2:02d}:{3:02d}".format(hr, min, sec, frame)
-
-def HMSToSeconds(timestamp: str):
-    m = re.match('^(\\d+):(\\d\\d):(\\d\\d)', timestamp)
-    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
-    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
-
-def HMSFToSeconds(timestamp: str):
-    m = re.match('^(\\d+):(\\d\\d):(\\d\\d):(\\d\\d)', timestamp)
-    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
-    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
-
-
-
-class Timestamp:
-    def __init__(self, name: str = "", timeSeconds: int = 0):
-        self.mName = name
-        self.mTimeSeconds = timeSeconds
-
-    def setName(self, name: str):
-        self.mName = name
+class Timestamp(TimestampView):
+    __slots__ = ()
 
     def outputYTT(self, file: TextIOWrapper):
         file.writelines([
-            "{0} {1}\n".format(secondsToHMS(self.mTimeSeconds), self.mName),
+            "{0} {1}\n".format(secondsToShortHMS(self.mTimeSeconds), self.mName),
         ])
 
     def __str__(self):
-        return "({0}) {1}".format(secondsToHMS(self.mTimeSeconds), self.mName)
-
-    def getTimestamp(self):
-        return self.mTimeSeconds
+        return "({0}) {1}".format(secondsToShortHMS(self.mTimeSeconds), self.mName)
 
 
 class EDLReaderState(IntEnum):
@@ -60,33 +37,147 @@ class EDLReaderState(IntEnum):
     TIMESTAMP = 4
     DETAILS = 5
 
-class EDLTimestampConverter:
-    EDL_TIMESTAMP_REGEX = '^(\\d+)\\s+(\\d+)[\\sVC]+([\\d:]+) ([\\d:]+) ([\\d:]+) ([\\d:]+)\\s*$'
-    EDL_DETAILS_REGEX = '^\\s*\\|C:([A-Za-z]+)\\s*\\|M:([\\w\\s\'"!@#$%^&*().,-:;]+)\\s*\\|D:(\\d+)*\\s*$'
-
-    def __init__(self, filePath: str):
-        self.mInputPath = Path(filePath)
-        self.mTimestamps: list[Timestamp] = []
-
-    def determineEDLLineType(self, line: str):
-        if len(line) == 0: return EDLReaderState.EMPTY_LINE
-        if line.startswith('TITLE:'): return EDLReaderState.TITLE
-        if line.startswith('FCM:'): return EDLReaderState.FCM
-
-        m = re.match(self.EDL_TIMESTAMP_REGEX, line)
-        if m != None: return EDLReaderState.TIMESTAMP
-
-        m = re.match(self.EDL_DETAILS_REGEX, line)
-        if m != None: return EDLReaderState.DETAILS
+EDL_TIMECODE_CHARS = frozenset('0123456789:')
+EDL_TRACK_CHARS = frozenset('VC')
+EDL_COLOR_PREFIX = 'ResolveColor'
+
+def isTimecode(token: str):
+    return len(token) > 0 and EDL_TIMECODE_CHARS.issuperset(token)
+
+# Single EDL marker event: timestamp line followed by its |C: |M: |D: details line
+class EDLEvent:
+    __slots__ = ('mEventOrdinal', 'mReel', 'mSourceIn', 'mSourceOut', 'mRecordIn', 'mRecordOut', 'mColor', 'mName', 'mDuration')
+
+    def __init__(self, eventOrdinal: int, reel: str, sourceIn: str, sourceOut: str, recordIn: str, recordOut: str):
+        self.mEventOrdinal = eventOrdinal
+        self.mReel = reel
+        self.mSourceIn = sourceIn
+        self.mSourceOut = sourceOut
+        self.mRecordIn = recordIn
+        self.mRecordOut = recordOut
+        self.mColor = TimestampColor.Unknown
+        self.mName = ""
+        self.mDuration = 0
+
+# Tokenizer-based EDL reader. Every line is classified and split exactly once with plain string
+# scans, so parsing time is linear in line length no matter what the marker names contain.
+class EDLParser:
+    def __init__(self):
+        self.mLineCount = 0
+
+    # returns (EDLReaderState, EDLEvent or None); only TIMESTAMP lines produce a new event
+    def parseTimestampLine(self, line: str):
+        if line[0].isspace(): return EDLReaderState.UNKNOWN, None
+        tokens = line.split()
+        if len(tokens) < 6 or not tokens[0].isdigit() or not tokens[1].isdigit(): return EDLReaderState.UNKNOWN, None
+        for token in tokens[2:-4]:
+            if not EDL_TRACK_CHARS.issuperset(token): return EDLReaderState.UNKNOWN, None
+        for token in tokens[-4:]:
+            if not isTimecode(token): return EDLReaderState.UNKNOWN, None
+
+        return EDLReaderState.TIMESTAMP, EDLEvent(int(tokens[0]), tokens[1], *tokens[-4:])
+
+    # fills color, name and duration of the event; returns False if line is not a details line
+    def parseDetailsLine(self, line: str, event: EDLEvent):
+        line = line.lstrip()
+        if not line.startswith('|C:'): return False
+        nameStart = line.find('|M:')
+        durationStart = line.rfind('|D:')
+        if nameStart < 0 or durationStart < nameStart + 3: return False
+
+        colorName = line[3:nameStart].rstrip()
+        name = line[nameStart + 3:durationStart]
+        duration = line[durationStart + 3:].strip()
+        if not colorName.isalpha() or not colorName.isascii() or len(name) == 0: return False
+        if len(duration) > 0 and not duration.isdigit(): return False
+
+        if colorName.startswith(EDL_COLOR_PREFIX): colorName = colorName[len(EDL_COLOR_PREFIX):]
+        event.mColor = TimestampColor.__members__.get(colorName, TimestampColor.Unknown)
+        event.mName = name
+        event.mDuration = int(duration) if len(duration) > 0 else 0
+        return True
+
+    # Generator consuming raw lines and yielding complete EDLEvents
+    def parseLines(self, lines):
+        event = None
+        lineCount = self.mLineCount
+        try:
+            for line in lines:
+                lineCount += 1
+                line = line.rstrip()
+                if len(line) == 0: continue
+                if line.startswith('TITLE:') or line.startswith('FCM:'): continue
+
+                if line.lstrip().startswith('|C:'):
+                    if event == None: raise Exception('Reading DETAILS line without first reading TIMESTAMP line: {0}'.format(line))
+                    if not self.parseDetailsLine(line, event): raise Exception('Failed to parse DETAILS line: {0}'.format(line))
+                    yield event
+                    event = None
+                    continue
+
+                state, timestampEvent = self.parseTimestampLine(line)
+                if state != EDLReaderState.TIMESTAMP:
+                    raise Exception("Invalid line found when reading file ({0} state): {1}".format(state, line))
+                event = timestampEvent
+        finally:
+            self.mLineCount = lineCount
+
+    # Classifies every line without raising on invalid ones; returns {EDLReaderState: amount of lines}
+    def countLineStates(self, lines):
+        counts = dict.fromkeys(EDLReaderState, 0)
+        for line in lines:
+            line = line.rstrip()
+            if len(line) == 0: state = EDLReaderState.EMPTY_LINE
+            elif line.startswith('TITLE:'): state = EDLReaderState.TITLE
+            elif line.startswith('FCM:'): state = EDLReaderState.FCM
+            elif line.lstrip().startswith('|C:'): state = EDLReaderState.DETAILS
+            else: state = self.parseTimestampLine(line)[0]
+            counts[state] += 1
+        return counts
+
+    # Same as parseLines, but walks raw bytes lines of buffer (ex. a memory-mapped file);
+    # empty, TITLE and FCM lines are skipped without decoding
+    def parseBuffer(self, buffer, encoding: str):
+        event = None
+        lineCount = self.mLineCount
+        try:
+            for start, end in iterLineChunks(buffer):
+                for rawLine in buffer[start:end].split(b'\n'):
+                    lineCount += 1
+                    rawLine = rawLine.rstrip()
+                    if len(rawLine) == 0 or rawLine.startswith(b'TITLE:') or rawLine.startswith(b'FCM:'): continue
+
+                    line = rawLine.decode(encoding)
+                    if line.lstrip().startswith('|C:'):
+                        if event == None: raise Exception('Reading DETAILS line without first reading TIMESTAMP line: {0}'.format(line))
+                        if not self.parseDetailsLine(line, event): raise Exception('Failed to parse DETAILS line: {0}'.format(line))
+                        yield event
+                        event = None
+                        continue
+
+                    state, timestampEvent = self.parseTimestampLine(line)
+                    if state != EDLReaderState.TIMESTAMP:
+                        raise Exception("Invalid line found when reading file ({0} state): {1}".format(state, line))
+                    event = timestampEvent
+        finally:
+            self.mLineCount = lineCount
 
-        return EDLReaderState.UNKNOWN
 
-    # atIndex points where to insert the timestamp; negative value appends at the end
-    def addTimestamp(self, timestamp: Timestamp, atIndex: int = -1):
-        if atIndex < 0:
-            self.mTimestamps.append(timestamp)
-        else:
-            self.mTimestamps.insert(atIndex, timestamp)
+class EDLTimestampConverter:
+    def __init__(self, filePath: str, useCache: bool = True, useMmap: bool = False, stats: PhaseStats = DISABLED_STATS,
+                 profilePath: str | None = None, chapterSpacing: int = 0, pageSize: int = DEFAULT_PAGE_SIZE):
+        self.mInputPath = Path(filePath)
+        self.mUseCache = useCache
+        self.mUseMmap = useMmap
+        self.mStats = stats
+        self.mProfilePath = profilePath
+        self.mChapterSpacing = chapterSpacing
+        self.mTimestamps = TimestampTable(Timestamp)
+        self.mPager = TimestampPager(self.mTimestamps, pageSize)
+
+    # returns row of the added timestamp
+    def addTimestamp(self, name: str, timeSeconds: int, color: TimestampColor = TimestampColor.Blue):
+        return self.mTimestamps.append(name, timeSeconds, color)
 
     def queryConfirmation(self, prompt: str, preamble: str = ""):
         while True:
@@ -99,43 +190,63 @@ class EDLTimestampConverter:
             else:
                 print("Incorrect answer: {0}".format(a))
 
+    # returns amount of lines read from the input file
     def readInputFile(self):
         self.mTimestamps.clear()
-        readerState = EDLReaderState.UNKNOWN
-        lastReadEventTimestampSeconds = -1
-        with open(self.mInputPath, "rt") as inputFile:
-            for line in inputFile:
-                line = line.rstrip()
-
-                # determine what line we read
-                readerState = self.determineEDLLineType(line)
-                match readerState:
-                    case EDLReaderState.EMPTY_LINE:
-                        pass
-                    case EDLReaderState.TITLE:
-                        pass
-                    case EDLReaderState.FCM:
-                        pass
-                    case EDLReaderState.TIMESTAMP:
-                        m = re.search(self.EDL_TIMESTAMP_REGEX, line)
-                        if m == None: raise Exception('Failed to parse TIMESTAMP line: {0}'.format(line))
-                        lastReadEventTimestampSeconds = HMSToSeconds(m.group(3))
-                    case EDLReaderState.DETAILS:
-                        m = re.search(self.EDL_DETAILS_REGEX, line)
-                        if m == None: raise Exception('Failed to parse DETAILS line: {0}'.format(line))
-                        if lastReadEventTimestampSeconds == -1: raise Exception('Reading DETAILS line without first reading TIMESTAMP line: {0}'.format(line))
-                        self.addTimestamp(Timestamp(m.group(2), lastReadEventTimestampSeconds))
-                        lastReadEventTimestampSeconds = -1
-                    case _:
-                        raise Exception("Invalid line found when reading file ({0} state): {1}".format(readerState, line))
+        if self.mStats.mEnabled:
+            with self.mStats.phase('classify'), open(self.mInputPath, "rt") as inputFile:
+                self.mStats.addLineStates(EDLParser().countLineStates(inputFile))
+        if not self.mUseCache: return self.parseInputFile()
+
+        # v3 caches store the line count, v2 ones always had 0
+        cacheOptions = "EDL v3"
+        with self.mStats.phase('open'):
+            fingerprint = fileFingerprint(self.mInputPath)
+            lineCount = loadCache(self.mInputPath, cacheOptions, fingerprint, self.mTimestamps)
+        if lineCount != None:
+            self.mStats.setCounter('lines', lineCount)
+            return lineCount
+
+        lineCount = self.parseInputFile()
+        with self.mStats.phase('cache'):
+            storeCache(self.mInputPath, cacheOptions, fingerprint, self.mTimestamps, lineCount)
+        return lineCount
+
+    # returns amount of lines read from the input file
+    def parseInputFile(self):
+        parser = EDLParser()
+        with self.mStats.phase('parse'):
+            if self.mUseMmap:
+                with mapFile(self.mInputPath) as buffer:
+                    for event in parser.parseBuffer(buffer, getpreferredencoding(False)):
+                        self.addTimestamp(event.mName, timecodeToSeconds(event.mSourceIn), event.mColor)
+            else:
+                with open(self.mInputPath, "rt") as inputFile:
+                    for event in parser.parseLines(inputFile):
+                        self.addTimestamp(event.mName, timecodeToSeconds(event.mSourceIn), event.mColor)
+        self.mStats.setCounter('lines', parser.mLineCount)
+        return parser.mLineCount
+
+    # Drops timestamps closer than mChapterSpacing seconds to the previous kept one, sorting them by time;
+    # returns amount of dropped timestamps
+    def enforceChapterSpacing(self):
+        if self.mChapterSpacing <= 0: return 0
+        with self.mStats.phase('transforms'):
+            dropped = coalesceTable(self.mTimestamps, MarkerCoalescer(self.mChapterSpacing, False, CoalesceKeep.FIRST))
+        self.mStats.setCounter('coalesced', dropped)
+        return dropped
 
     def processSummary(self):
-        print("\nTimestamp file has {0} timestamps\n".format(len(self.mTimestamps)))
-        print("Available Timestamps:")
-        counter = 1
-        for t in self.mTimestamps:
-            print("  {0}. {1}".format(counter, str(t)))
-            counter += 1
+        print("\nTimestamp file has {0} timestamps".format(len(self.mTimestamps)))
+        self.mPager.browse(quitLabel="continue")
+
+    def writeOutput(self, outPath: Path):
+        table = self.mTimestamps
+        with self.mStats.phase('serialize'), open(outPath, "w+t") as file:
+            writer = YouTubeWriter(file)
+            for row in range(len(table)):
+                writer.write(table.getName(row), table.getTime(row))
+            writer.close()
 
     def processConvert(self):
         outPath = self.mInputPath.with_suffix(".txt")
@@ -148,10 +259,7 @@ class EDLTimestampConverter:
             if not self.queryConfirmation("File {0} already exists, overwrite?".format(outPath)):
                 raise Exception('Conversion aborted')
 
-        with open(outPath, "w+t") as file:
-            for t in self.mTimestamps:
-                t.outputYTT(file)
-
+        self.writeOutput(outPath)
         print("Generated YouTube Timestamp file {0}".format(outPath))
 
     def mainLoop(self):
@@ -160,8 +268,12 @@ class EDLTimestampConverter:
             print("Provided file path does not exist")
             exit(1)
 
-        self.readInputFile()
+        if self.mProfilePath != None: profileCall(self.mProfilePath, self.readInputFile)
+        else: self.readInputFile()
         print("Timestamp file {0} parsed successfully.".format(self.mInputPath))
+        dropped = self.enforceChapterSpacing()
+        if dropped > 0: print("Dropped {0} timestamps closer than {1} seconds to the previous one".format(dropped, self.mChapterSpacing))
+        self.mStats.setCounter('timestamps', len(self.mTimestamps))
 
         self.processSummary()
         self.processConvert()
@@ -170,20 +282,97 @@ class EDLTimestampConverter:
 
 
 
-def main():
+# Batch job converting a single file, see BatchRunner.runBatch for options handling. A file is converted
+# once, so unless options enable useCache it is parsed without writing a parse cache next to it
+def convertFileJob(inputPath: Path, options: dict):
+    outPath = Path(options['output']) if options.get('output') else inputPath.with_suffix(".txt")
+    if not inputPath.exists(): raise Exception("Provided file path {0} does not exist".format(inputPath))
+    if outPath.exists() and not options.get('overwrite'): raise Exception("File {0} already exists, use --overwrite to replace it".format(outPath))
+
+    stats = PhaseStats(traceAllocations=options.get('traceAllocations', False)) if options.get('stats') else DISABLED_STATS
+    converter = EDLTimestampConverter(inputPath, options.get('useCache', False), options.get('useMmap', False), stats,
+                                      chapterSpacing=options.get('chapterSpacing', 0))
+    converter.readInputFile()
+    converter.enforceChapterSpacing()
+    converter.writeOutput(outPath)
+    if stats.mEnabled:
+        stats.setCounter('timestamps', len(converter.mTimestamps))
+        return outPath, len(converter.mTimestamps), stats.toDict()
+    return outPath, len(converter.mTimestamps)
+
+
+def main(argv: list[str] | None = None):
     try:
         parser = ArgumentParser(
             prog='EDLToYouTubeTimestamp',
             description='Program converting InfoWriter log file to DaVinci Resolve-compatible EDL timeline marker list'
         )
-        parser.add_argument('filepath', help='Path to InfoWriter log file. Output will be in the same directory under the same name with .edl extension')
-        args = parser.parse_args()
-
-        EDLTimestampConverter(args.filepath).mainLoop()
+        parser.add_argument('filepaths', nargs='+', metavar='filepath',
+                            help='Path to InfoWriter log file. Output will be in the same directory under the same name with .edl extension. '
+                                 'Several files or glob patterns can be given with --convert-only')
+        parser.add_argument('--no-cache', help='Do not read nor write the parse cache sidecar (.hhcache) of the input file in interactive mode, '
+                                               '--convert-only never uses it',
+                            action='store_true', default=False)
+        parser.add_argument('--mmap', help='Read the input through a memory map, classifying raw bytes without decoding skipped lines',
+                            action='store_true', default=False)
+        parser.add_argument('--page-size', help='Timestamps per page when listing them before conversion (default {0})'.format(DEFAULT_PAGE_SIZE),
+                            type=int, default=DEFAULT_PAGE_SIZE)
+        parser.add_argument('-c', '--convert-only', help='Convert without listing timestamps and asking for confirmation',
+                            action='store_true', default=False)
+        parser.add_argument('-o', '--output', help='Output file path used with --convert-only and a single input file')
+        parser.add_argument('-y', '--overwrite', help='Overwrite existing output file when using --convert-only',
+                            action='store_true', default=False)
+        parser.add_argument('-j', '--jobs', help='Amount of worker processes converting files in parallel (defaults to CPU count)',
+                            type=int, default=0)
+        parser.add_argument('--chapter-spacing', help='Drop timestamps closer than given seconds to the previous kept one, '
+                                                      'as YouTube requires chapters at least {0} seconds apart (default {0} when given without a value)'.format(YOUTUBE_MIN_CHAPTER_SPACING),
+                            type=int, nargs='?', const=YOUTUBE_MIN_CHAPTER_SPACING, default=0, metavar='SECONDS')
+        parser.add_argument('--stats', help='Print wall time and allocations of each phase and line counts per reader state',
+                            action='store_true', default=False)
+        parser.add_argument('--stats-json', help='Write the --stats statistics as JSON to given path', metavar='PATH')
+        parser.add_argument('--trace-alloc', help='Also trace allocated bytes of each phase with tracemalloc (much slower)',
+                            action='store_true', default=False)
+        parser.add_argument('--profile', help='Dump a cProfile profile of reading the input (interactive) or of the conversion (--convert-only, runs in-process) to given path',
+                            metavar='PATH')
+        args = parser.parse_args(argv)
+
+        paths = expandPaths(args.filepaths)
+        collectStats = args.stats or args.stats_json != None or args.trace_alloc
+        if not args.convert_only:
+            if len(paths) > 1: raise Exception("Interactive mode handles a single file, use --convert-only for several files")
+            stats = PhaseStats(traceAllocations=args.trace_alloc) if collectStats else DISABLED_STATS
+            try:
+                EDLTimestampConverter(paths[0], not args.no_cache, args.mmap, stats, args.profile, args.chapter_spacing, args.page_size).mainLoop()
+            finally:
+                if collectStats: reportStats({str(paths[0]): stats.toDict()}, args.stats, args.stats_json)
+            return
+
+        if args.output and len(paths) > 1: raise Exception("--output can only be used with a single input file")
+
+        options = {
+            'useMmap': args.mmap,
+            'output': args.output,
+            'overwrite': args.overwrite,
+            'chapterSpacing': args.chapter_spacing,
+            'stats': collectStats,
+            'traceAllocations': args.trace_alloc,
+        }
+        statsByPath = {}
+        try:
+            if args.profile:
+                succeeded = profileCall(args.profile, runBatch, convertFileJob, paths, options, 1, statsByPath)
+            else:
+                succeeded = runBatch(convertFileJob, paths, options, args.jobs, statsByPath)
+        finally:
+            if collectStats: reportStats(statsByPath, args.stats, args.stats_json)
+        if not succeeded:
+            exit(1)
     except Exception as e:
         print("Exception caught by main: {0}".format(e))
+        import traceback
         traceback.print_exception(e)
         exit(1)
 
 if __name__ == "__main__":
+    freezeSupport()
     main()
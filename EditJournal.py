@@ -0,0 +1,400 @@
+from array import array
+from collections import deque
+from enum import IntEnum
+from os import replace, truncate
+from pathlib import Path
+from struct import calcsize, pack, unpack_from
+from zlib import compress, crc32, decompress
+from MarkerCoalescer import CoalesceKeep, MarkerCoalescer, coalesceTable
+from TimestampTable import COLOR_CODES, COLOR_TO_CODE, TimestampColor, TimestampTable, changedRows
+
+
+# Append-only journal of interactive edits, stored next to the source as <source>.hhjournal, so
+# edits survive reopening the file. Every edit is one small record keyed by row numbers, which
+# stay stable as rows only move through journaled edits (coalescing, dropping) that are replayed
+# the same way. Loading replays the records on top of the parsed file in O(edits).
+#
+# Records carry what is needed to revert them, so undo and redo are O(1) for single timestamp
+# edits: they apply the record backwards or forwards and append a one byte UNDO/REDO record.
+# Edits rewriting the whole table (coalescing, dropping) keep the previous table compressed.
+#
+# Once compactRecords records pile up, the journal is compacted: rewritten as a snapshot of the
+# current table, followed by the last undoDepth undoable records and the redoable ones, so undo
+# keeps working across compactions. A snapshot also spares replaying everything before it.
+#
+# Layout (little endian):
+#   header - magic, version, source size, source mtime (ns), source content hash, options length,
+#            snapshot length
+#   options string, snapshot (packed table state, empty for none)
+#   records - payload length, crc32 of op and payload, op, payload; a torn or corrupt record ends
+#             the journal and is cut off on load
+JOURNAL_MAGIC = b'HHEJ'
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = '.hhjournal'
+JOURNAL_HEADER = '<4sHQq16sHQ'
+JOURNAL_HEADER_SIZE = calcsize(JOURNAL_HEADER)
+RECORD_HEADER = '<IIB'
+RECORD_HEADER_SIZE = calcsize(RECORD_HEADER)
+JOURNAL_COMPACT_RECORDS = 4096
+UNDO_DEPTH = 256
+
+class EditOp(IntEnum):
+    RENAME = 1
+    COLOR = 2
+    GROUP_COLOR = 3
+    COLORS = 4
+    SHIFT = 5
+    COALESCE = 6
+    DROP_NEGATIVE = 7
+    UNDO = 8
+    REDO = 9
+
+# op flags of records written by compaction: already applied in the snapshot (undoable), or redoable
+HISTORY_FLAG = 0x80
+REDOABLE_FLAG = 0x40
+OP_MASK = 0x3f
+
+# payloads: redo part length, redo part, undo part
+RENAME_FORMAT = '<Q'            # row, new name | old name
+COLOR_FORMAT = '<QBB'           # row, new color, old color | -
+GROUP_COLOR_FORMAT = '<B'       # new color, name | old colors of the group rows in row order (zlib)
+SHIFT_FORMAT = '<dqqq'          # scale, seconds, window start, window end | previous transform steps
+COALESCE_FORMAT = '<qB?'        # window, keep, by name | previous table state (zlib)
+NO_TIME = -(1 << 63)
+KEEP_CODES = list(CoalesceKeep)
+
+# packed table state: row count, name count, names length, transform steps (-1 for no transform),
+# then times, name ids, colors, names joined with '\n' and the transform steps
+STATE_HEADER = '<QQQq'
+STATE_HEADER_SIZE = calcsize(STATE_HEADER)
+# step kind and three values: (scale, offset) or (start, end, offset)
+STEP_FORMAT = '<Bddd'
+STEP_SIZE = calcsize(STEP_FORMAT)
+AFFINE_STEP, WINDOW_STEP, OPEN_WINDOW_STEP = range(3)
+
+
+def journalPathFor(sourcePath: Path):
+    return sourcePath.with_name(sourcePath.name + JOURNAL_SUFFIX)
+
+def packSteps(steps: list[tuple] | None):
+    if steps == None: return b''
+    packed = []
+    for step in steps:
+        if len(step) == 2: packed.append(pack(STEP_FORMAT, AFFINE_STEP, step[0], step[1], 0))
+        elif step[1] == None: packed.append(pack(STEP_FORMAT, OPEN_WINDOW_STEP, step[0], 0, step[2]))
+        else: packed.append(pack(STEP_FORMAT, WINDOW_STEP, step[0], step[1], step[2]))
+    return b''.join(packed)
+
+def unpackSteps(data, offset: int, count: int):
+    steps = []
+    for i in range(count):
+        kind, a, b, c = unpack_from(STEP_FORMAT, data, offset + i * STEP_SIZE)
+        if kind == AFFINE_STEP: steps.append((a, b))
+        else: steps.append((int(a), None if kind == OPEN_WINDOW_STEP else int(b), c))
+    return steps
+
+def transformSteps(table: TimestampTable):
+    return None if table.mTransform == None else list(table.mTransform.mSteps)
+
+def packTableState(table: TimestampTable):
+    steps = transformSteps(table)
+    names = '\n'.join(table.mNames).encode('utf-8')
+    return b''.join((pack(STATE_HEADER, len(table), len(table.mNames), len(names), -1 if steps == None else len(steps)),
+                     table.mTimes.tobytes(), table.mNameIds.tobytes(), table.mColors.tobytes(), names, packSteps(steps)))
+
+def unpackTableState(data, table: TimestampTable):
+    rowCount, nameCount, namesLength, stepCount = unpack_from(STATE_HEADER, data)
+    view = memoryview(data)
+    offset = STATE_HEADER_SIZE
+    times, nameIds, colors = array('q'), array('I'), array('B')
+    for column in (times, nameIds, colors):
+        length = rowCount * column.itemsize
+        column.frombytes(view[offset:offset + length])
+        offset += length
+    names = str(view[offset:offset + namesLength], 'utf-8').split('\n') if nameCount > 0 else []
+    offset += namesLength
+    table.setColumns(times, colors, nameIds, names)
+    table.setTransformSteps(None if stepCount < 0 else unpackSteps(data, offset, stepCount))
+
+
+# Edits of a timestamp table and its name index (TimestampNameIndex: rows of every name sorted by
+# time), recorded in the journal at path; a path of None keeps edits and undo history in memory only
+class EditJournal:
+    def __init__(self, path: Path | None, fingerprint: tuple, options: str, table: TimestampTable, index,
+                 compactRecords: int = JOURNAL_COMPACT_RECORDS, undoDepth: int = UNDO_DEPTH):
+        self.mPath = path
+        self.mFingerprint = fingerprint
+        self.mOptions = options
+        self.mTable = table
+        self.mIndex = index
+        self.mCompactRecords = compactRecords
+        # (op, payload) of undoable and redoable edits, most recent last
+        self.mUndo: deque[tuple] = deque(maxlen=undoDepth)
+        self.mRedo: list[tuple] = []
+        # records appended since the snapshot, None while the journal file does not exist
+        self.mRecordCount: int | None = None
+
+    # Replays the journal onto the table, which has to hold the freshly parsed source.
+    # returns amount of replayed records, or None when there is no journal for this source
+    # (a journal of another version of the source is replaced by the first edit)
+    def load(self):
+        if self.mPath == None: return None
+        try:
+            data = self.mPath.read_bytes()
+        except OSError:
+            return None
+
+        valid = len(data) >= JOURNAL_HEADER_SIZE
+        if valid:
+            magic, version, size, mtime, contentHash, optionsLength, snapshotLength = unpack_from(JOURNAL_HEADER, data)
+            offset = JOURNAL_HEADER_SIZE + optionsLength
+            valid = magic == JOURNAL_MAGIC and version == JOURNAL_VERSION and (size, mtime, contentHash) == self.mFingerprint and \
+                    data[JOURNAL_HEADER_SIZE:offset] == self.mOptions.encode()
+        if not valid:
+            print("Edit journal {0} belongs to another version of the file or other parse options, the next edit replaces it".format(self.mPath))
+            return None
+
+        if snapshotLength > 0: self.restoreSnapshot(memoryview(data)[offset:offset + snapshotLength])
+        offset += snapshotLength
+
+        self.mRecordCount = 0
+        replayed = 0
+        while offset + RECORD_HEADER_SIZE <= len(data):
+            length, checksum, op = unpack_from(RECORD_HEADER, data, offset)
+            end = offset + RECORD_HEADER_SIZE + length
+            if end > len(data): break
+            payload = data[offset + RECORD_HEADER_SIZE:end]
+            if crc32(payload, op) != checksum: break
+
+            flags = op & ~OP_MASK
+            op = EditOp(op & OP_MASK)
+            if flags & HISTORY_FLAG: self.mUndo.append((op, payload))
+            elif flags & REDOABLE_FLAG: self.mRedo.append((op, payload))
+            else:
+                if op == EditOp.UNDO: self.undoLast()
+                elif op == EditOp.REDO: self.redoLast()
+                else:
+                    self.apply(op, payload)
+                    self.mUndo.append((op, payload))
+                    self.mRedo.clear()
+                self.mRecordCount += 1
+                replayed += 1
+            offset = end
+
+        if offset < len(data):
+            print("Edit journal {0} ends with a damaged record, dropping {1} bytes".format(self.mPath, len(data) - offset))
+            truncate(self.mPath, offset)
+        return replayed
+
+    # Loads a snapshot over the parsed table. Unless rows were merged or dropped, the snapshot
+    # differs from the parsed table in a few renamed rows, which are moved between name groups
+    # instead of rebuilding the whole index
+    def restoreSnapshot(self, snapshot):
+        table = self.mTable
+        times, nameIds, names = table.mTimes, table.mNameIds, list(table.mNames)
+        unpackTableState(snapshot, table)
+        transform = table.mTransform
+        if table.mTimes.tobytes() != times.tobytes() or table.mNames[:len(names)] != names or (transform != None and not transform.isMonotonic()):
+            self.mIndex.rebuild()
+            return
+
+        for row in changedRows(nameIds, table.mNameIds):
+            self.mIndex.remove(row, names[nameIds[row]])
+            self.mIndex.add(row)
+
+    def canUndo(self):
+        return len(self.mUndo) > 0
+
+    def canRedo(self):
+        return len(self.mRedo) > 0
+
+    # returns description of the undone edit, None when there is nothing to undo
+    def undo(self):
+        record = self.undoLast()
+        if record == None: return None
+        self.appendRecord(EditOp.UNDO, b'')
+        return describeEdit(*record)
+
+    def redo(self):
+        record = self.redoLast()
+        if record == None: return None
+        self.appendRecord(EditOp.REDO, b'')
+        return describeEdit(*record)
+
+    def undoLast(self):
+        if len(self.mUndo) == 0: return None
+        record = self.mUndo.pop()
+        self.revert(*record)
+        self.mRedo.append(record)
+        return record
+
+    def redoLast(self):
+        if len(self.mRedo) == 0: return None
+        record = self.mRedo.pop()
+        self.apply(*record)
+        self.mUndo.append(record)
+        return record
+
+    # edits, each applied, recorded and made undoable
+
+    def rename(self, row: int, name: str):
+        redo = pack(RENAME_FORMAT, row) + name.encode('utf-8')
+        self.edit(EditOp.RENAME, len(redo), redo + self.mTable.getName(row).encode('utf-8'))
+
+    def setColor(self, row: int, color: TimestampColor):
+        self.edit(EditOp.COLOR, calcsize(COLOR_FORMAT), pack(COLOR_FORMAT, row, COLOR_TO_CODE[color], self.mTable.mColors[row]))
+
+    def setGroupColor(self, name: str, color: TimestampColor):
+        colors = self.mTable.mColors
+        oldColors = bytes(colors[row] for row in sorted(self.mIndex[name]))
+        redo = pack(GROUP_COLOR_FORMAT, COLOR_TO_CODE[color]) + name.encode('utf-8')
+        self.edit(EditOp.GROUP_COLOR, len(redo), redo + compress(oldColors, 1))
+
+    # records a change of the color column made by the caller (ex. color rules) from oldColors
+    def recordColors(self, oldColors: array):
+        redo = compress(self.mTable.mColors.tobytes(), 1)
+        self.record(EditOp.COLORS, len(redo), redo + compress(oldColors.tobytes(), 1))
+
+    def shift(self, seconds: int, start: int | None = None, end: int | None = None, scale: float = 1.0):
+        redo = pack(SHIFT_FORMAT, scale, seconds, NO_TIME if start == None else start, NO_TIME if end == None else end)
+        steps = transformSteps(self.mTable)
+        undo = pack('<q', -1 if steps == None else len(steps)) + packSteps(steps)
+        self.edit(EditOp.SHIFT, len(redo), redo + undo)
+
+    def coalesce(self, window: int, byName: bool, keep: CoalesceKeep):
+        redo = pack(COALESCE_FORMAT, window, KEEP_CODES.index(keep), byName)
+        self.edit(EditOp.COALESCE, len(redo), redo + compress(packTableState(self.mTable), 1))
+
+    def dropNegative(self):
+        self.edit(EditOp.DROP_NEGATIVE, 0, compress(packTableState(self.mTable), 1))
+
+    def edit(self, op: EditOp, redoLength: int, parts: bytes):
+        payload = pack('<I', redoLength) + parts
+        self.apply(op, payload)
+        self.record(op, redoLength, parts, payload)
+
+    def record(self, op: EditOp, redoLength: int, parts: bytes, payload: bytes | None = None):
+        if payload == None: payload = pack('<I', redoLength) + parts
+        self.mUndo.append((op, payload))
+        self.mRedo.clear()
+        self.appendRecord(op, payload)
+
+    def apply(self, op: EditOp, payload: bytes):
+        table = self.mTable
+        index = self.mIndex
+        redoLength, = unpack_from('<I', payload)
+        redo = payload[4:4 + redoLength]
+        match op:
+            case EditOp.RENAME:
+                row, = unpack_from(RENAME_FORMAT, redo)
+                index.remove(row)
+                table.setName(row, str(redo[calcsize(RENAME_FORMAT):], 'utf-8'))
+                index.add(row)
+            case EditOp.COLOR:
+                row, color, _ = unpack_from(COLOR_FORMAT, redo)
+                table.mColors[row] = color
+            case EditOp.GROUP_COLOR:
+                color, = unpack_from(GROUP_COLOR_FORMAT, redo)
+                colors = table.mColors
+                for row in index[str(redo[calcsize(GROUP_COLOR_FORMAT):], 'utf-8')]: colors[row] = color
+            case EditOp.COLORS:
+                table.mColors = array('B', decompress(redo))
+            case EditOp.SHIFT:
+                scale, seconds, start, end = unpack_from(SHIFT_FORMAT, redo)
+                if scale != 1.0: table.scaleTimes(scale)
+                windowed = start != NO_TIME
+                table.shiftTimes(seconds, start if windowed else None, None if end == NO_TIME else end)
+                # a windowed shift can move timestamps past their neighbours
+                if windowed: index.sortGroups()
+            case EditOp.COALESCE:
+                window, keep, byName = unpack_from(COALESCE_FORMAT, redo)
+                coalesceTable(table, MarkerCoalescer(window, byName, KEEP_CODES[keep]))
+                index.rebuild()
+            case EditOp.DROP_NEGATIVE:
+                dropped = set(table.negativeRows())
+                table.compact(row for row in range(len(table)) if row not in dropped)
+                index.rebuild()
+
+    def revert(self, op: EditOp, payload: bytes):
+        table = self.mTable
+        index = self.mIndex
+        redoLength, = unpack_from('<I', payload)
+        redo = payload[4:4 + redoLength]
+        undo = payload[4 + redoLength:]
+        match op:
+            case EditOp.RENAME:
+                row, = unpack_from(RENAME_FORMAT, redo)
+                index.remove(row)
+                table.setName(row, str(undo, 'utf-8'))
+                index.add(row)
+            case EditOp.COLOR:
+                row, _, color = unpack_from(COLOR_FORMAT, redo)
+                table.mColors[row] = color
+            case EditOp.GROUP_COLOR:
+                colors = table.mColors
+                rows = sorted(index[str(redo[calcsize(GROUP_COLOR_FORMAT):], 'utf-8')])
+                for row, color in zip(rows, decompress(undo)): colors[row] = color
+            case EditOp.COLORS:
+                table.mColors = array('B', decompress(undo))
+            case EditOp.SHIFT:
+                stepCount, = unpack_from('<q', undo)
+                table.setTransformSteps(None if stepCount < 0 else unpackSteps(undo, 8, stepCount))
+                if unpack_from(SHIFT_FORMAT, redo)[2] != NO_TIME: index.sortGroups()
+            case EditOp.COALESCE | EditOp.DROP_NEGATIVE:
+                unpackTableState(decompress(undo), table)
+                index.rebuild()
+
+    def appendRecord(self, op: int, payload: bytes):
+        if self.mPath == None: return
+        if self.mRecordCount == None:
+            self.writeJournal(b'', [])
+            self.mRecordCount = 0
+        with open(self.mPath, "ab") as file:
+            file.write(pack(RECORD_HEADER, len(payload), crc32(payload, op), op) + payload)
+        self.mRecordCount += 1
+        if self.mCompactRecords > 0 and self.mRecordCount >= self.mCompactRecords: self.compact()
+
+    # rewrites the journal as a snapshot of the table and the undo and redo history
+    def compact(self):
+        if self.mPath == None: return
+        history = [(op | HISTORY_FLAG, payload) for op, payload in self.mUndo]
+        history.extend((op | REDOABLE_FLAG, payload) for op, payload in self.mRedo)
+        self.writeJournal(packTableState(self.mTable), history)
+        self.mRecordCount = 0
+
+    def writeJournal(self, snapshot: bytes, records: list[tuple]):
+        size, mtime, contentHash = self.mFingerprint
+        options = self.mOptions.encode()
+        tempPath = self.mPath.with_name(self.mPath.name + '.tmp')
+        with open(tempPath, "wb") as file:
+            file.write(pack(JOURNAL_HEADER, JOURNAL_MAGIC, JOURNAL_VERSION, size, mtime, contentHash, len(options), len(snapshot)))
+            file.write(options)
+            file.write(snapshot)
+            for op, payload in records:
+                file.write(pack(RECORD_HEADER, len(payload), crc32(payload, op), op) + payload)
+        replace(tempPath, self.mPath)
+
+    # forgets all edits and removes the journal file; the table is left as it is
+    def discard(self):
+        self.mUndo.clear()
+        self.mRedo.clear()
+        self.mRecordCount = None
+        if self.mPath != None: self.mPath.unlink(missing_ok=True)
+
+
+def describeEdit(op: EditOp, payload: bytes):
+    redoLength, = unpack_from('<I', payload)
+    redo = payload[4:4 + redoLength]
+    match op:
+        case EditOp.RENAME:
+            return "rename of timestamp {0} to {1}".format(unpack_from(RENAME_FORMAT, redo)[0], str(redo[calcsize(RENAME_FORMAT):], 'utf-8'))
+        case EditOp.COLOR:
+            row, color, _ = unpack_from(COLOR_FORMAT, redo)
+            return "color of timestamp {0} set to {1}".format(row, COLOR_CODES[color])
+        case EditOp.GROUP_COLOR:
+            return "color of group {0} set to {1}".format(str(redo[calcsize(GROUP_COLOR_FORMAT):], 'utf-8'), COLOR_CODES[unpack_from(GROUP_COLOR_FORMAT, redo)[0]])
+        case EditOp.COLORS: return "recoloring by rules"
+        case EditOp.SHIFT: return "shift by {0} seconds".format(unpack_from(SHIFT_FORMAT, redo)[1])
+        case EditOp.COALESCE: return "merge of timestamps within {0} seconds".format(unpack_from(COALESCE_FORMAT, redo)[0])
+        case EditOp.DROP_NEGATIVE: return "drop of timestamps before 00:00:00"
+        case _: return op.name
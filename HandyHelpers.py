@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+from importlib import import_module
+from os import name as osName
+from sys import argv, exit, stdin
+from time import perf_counter
+import shlex
+
+
+# Single entry point of all tools, "HandyHelpers COMMAND [ARGS...]" with the arguments of the tool.
+# A tool's module is only imported when its command runs, so starting through here costs about
+# the same as starting the tool itself. The batch command runs a command per line of a file or of
+# stdin in this one process: only the first command pays for interpreter startup and imports.
+COMMANDS = {
+    'infowriter': ('InfoWriterToEDL', 'convert InfoWriter logs to EDL or YouTube chapters'),
+    'youtube': ('EDLToYouTubeTimestamp', 'convert EDLs to YouTube chapters'),
+    'watch': ('WatchFolderService', 'watch a directory and convert files dropped into it'),
+}
+BATCH_COMMAND = 'batch'
+BATCH_STOP_OPTION = '--stop-on-error'
+
+
+def printUsage():
+    print("usage: HandyHelpers COMMAND [ARGS...]\n\ncommands:")
+    for command, (module, description) in COMMANDS.items():
+        print("  {0:12s} {1} (same arguments as {2})".format(command, description, module))
+    print("  {0:12s} run a command per line of FILE (stdin when not given or \"-\") in a single process,\n"
+          "  {1:12s} {2} stops at the first failing command: {0} [{2}] [FILE]".format(BATCH_COMMAND, '', BATCH_STOP_OPTION))
+    print("\nRun \"HandyHelpers COMMAND --help\" for arguments of a command")
+
+# Windows paths keep their backslashes, so quotes are only stripped there
+def splitCommandLine(line: str):
+    if osName != 'nt': return shlex.split(line)
+    return [word[1:-1] if len(word) >= 2 and word[0] == word[-1] and word[0] in '"\'' else word for word in shlex.split(line, posix=False)]
+
+# runs a tool command in this process; returns its exit code
+def runCommand(words: list[str]):
+    entry = COMMANDS.get(words[0])
+    if entry == None: raise Exception("Unknown command {0}, expected one of: {1}".format(words[0], ', '.join(COMMANDS)))
+    try:
+        import_module(entry[0]).main(words[1:])
+        return 0
+    except SystemExit as e:
+        if e.code == None: return 0
+        return e.code if isinstance(e.code, int) else 1
+
+# returns True if all commands succeeded
+def runBatchCommands(lines, stopOnError: bool):
+    start = perf_counter()
+    count = 0
+    failed = 0
+    for lineNumber, line in enumerate(lines, 1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'): continue
+
+        count += 1
+        commandStart = perf_counter()
+        try:
+            words = splitCommandLine(line)
+            if words[0] == BATCH_COMMAND: raise Exception("{0} cannot be nested".format(BATCH_COMMAND))
+            code = runCommand(words)
+        except Exception as e:
+            print("Exception caught by batch: {0}".format(e))
+            code = 1
+
+        if code != 0: failed += 1
+        print("  {0:4s} {1:9.1f}ms  line {2}: {3}".format("OK" if code == 0 else "FAIL", (perf_counter() - commandStart) * 1000, lineNumber, line), flush=True)
+        if code != 0 and stopOnError: break
+
+    print("Ran {0} command(s) in {1:.2f}s, {2} failed".format(count, perf_counter() - start, failed))
+    return failed == 0
+
+
+def main():
+    try:
+        if len(argv) < 2 or argv[1] in ('-h', '--help'):
+            printUsage()
+            exit(0 if len(argv) >= 2 else 2)
+
+        if argv[1] != BATCH_COMMAND:
+            exit(runCommand(argv[1:]))
+
+        batchArgs = argv[2:]
+        stopOnError = BATCH_STOP_OPTION in batchArgs
+        batchArgs = [a for a in batchArgs if a != BATCH_STOP_OPTION]
+        if len(batchArgs) > 1: raise Exception("{0} takes a single commands file".format(BATCH_COMMAND))
+        if len(batchArgs) == 0 or batchArgs[0] == '-':
+            succeeded = runBatchCommands(stdin, stopOnError)
+        else:
+            with open(batchArgs[0], "rt") as file:
+                succeeded = runBatchCommands(file, stopOnError)
+        if not succeeded:
+            exit(1)
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        import traceback
+        traceback.print_exception(e)
+        exit(1)
+
+
+if __name__ == "__main__":
+    from BatchRunner import freezeSupport
+    freezeSupport()
+    main()
@@ -1,79 +1,113 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left, insort
+from contextlib import ExitStack, nullcontext, redirect_stdout
 from enum import IntEnum, StrEnum
-from io import TextIOWrapper
+from heapq import merge
+from io import SEEK_END, TextIOWrapper
+from locale import getpreferredencoding
+from operator import itemgetter
 from pathlib import Path
-from sys import exit
+from sys import exit, stderr, stdin, stdout
+from time import perf_counter, sleep
+from BatchRunner import defaultWorkerCount, expandPaths, freezeSupport, runBatch
+from ColorRules import ColorRules, loadColorRules
+from EDLPatcher import EDLPatcher
+from EditJournal import EditJournal, journalPathFor
+from MappedReader import CHUNK_SIZE, iterLineChunks, mapFile, splitLineRanges
+from MarkerCoalescer import CoalesceKeep, MarkerCoalescer
+from MarkerFormats import DEFAULT_EXPORT_FORMATS, EXPORT_FORMATS, YOUTUBE_MIN_CHAPTER_SPACING, EDLWriter, FanOutWriter, formatEDLEvent, parseExportFormats
+from MarkerSorter import DEFAULT_SPILL_MARKERS, MarkerSorter
+from ParseCache import fileFingerprint, loadCache, storeCache
+from PhaseStats import DISABLED_STATS, PhaseStats, profileCall, reportStats
+from Timecode import HMSToSeconds, secondsToHMS, secondsToHMSF
+from TimestampPager import DEFAULT_PAGE_SIZE, TimestampPager
+from TimestampTable import TimestampColor, TimestampTable, TimestampView, TimelineTransform
 import re
-import traceback
-
-
-def secondsToHMS(seconds: int):
-    m, sec = divmod(seconds, 60)
-    hr, min = divmod(m, 60)
-    return "{0:02d}:{1:02d}:{2:02d}".format(hr, min, sec)
-
-def secondsToHMSF(seconds: int, frame: int = 0):
-    m, sec = divmod(seconds, 60)
-    hr, min = divmod(m, 60)
-    return "{0:02d}:{1:02d}:{2:02d}:{3:02d}".format(hr, min, sec, frame)
-
-def HMSToSeconds(timestamp: str):
-    m = re.match('^(\\d+):(\\d\\d):(\\d\\d)', timestamp)
-    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
-    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
-
-
-class TimestampColor(StrEnum):
-    Unknown = 'UNKNOWN'
-    Blue = 'Blue'
-    Cyan = 'Cyan'
-    Green = 'Green'
-    Yellow = 'Yellow'
-    Red = 'Red'
-    Ping = 'Ping'
-    Purple = 'Purple'
-    Fuchsia = 'Fuchsia'
-    Rose = 'Rose'
-    Lavender = 'Lavender'
-    Sky = 'Sky'
-    Mint = 'Mint'
-    Lemon = 'Lemon'
-    Sand = 'Sand'
-    Cocoa = 'Cocoa'
-    Cream = 'Cream'
-
-
-class Timestamp:
-    def __init__(self, name: str = "", timeSeconds: int = 0):
-        self.mName = name
-        self.mTimeSeconds = timeSeconds
-        self.mColor = TimestampColor.Blue
-
-    def setColor(self, c: TimestampColor):
-        self.mColor = c
-
-    def setName(self, name: str):
-        self.mName = name
+
+
+# accepts "-H:MM:SS" for negative times
+def signedHMSToSeconds(timestamp: str):
+    if timestamp.startswith('-'): return -HMSToSeconds(timestamp[1:])
+    return HMSToSeconds(timestamp)
+
+
+class Timestamp(TimestampView):
+    __slots__ = ()
 
     def outputEDL(self, file: TextIOWrapper, eventOrdinal: int):
-        timestamp = secondsToHMSF(self.mTimeSeconds, 0)
-        timestampPlusOne = secondsToHMSF(self.mTimeSeconds, 1)
-        file.writelines([
-            "{0:03d}  001      V     C         {1} {2} {1} {2}\n".format(eventOrdinal, timestamp, timestampPlusOne),
-            " |C:ResolveColor{0} |M:{1} |D:1\n".format(self.mColor.name, self.mName),
-            "\n"
-        ])
+        file.write(formatEDLEvent(eventOrdinal, self.mName, self.mTimeSeconds, self.mColor))
 
     def __str__(self):
         return "({0}, {1}) {2}".format(secondsToHMSF(self.mTimeSeconds), self.mColor.name, self.mName)
 
-    def getTimestamp(self):
-        return self.mTimeSeconds
 
-    def shiftTimestamp(self, secondsAdd: int):
-        self.mTimeSeconds = self.mTimeSeconds + secondsAdd
+# Name groups of timestamp table rows, each group kept sorted by time
+class TimestampNameIndex:
+    def __init__(self, table: TimestampTable):
+        self.mTable = table
+        self.mGroups: dict[str, array] = {}
+
+    def __len__(self):
+        return len(self.mGroups)
+
+    def __contains__(self, name: str):
+        return name in self.mGroups
+
+    def __getitem__(self, name: str):
+        return self.mGroups[name]
+
+    def keys(self):
+        return self.mGroups.keys()
+
+    def clear(self):
+        self.mGroups.clear()
+
+    def add(self, row: int):
+        name = self.mTable.getName(row)
+        group = self.mGroups.get(name)
+        if group == None:
+            group = self.mGroups[name] = array('q')
+        insort(group, row, key=self.mTable.timeSortKey())
+
+    # Bulk-build path; groups must be sorted with sortGroups() once all rows are added
+    def addUnsorted(self, row: int):
+        name = self.mTable.getName(row)
+        group = self.mGroups.get(name)
+        if group == None:
+            group = self.mGroups[name] = array('q')
+        group.append(row)
+
+    def sortGroups(self):
+        timeOf = self.mTable.timeSortKey()
+        for name, group in self.mGroups.items():
+            self.mGroups[name] = array('q', sorted(group, key=timeOf))
+
+    def rebuild(self):
+        groups = [array('q') for _ in self.mTable.mNames]
+        for row, nameId in enumerate(self.mTable.mNameIds):
+            groups[nameId].append(row)
+
+        self.mGroups.clear()
+        for nameId, group in enumerate(groups):
+            if len(group) > 0: self.mGroups[self.mTable.mNames[nameId]] = group
+        self.sortGroups()
+
+    # name of None is the current name of the row
+    def remove(self, row: int, name: str | None = None):
+        if name == None: name = self.mTable.getName(row)
+        group = self.mGroups[name]
+        timeOf = self.mTable.timeSortKey()
+        index = bisect_left(group, timeOf(row), key=timeOf)
+        # several rows can share the same time, find ours by row number
+        while group[index] != row:
+            index += 1
+        del group[index]
+
+        if len(group) == 0:
+            self.mGroups.pop(name)
 
 
 
@@ -85,6 +119,421 @@ class InfoWriterReaderState(IntEnum):
     RECORD_TIME = 4
     STREAM_TIME = 5
 
+# Single pattern classifying and extracting an InfoWriter line in one match:
+#   groups 1-2: EVENT/HOTKEY name and date, groups 3-6: H:MM:SS and marker kind
+INFOWRITER_LINE_PATTERN = '(?:(?:EVENT|HOTKEY):(.+) @ (.+)|(\\d+):(\\d\\d):(\\d\\d) (.*) Time.*)$'
+INFOWRITER_LINE_REGEX = re.compile('^' + INFOWRITER_LINE_PATTERN)
+# Bytes variant scanning a memory-mapped buffer in place, one findall() result per line; group 7
+# catches lines which are neither markers nor empty. Trailing whitespace is not part of the pattern,
+# it is stripped from the few groups where it matters.
+INFOWRITER_BUFFER_REGEX = re.compile(b'^(?:(?:EVENT|HOTKEY):(.+) @ (.+)|(\\d+):(\\d\\d):(\\d\\d) (.*) Time.*|(.*))$', re.MULTILINE)
+
+class InfoWriterParser:
+    def __init__(self, fromStream: bool = False, includeDateTime: bool = False):
+        self.mFromStream = fromStream
+        self.mIncludeDateTime = includeDateTime
+        self.mLastReadEventName = ""
+        self.mLineCount = 0
+
+    # Generator consuming raw lines and yielding (name, timeSeconds) for every kept marker
+    def parseLines(self, lines):
+        match = INFOWRITER_LINE_REGEX.match
+        includeDateTime = self.mIncludeDateTime
+        keptKind = 'Stream' if self.mFromStream else 'Record'
+        skippedKind = 'Record' if self.mFromStream else 'Stream'
+        lastReadEventName = self.mLastReadEventName
+        lineCount = self.mLineCount
+        try:
+            for line in lines:
+                lineCount += 1
+                line = line.rstrip()
+                if len(line) == 0: continue
+
+                m = match(line)
+                if m == None: raise self.lineError(line)
+
+                name, date, hr, min, sec, kind = m.groups()
+                if name != None:
+                    lastReadEventName = name + ' @ ' + date if includeDateTime else name
+                elif kind == keptKind:
+                    yield lastReadEventName, int(hr) * 3600 + int(min) * 60 + int(sec)
+                elif kind != skippedKind:
+                    raise self.lineError(line)
+        finally:
+            self.mLastReadEventName = lastReadEventName
+            self.mLineCount = lineCount
+
+    # Same as parseLines, but classifies raw bytes lines of buffer (ex. a memory-mapped file)
+    # without copying them, and only decodes names of markers which are kept.
+    # Only lines within [start, end) are parsed when given
+    def parseBuffer(self, buffer, encoding: str, start: int = 0, end: int | None = None):
+        findall = INFOWRITER_BUFFER_REGEX.findall
+        includeDateTime = self.mIncludeDateTime
+        keptKind = b'Stream' if self.mFromStream else b'Record'
+        skippedKind = b'Record' if self.mFromStream else b'Stream'
+        lastReadEventName = self.mLastReadEventName
+        lastReadRawName = None
+        lineCount = self.mLineCount
+        try:
+            for start, end in iterLineChunks(buffer, CHUNK_SIZE, start, end):
+                chunkFirstLine = lineCount
+                for name, date, hr, min, sec, kind, other in findall(buffer, start, end):
+                    lineCount += 1
+                    if len(hr) > 0:
+                        if kind == keptKind:
+                            if lastReadRawName != None:
+                                lastReadEventName = lastReadRawName.decode(encoding)
+                                lastReadRawName = None
+                            yield lastReadEventName, int(hr) * 3600 + int(min) * 60 + int(sec)
+                        elif kind != skippedKind:
+                            raise self.lineError(self.bufferLine(buffer, start, end, lineCount - chunkFirstLine - 1, encoding))
+                    elif len(name) > 0:
+                        date = date.rstrip()
+                        # trailing whitespace is matched rather than stripped, which can move the " @ " split
+                        if len(date) == 0:
+                            line = self.bufferLine(buffer, start, end, lineCount - chunkFirstLine - 1, encoding)
+                            m = INFOWRITER_LINE_REGEX.match(line)
+                            if m == None or m.group(1) == None: raise self.lineError(line)
+                            name, date = m.group(1).encode(encoding), m.group(2).encode(encoding)
+                        lastReadRawName = name + b' @ ' + date if includeDateTime else name
+                    elif not other.isspace() and len(other) > 0:
+                        raise self.lineError(self.bufferLine(buffer, start, end, lineCount - chunkFirstLine - 1, encoding))
+        finally:
+            if lastReadRawName != None: lastReadEventName = lastReadRawName.decode(encoding)
+            self.mLastReadEventName = lastReadEventName
+            self.mLineCount = lineCount
+
+    # index-th line of the buffer span, stripped and decoded; only used for the rare odd lines
+    def bufferLine(self, buffer, start: int, end: int, index: int, encoding: str):
+        return buffer[start:end].split(b'\n')[index].rstrip().decode(encoding)
+
+    # Classifies every line without raising on invalid ones; returns {InfoWriterReaderState: amount of lines}
+    def countLineStates(self, lines):
+        match = INFOWRITER_LINE_REGEX.match
+        counts = dict.fromkeys(InfoWriterReaderState, 0)
+        for line in lines:
+            line = line.rstrip()
+            if len(line) == 0:
+                state = InfoWriterReaderState.EMPTY_LINE
+            else:
+                m = match(line)
+                if m == None: state = InfoWriterReaderState.UNKNOWN
+                elif m.group(1) != None: state = InfoWriterReaderState.EVENT if line.startswith('EVENT:') else InfoWriterReaderState.HOTKEY
+                elif m.group(6) == 'Record': state = InfoWriterReaderState.RECORD_TIME
+                elif m.group(6) == 'Stream': state = InfoWriterReaderState.STREAM_TIME
+                else: state = InfoWriterReaderState.UNKNOWN
+            counts[state] += 1
+        return counts
+
+    def lineError(self, line: str):
+        if line.startswith('EVENT:') or line.startswith('HOTKEY:'):
+            return Exception('Failed to parse {0} line: {1}'.format(line.split(':')[0], line))
+        return Exception("Invalid line found when reading file ({1} characters): {0}".format(line, len(line)))
+
+# Streaming pipeline stages, each consuming and yielding (name, timeSeconds[, color]) markers
+def shiftMarkers(markers, transform: TimelineTransform):
+    apply = transform.apply
+    for name, timeSeconds in markers:
+        yield name, apply(timeSeconds)
+
+# exact name groupColors take precedence over colorRules
+def colorMarkers(markers, groupColors: dict[str, TimestampColor], colorRules: ColorRules | None = None):
+    defaultColor = TimestampColor.Blue
+    if colorRules == None:
+        for name, timeSeconds in markers:
+            yield name, timeSeconds, groupColors.get(name, defaultColor)
+        return
+
+    colorOf = colorRules.colorOf
+    for name, timeSeconds in markers:
+        color = groupColors.get(name)
+        if color == None: color = colorOf(name) or defaultColor
+        yield name, timeSeconds, color
+
+def filterColors(markers, colors: set[TimestampColor]):
+    for marker in markers:
+        if marker[2] in colors: yield marker
+
+# Stages between parsing and serialization, in order: shift, coloring (exact name groups, then
+# color rules), color filter, sorting by time and coalescing passes. Consumes (name, timeSeconds)
+# markers and yields (name, timeSeconds, color) ones.
+class MarkerPipeline:
+    def __init__(self, transform: TimelineTransform | None = None, groupColors: dict[str, TimestampColor] | None = None,
+                 colorRules: ColorRules | None = None, onlyColors: set[TimestampColor] | None = None,
+                 coalescers: list[MarkerCoalescer] | None = None, sorter: MarkerSorter | None = None):
+        self.mTransform = transform
+        self.mGroupColors = groupColors or {}
+        self.mColorRules = colorRules
+        self.mOnlyColors = onlyColors
+        self.mCoalescers = coalescers or []
+        self.mSorter = sorter
+
+    def apply(self, markers):
+        if self.mTransform != None: markers = shiftMarkers(markers, self.mTransform)
+        # colored before coalescing, so count-annotated names keep their group's color
+        markers = colorMarkers(markers, self.mGroupColors, self.mColorRules)
+        if self.mOnlyColors: markers = filterColors(markers, self.mOnlyColors)
+        # coalescing expects markers in time order
+        if self.mSorter != None: markers = self.mSorter.sort(markers)
+        for coalescer in self.mCoalescers: markers = coalescer.coalesce(markers)
+        return markers
+
+    def setCounters(self, stats: PhaseStats):
+        if len(self.mCoalescers) > 0: stats.setCounter('coalesced', sum(c.mMergedCount for c in self.mCoalescers))
+        if self.mSorter != None:
+            stats.setCounter('sortRuns', self.mSorter.mRunCount)
+            stats.setCounter('mergePasses', self.mSorter.mMergePasses)
+        if self.mColorRules != None:
+            for name, hits in self.mColorRules.hitCounters().items(): stats.setCounter(name, hits)
+
+NO_PIPELINE = MarkerPipeline()
+
+# "-" as input or output path stands for stdin / stdout
+STDIO_PATH = '-'
+
+def isStdio(path: Path | str | None):
+    return path != None and str(path) == STDIO_PATH
+
+def openOutput(outPath: Path):
+    return nullcontext(stdout) if isStdio(outPath) else open(outPath, "w+t")
+
+# {format name: output path} of export formats; a single format is written to outPath, several
+# ones next to it, with the suffix of outPath replaced by the suffix of each format
+def exportPaths(outPath: Path, formats: list[str]):
+    if len(formats) == 1: return {formats[0]: outPath}
+    if isStdio(outPath): raise Exception("Only a single export format can be written to stdout")
+    return {name: EXPORT_FORMATS[name].outputPath(outPath) for name in formats}
+
+# Opens the output files of outPaths on stack; returns a writer of all their formats
+def openExportWriter(stack: ExitStack, outPaths: dict[str, Path], title: str):
+    writers = [EXPORT_FORMATS[name].openWriter(stack.enter_context(openOutput(path)), title) for name, path in outPaths.items()]
+    return writers[0] if len(writers) == 1 else FanOutWriter(writers)
+
+# Last pipeline stage: runs (name, timeSeconds) markers through pipeline and serializes them with writer
+# returns amount of written timestamps
+def writeMarkers(markers, writer, pipeline: MarkerPipeline = NO_PIPELINE):
+    for name, timeSeconds, color in pipeline.apply(markers):
+        writer.write(name, timeSeconds, color)
+    return writer.close()
+
+# Non-interactive InfoWriter log to EDL (or any export formats, see exportPaths) conversion running
+# in constant memory; returns amount of converted timestamps
+# Parsing, transforms and serialization are fused, so stats only see them as a single convert phase
+def convertStreaming(inputPath: Path, outPath: Path, title: str, fromStream: bool = False, includeDateTime: bool = False,
+                     pipeline: MarkerPipeline = NO_PIPELINE, stats: PhaseStats = DISABLED_STATS,
+                     formats: list[str] = DEFAULT_EXPORT_FORMATS):
+    parser = InfoWriterParser(fromStream, includeDateTime)
+    # stdin cannot be read twice for the classification pass
+    if stats.mEnabled and not isStdio(inputPath):
+        with stats.phase('classify'), open(inputPath, "rt") as inputFile:
+            stats.addLineStates(parser.countLineStates(inputFile))
+
+    with stats.phase('open'):
+        inputFile = nullcontext(stdin) if isStdio(inputPath) else open(inputPath, "rt")
+    with inputFile as lines, stats.phase('convert'), ExitStack() as outputs:
+        count = writeMarkers(parser.parseLines(lines), openExportWriter(outputs, exportPaths(outPath, formats), title), pipeline)
+
+    stats.setCounter('lines', parser.mLineCount)
+    stats.setCounter('timestamps', count)
+    pipeline.setCounters(stats)
+    return count
+
+
+# K-way merge of several InfoWriter logs (ex. sessions split by restarts) into one timeline.
+# Every log is streamed by its own parser and shifted by its own offset; heapq.merge only holds
+# one pending marker per log, so memory does not grow with log sizes. Markers with equal times
+# keep the order of the logs. Logs are expected to be chronological - markers going back in time
+# within a log are counted in mOutOfOrder, as the merged timeline is not fully sorted then.
+class SessionMerger:
+    def __init__(self, inputPaths: list[Path], offsets: list[int], fromStream: bool = False, includeDateTime: bool = False):
+        if len(offsets) > len(inputPaths): raise Exception("Got {0} offsets for {1} merged logs".format(len(offsets), len(inputPaths)))
+        self.mInputPaths = inputPaths
+        self.mOffsets = offsets + [0] * (len(inputPaths) - len(offsets))
+        self.mFromStream = fromStream
+        self.mIncludeDateTime = includeDateTime
+        self.mLineCount = 0
+        self.mOutOfOrder = [0] * len(inputPaths)
+
+    # Generator yielding (name, timeSeconds) markers of all logs in time order
+    def markers(self):
+        with ExitStack() as stack:
+            files = [stack.enter_context(open(path, "rt")) for path in self.mInputPaths]
+            yield from merge(*(self.sessionMarkers(index, file) for index, file in enumerate(files)), key=itemgetter(1))
+
+    def sessionMarkers(self, index: int, inputFile: TextIOWrapper):
+        parser = InfoWriterParser(self.mFromStream, self.mIncludeDateTime)
+        offset = self.mOffsets[index]
+        lastTime = None
+        try:
+            for name, timeSeconds in parser.parseLines(inputFile):
+                timeSeconds += offset
+                if lastTime != None and timeSeconds < lastTime: self.mOutOfOrder[index] += 1
+                lastTime = timeSeconds
+                yield name, timeSeconds
+        finally:
+            self.mLineCount += parser.mLineCount
+
+    def printWarnings(self):
+        for path, count in zip(self.mInputPaths, self.mOutOfOrder):
+            if count > 0: print("Warning: {0} markers of {1} go back in time, merged timeline is not fully sorted".format(count, path))
+
+def convertMerged(merger: SessionMerger, outPath: Path, title: str, pipeline: MarkerPipeline = NO_PIPELINE,
+                  stats: PhaseStats = DISABLED_STATS, formats: list[str] = DEFAULT_EXPORT_FORMATS):
+    with stats.phase('convert'), ExitStack() as outputs:
+        count = writeMarkers(merger.markers(), openExportWriter(outputs, exportPaths(outPath, formats), title), pipeline)
+
+    stats.setCounter('lines', merger.mLineCount)
+    stats.setCounter('timestamps', count)
+    pipeline.setCounters(stats)
+    merger.printWarnings()
+    return count
+
+
+# Tails an InfoWriter log which is still being written and appends new EDL events to the output.
+# Only bytes appended since the last update are parsed; parser state (last read EVENT/HOTKEY name)
+# and an unfinished trailing line are carried over between updates.
+# Coalescing passes of pipeline would not see bursts spanning two updates, so they are not supported.
+class InfoWriterFollower:
+    def __init__(self, inputPath: Path, outPath: Path, title: str, fromStream: bool = False, includeDateTime: bool = False,
+                 pipeline: MarkerPipeline = NO_PIPELINE):
+        if len(pipeline.mCoalescers) > 0: raise Exception("Coalescing is not supported when following a log")
+        if pipeline.mSorter != None: raise Exception("Sorting is not supported when following a log, appended events cannot be reordered")
+        self.mInputPath = inputPath
+        self.mOutPath = outPath
+        self.mTitle = title
+        self.mPipeline = pipeline
+        self.mParser = InfoWriterParser(fromStream, includeDateTime)
+        self.mEncoding = getpreferredencoding(False)
+        self.mOffset = 0
+        self.mPartialLine = b''
+        self.mEventOrdinal = 1
+        self.mHeaderWritten = False
+
+    READ_CHUNK_SIZE = 1 << 20
+
+    # yields complete lines appended since the last update, keeping an unfinished line for later
+    def readNewLines(self, inputFile):
+        while True:
+            data = inputFile.read(self.READ_CHUNK_SIZE)
+            if len(data) == 0: return
+            self.mOffset += len(data)
+
+            data = self.mPartialLine + data
+            lineEnd = data.rfind(b'\n') + 1
+            self.mPartialLine = data[lineEnd:]
+            if lineEnd > 0:
+                yield from data[:lineEnd].decode(self.mEncoding).split('\n')[:-1]
+
+    # returns amount of newly appended timestamps
+    def update(self):
+        with open(self.mInputPath, "rb") as inputFile:
+            inputFile.seek(0, SEEK_END)
+            size = inputFile.tell()
+            if size < self.mOffset:
+                raise Exception("File {0} shrank while following it, was the log restarted?".format(self.mInputPath))
+            if size == self.mOffset and self.mHeaderWritten: return 0
+            inputFile.seek(self.mOffset)
+
+            markers = self.mParser.parseLines(self.readNewLines(inputFile))
+
+            with open(self.mOutPath, "at" if self.mHeaderWritten else "w+t") as file:
+                writer = EDLWriter(file, None if self.mHeaderWritten else self.mTitle, eventOrdinal=self.mEventOrdinal)
+                for name, timeSeconds, color in self.mPipeline.apply(markers):
+                    writer.write(name, timeSeconds, color)
+                writer.close()
+            self.mHeaderWritten = True
+
+        newEvents = writer.mEventOrdinal - self.mEventOrdinal
+        self.mEventOrdinal = writer.mEventOrdinal
+        return newEvents
+
+    def follow(self, interval: float):
+        print("Following {0}, writing to {1} (Ctrl+C to stop)".format(self.mInputPath, self.mOutPath))
+        try:
+            while True:
+                newEvents = self.update()
+                if newEvents > 0:
+                    print("Appended {0} timestamps ({1} total)".format(newEvents, self.mEventOrdinal - 1))
+                sleep(interval)
+        except KeyboardInterrupt:
+            print("\nStopped following, {0} timestamps written to {1}".format(self.mEventOrdinal - 1, self.mOutPath))
+            if self.mPipeline.mColorRules != None: print(self.mPipeline.mColorRules.report())
+
+
+# Parse job of a single [start, end) range of lines of a larger file, run on a process pool.
+# Markers before the first event line of the range do not know their name yet - their times are
+# returned separately and named with the last event of the previous range when merging.
+# returns (unresolved leading times, names, name ids, times, last event name or None, line count)
+def parseRangeJob(inputPath: Path, start: int, end: int, fromStream: bool, includeDateTime: bool, encoding: str):
+    parser = InfoWriterParser(fromStream, includeDateTime)
+    parser.mLastReadEventName = None
+    leadingTimes, nameIds, times = array('q'), array('I'), array('q')
+    names: list[str] = []
+    nameLookup: dict[str, int] = {}
+    with mapFile(inputPath) as buffer:
+        for name, timeSeconds in parser.parseBuffer(buffer, encoding, start, end):
+            if name == None:
+                leadingTimes.append(timeSeconds)
+                continue
+
+            nameId = nameLookup.get(name)
+            if nameId == None:
+                nameId = nameLookup[name] = len(names)
+                names.append(name)
+            nameIds.append(nameId)
+            times.append(timeSeconds)
+
+    return leadingTimes, names, nameIds, times, parser.mLastReadEventName, parser.mLineCount
+
+# Marker pipeline of convertFileJob options; colorRules loaded by the caller replace the options' rules path
+def pipelineFromOptions(options: dict, colorRules: ColorRules | None = None):
+    transform = None
+    if options.get('shift'):
+        transform = TimelineTransform()
+        transform.shift(options['shift'])
+
+    coalescers = []
+    if options.get('coalesceWindow'):
+        coalescers.append(MarkerCoalescer(options['coalesceWindow'], not options.get('coalesceAnyName'), CoalesceKeep(options.get('coalesceKeep', 'first'))))
+    if options.get('chapterSpacing'):
+        coalescers.append(MarkerCoalescer(options['chapterSpacing'], False, CoalesceKeep.FIRST))
+    if colorRules == None and options.get('colorRules'): colorRules = loadColorRules(Path(options['colorRules']))
+    onlyColors = set(options['onlyColors']) if options.get('onlyColors') else None
+    sorter = MarkerSorter(options.get('sortSpill') or DEFAULT_SPILL_MARKERS, options.get('sortTempDir')) if options.get('sort') else None
+    return MarkerPipeline(transform, options.get('groupColors'), colorRules, onlyColors, coalescers, sorter)
+
+# Raises when an output of outPaths ({format name: path}) would overwrite the input, or an existing
+# file without overwrite
+def checkExportPaths(inputPath: Path, outPaths: dict[str, Path], overwrite: bool):
+    for path in outPaths.values():
+        if isStdio(path): continue
+        if not isStdio(inputPath) and path.resolve() == inputPath.resolve():
+            raise Exception("Output {0} would overwrite the input, choose another path with --output".format(path))
+        if path.exists() and not overwrite: raise Exception("File {0} already exists, use --overwrite to replace it".format(path))
+
+# Batch job converting a single file, see BatchRunner.runBatch for options handling.
+# Input path "-" reads stdin and writes stdout unless an output is given.
+# returns (output paths joined with ", ", amount of timestamps[, stats])
+def convertFileJob(inputPath: Path, options: dict, stats: PhaseStats | None = None, colorRules: ColorRules | None = None):
+    formats = options.get('formats') or DEFAULT_EXPORT_FORMATS
+    if options.get('output'): outPath = Path(options['output'])
+    elif isStdio(inputPath): outPath = Path(STDIO_PATH)
+    else: outPath = EXPORT_FORMATS[formats[0]].outputPath(inputPath)
+    if not isStdio(inputPath) and not inputPath.exists(): raise Exception("Provided file path {0} does not exist".format(inputPath))
+    outPaths = exportPaths(outPath, formats)
+    checkExportPaths(inputPath, outPaths, options.get('overwrite'))
+
+    stem = "stdin" if isStdio(inputPath) else inputPath.stem
+    title = options.get('title')
+    title = stem if title == None else title.replace('{name}', stem)
+    if stats == None: stats = PhaseStats(traceAllocations=options.get('traceAllocations', False)) if options.get('stats') else DISABLED_STATS
+    count = convertStreaming(inputPath, outPath, title, options.get('fromStream', False), options.get('includeDateTime', False),
+                             pipelineFromOptions(options, colorRules), stats, formats)
+    outputs = ', '.join(map(str, outPaths.values()))
+    if options.get('stats'): return outputs, count, stats.toDict()
+    return outputs, count
+
+
 class ConverterState(StrEnum):
     MAIN_MENU = '0'
     CONVERT = '1'
@@ -93,6 +542,10 @@ class ConverterState(StrEnum):
     EDIT_COLOR_SINGLE = '4'
     EDIT_COLOR_NAME_GROUP = '5'
     SHIFT_TIMESTAMPS = '6'
+    COALESCE = '7'
+    COLOR_RULES = '8'
+    UNDO = 'U'
+    REDO = 'R'
     EXIT = 'Q'
 
 def stateToPrettyString(state: ConverterState):
@@ -102,49 +555,53 @@ def stateToPrettyString(state: ConverterState):
         case ConverterState.RENAME_SINGLE: return "Rename timestamp"
         case ConverterState.EDIT_COLOR_SINGLE: return "Change single timestamp's color"
         case ConverterState.EDIT_COLOR_NAME_GROUP: return "Change timestamp color by name group"
-        case ConverterState.SHIFT_TIMESTAMPS: return "Shift all timestamps' times"
+        case ConverterState.SHIFT_TIMESTAMPS: return "Shift timestamps' times"
+        case ConverterState.COALESCE: return "Merge nearby duplicate timestamps"
+        case ConverterState.COLOR_RULES: return "Change timestamp colors by rules file"
+        case ConverterState.UNDO: return "Undo last edit"
+        case ConverterState.REDO: return "Redo undone edit"
         case ConverterState.EXIT: return "Exit"
         case _: return "UNKNOWN/INVALID/THIS SHOULD NOT BE SEEN"
 
+# parallel parsing splits the file into a few ranges per worker, so uneven ranges balance out,
+# but never into ranges smaller than PARSE_RANGE_MIN_SIZE bytes
+PARSE_RANGES_PER_WORKER = 4
+PARSE_RANGE_MIN_SIZE = 1 << 22
+
 class TimestampConverter:
-    def __init__(self, filePath: str, fromStream: bool = False, includeDateTime: bool = False):
+    def __init__(self, filePath: str, fromStream: bool = False, includeDateTime: bool = False, useCache: bool = True,
+                 useMmap: bool = False, parseJobs: int = 1, stats: PhaseStats = DISABLED_STATS, profilePath: str | None = None,
+                 merger: SessionMerger | None = None, colorRules: ColorRules | None = None, pageSize: int = DEFAULT_PAGE_SIZE,
+                 useJournal: bool = True, exportFormats: list[str] = DEFAULT_EXPORT_FORMATS):
         self.mInputPath = Path(filePath)
         self.mFromStream = fromStream
         self.mIncludeDateTime = includeDateTime
-        self.mTimestamps: list[Timestamp] = []
-        self.mTimestampNameGroups: dict[str, list[Timestamp]] = {}
-
-    def determineInfoWriterLineType(self, line: str):
-        if len(line) == 0: return InfoWriterReaderState.EMPTY_LINE
-        if line.startswith('EVENT:'): return InfoWriterReaderState.EVENT
-        if line.startswith('HOTKEY:'): return InfoWriterReaderState.HOTKEY
-
-        # it's neither an event nor a hotkey, so it has to be a parseable timestamp and either
-        # "Record Time Marker" or "Stream Time Marker". If it's neither, return UNKNOWN
-        m = re.match('^\\d:\\d\\d:\\d\\d (.*) Time.*$', line)
-        if m == None: return InfoWriterReaderState.UNKNOWN
-
-        if m.group(1) == 'Record': return InfoWriterReaderState.RECORD_TIME
-        elif m.group(1) == 'Stream': return InfoWriterReaderState.STREAM_TIME
-        else: return InfoWriterReaderState.UNKNOWN
-
-    # atIndex points where to insert the timestamp; negative value appends at the end
-    def addTimestamp(self, timestamp: Timestamp, atIndex: int = -1):
-        if atIndex < 0:
-            self.mTimestamps.append(timestamp)
-        else:
-            self.mTimestamps.insert(atIndex, timestamp)
-
-        if timestamp.mName not in self.mTimestampNameGroups:
-            self.mTimestampNameGroups[timestamp.mName] = list[Timestamp]()
-        self.mTimestampNameGroups[timestamp.mName].append(timestamp)
-        self.mTimestampNameGroups[timestamp.mName].sort(key=Timestamp.getTimestamp)
-
-    def delTimestamp(self, timestamp: Timestamp):
-        self.mTimestamps.remove(timestamp)
-        self.mTimestampNameGroups[timestamp.mName].remove(timestamp)
-        if len(self.mTimestampNameGroups[timestamp.mName]) == 0:
-            self.mTimestampNameGroups.pop(timestamp.mName)
+        self.mUseCache = useCache
+        self.mUseMmap = useMmap
+        self.mParseJobs = parseJobs
+        self.mStats = stats
+        self.mProfilePath = profilePath
+        # when merging several logs, filePath is only used to name the output
+        self.mMerger = merger
+        # applied right after reading the input
+        self.mColorRules = colorRules
+        self.mTimestamps = TimestampTable(Timestamp)
+        self.mTimestampNameGroups = TimestampNameIndex(self.mTimestamps)
+        self.mPager = TimestampPager(self.mTimestamps, pageSize)
+        self.mUseJournal = useJournal
+        self.mExportFormats = exportFormats
+        # fingerprint of the input, once computed for the parse cache or the journal
+        self.mFingerprint: tuple | None = None
+        # interactive edits go through the journal, created once the input is read
+        self.mJournal: EditJournal | None = None
+        # repeated converts only rewrite EDL events edited in between
+        self.mEDLPatcher = EDLPatcher()
+
+    # returns row of the added timestamp
+    def addTimestamp(self, name: str, timeSeconds: int):
+        row = self.mTimestamps.append(name, timeSeconds)
+        self.mTimestampNameGroups.add(row)
+        return row
 
     def queryIndex(self, thing: str, max: int):
         index = 0
@@ -198,43 +655,137 @@ class TimestampConverter:
             else:
                 print("Incorrect answer: {0}".format(a))
 
+    # options the parsed timestamps depend on, for the parse cache and the journal
+    def parseOptions(self):
+        return "InfoWriter stream={0} full={1}".format(int(self.mFromStream), int(self.mIncludeDateTime))
+
+    # returns amount of lines read from the input file
     def readInputFile(self):
         self.mTimestamps.clear()
-        readerState = InfoWriterReaderState.UNKNOWN
-        with open(self.mInputPath, "rt") as inputFile:
-            lastReadEventName = ""
-            lastReadEventTimestampSeconds = 0
-            writtenTimestamps = 0
-            for line in inputFile:
-                line = line.rstrip()
-
-                # determine what line we read
-                readerState = self.determineInfoWriterLineType(line)
-                match readerState:
-                    case InfoWriterReaderState.EMPTY_LINE:
-                        pass
-                    case InfoWriterReaderState.EVENT:
-                        m = re.search('^EVENT:(.+) @ (.+)$', line)
-                        if m == None: raise Exception('Failed to parse EVENT line: {0}'.format(line))
-                        lastReadEventName = m.group(1)
-                        if self.mIncludeDateTime: lastReadEventName += ' @ ' + m.group(2)
-                    case InfoWriterReaderState.HOTKEY:
-                        m = re.search('^HOTKEY:(.+) @ (.+)$', line)
-                        if m == None: raise Exception('Failed to parse HOTKEY line: {0}'.format(line))
-                        lastReadEventName = m.group(1)
-                        if self.mIncludeDateTime: lastReadEventName += ' @ ' + m.group(2)
-                    case InfoWriterReaderState.RECORD_TIME:
-                        if not self.mFromStream:
-                            lastReadEventTimestampSeconds = HMSToSeconds(line.split(' ')[0])
-                            self.addTimestamp(Timestamp(lastReadEventName, lastReadEventTimestampSeconds))
-                            writtenTimestamps += 1
-                    case InfoWriterReaderState.STREAM_TIME:
-                        if self.mFromStream:
-                            lastReadEventTimestampSeconds = HMSToSeconds(line.split(' ')[0])
-                            self.addTimestamp(Timestamp(lastReadEventName, lastReadEventTimestampSeconds))
-                            writtenTimestamps += 1
-                    case _:
-                        raise Exception("Invalid line found when reading file ({1} characters): {0}".format(line, len(line)))
+        self.mTimestampNameGroups.clear()
+        if self.mMerger != None: return self.parseMergedInputFiles()
+        if self.mStats.mEnabled:
+            with self.mStats.phase('classify'), open(self.mInputPath, "rt") as inputFile:
+                self.mStats.addLineStates(InfoWriterParser(self.mFromStream, self.mIncludeDateTime).countLineStates(inputFile))
+        if not self.mUseCache: return self.parseInputFile()
+
+        cacheOptions = self.parseOptions()
+        with self.mStats.phase('open'):
+            fingerprint = self.mFingerprint = fileFingerprint(self.mInputPath)
+            lineCount = loadCache(self.mInputPath, cacheOptions, fingerprint, self.mTimestamps)
+        if lineCount != None:
+            with self.mStats.phase('index'):
+                self.mTimestampNameGroups.rebuild()
+            return lineCount
+
+        lineCount = self.parseInputFile()
+        with self.mStats.phase('cache'):
+            storeCache(self.mInputPath, cacheOptions, fingerprint, self.mTimestamps, lineCount)
+        return lineCount
+
+    def parseInputFile(self):
+        if self.mParseJobs > 1: return self.parseInputFileParallel(self.mParseJobs)
+
+        parser = InfoWriterParser(self.mFromStream, self.mIncludeDateTime)
+        with self.mStats.phase('parse'):
+            if self.mUseMmap:
+                with mapFile(self.mInputPath) as buffer:
+                    for name, timeSeconds in parser.parseBuffer(buffer, getpreferredencoding(False)):
+                        self.mTimestampNameGroups.addUnsorted(self.mTimestamps.append(name, timeSeconds))
+            else:
+                with open(self.mInputPath, "rt") as inputFile:
+                    for name, timeSeconds in parser.parseLines(inputFile):
+                        self.mTimestampNameGroups.addUnsorted(self.mTimestamps.append(name, timeSeconds))
+
+        with self.mStats.phase('index'):
+            self.mTimestampNameGroups.sortGroups()
+
+        return parser.mLineCount
+
+    def parseMergedInputFiles(self):
+        self.mMerger.mLineCount = 0
+        with self.mStats.phase('parse'):
+            for name, timeSeconds in self.mMerger.markers():
+                self.mTimestampNameGroups.addUnsorted(self.mTimestamps.append(name, timeSeconds))
+
+        with self.mStats.phase('index'):
+            self.mTimestampNameGroups.sortGroups()
+
+        self.mMerger.printWarnings()
+        return self.mMerger.mLineCount
+
+    # Splits the file into line ranges parsed on a process pool, then merges them in file order
+    def parseInputFileParallel(self, workers: int):
+        with mapFile(self.mInputPath) as buffer:
+            ranges = splitLineRanges(buffer, max(1, min(workers * PARSE_RANGES_PER_WORKER, len(buffer) // PARSE_RANGE_MIN_SIZE)))
+
+        count = len(ranges)
+        jobArgs = ([self.mInputPath] * count, [r[0] for r in ranges], [r[1] for r in ranges],
+                   [self.mFromStream] * count, [self.mIncludeDateTime] * count, [getpreferredencoding(False)] * count)
+        with self.mStats.phase('parse'):
+            if count < 2:
+                lineCount = self.mergeParsedRanges(map(parseRangeJob, *jobArgs))
+            else:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=min(workers, count)) as executor:
+                    lineCount = self.mergeParsedRanges(executor.map(parseRangeJob, *jobArgs))
+
+        with self.mStats.phase('index'):
+            self.mTimestampNameGroups.rebuild()
+        return lineCount
+
+    # Appends parseRangeJob results in file order, naming each range's leading markers after
+    # the last event of the ranges before it; returns amount of lines read. Name groups have to
+    # be rebuilt afterwards
+    def mergeParsedRanges(self, results):
+        lastReadEventName = ""
+        lineCount = 0
+        for leadingTimes, names, nameIds, times, rangeLastEventName, rangeLineCount in results:
+            if len(leadingTimes) > 0: self.mTimestamps.appendColumns(leadingTimes, array('I', [0]) * len(leadingTimes), [lastReadEventName])
+            self.mTimestamps.appendColumns(times, nameIds, names)
+            if rangeLastEventName != None: lastReadEventName = rangeLastEventName
+            lineCount += rangeLineCount
+
+        return lineCount
+
+    def writeOutput(self, outPath: Path, title: str):
+        self.writeOutputs({'edl': outPath}, title)
+
+    # Writes the timestamps in all formats of outPaths ({format name: path}) in a single pass.
+    # Events are numbered in time order whatever the order of rows (renames, shifts and merges can
+    # leave them out of order), rows with equal times keep their order
+    def writeOutputs(self, outPaths: dict[str, Path], title: str):
+        table = self.mTimestamps
+        with self.mStats.phase('serialize'), ExitStack() as outputs:
+            times = table.mTimes if table.mTransform == None else array('q', map(table.mTransform.apply, table.mTimes))
+            writer = openExportWriter(outputs, outPaths, title)
+            for row in sorted(range(len(table)), key=times.__getitem__):
+                writer.write(table.getName(row), times[row], table.getColor(row))
+            writer.close()
+
+    # Opens the edit journal of the input and replays it onto the read timestamps. Without journaling
+    # (or for merged logs, which have no single input) the journal only keeps the undo history
+    def openJournal(self):
+        path = None
+        if self.mUseJournal and self.mMerger == None:
+            path = journalPathFor(self.mInputPath)
+            if self.mFingerprint == None: self.mFingerprint = fileFingerprint(self.mInputPath)
+        self.mJournal = EditJournal(path, self.mFingerprint, self.parseOptions(), self.mTimestamps, self.mTimestampNameGroups)
+
+        start = perf_counter()
+        with self.mStats.phase('journal'):
+            replayed = self.mJournal.load()
+        if replayed != None:
+            print("Replayed {0} edits of journal {1} in {2:.3f}s".format(replayed, path, perf_counter() - start))
+
+    def printEditNote(self):
+        if self.mJournal.mPath != None: print("Edit saved to journal {0}, the input file is not changed".format(self.mJournal.mPath))
+        else: print("Note that timestamp colors are NOT reflected in the input file")
+
+    def setGroupColor(self, name: str, color: TimestampColor):
+        with self.mStats.phase('transforms'):
+            for row in self.mTimestampNameGroups[name]:
+                self.mTimestamps.setColor(row, color)
 
     def processSummary(self):
         print("\nTimestamp file has {0} timestamps ({1} different event names)\n".format(len(self.mTimestamps), len(self.mTimestampNameGroups.keys())))
@@ -258,36 +809,41 @@ class TimestampConverter:
     def processConvert(self):
         title = input("Type title to be added on top of file: ")
 
-        outPath = self.mInputPath.with_suffix(".edl")
+        outPaths = exportPaths(EXPORT_FORMATS[self.mExportFormats[0]].outputPath(self.mInputPath), self.mExportFormats)
+        outList = ', '.join(map(str, outPaths.values()))
+        if any(path.resolve() == self.mInputPath.resolve() for path in outPaths.values()):
+            print("Output {0} would overwrite the input, choose other --formats".format(self.mInputPath))
+            return ConverterState.MAIN_MENU
 
-        if not self.queryConfirmation(preamble="Will convert to file {0}".format(outPath),
+        if not self.queryConfirmation(preamble="Will convert to file {0}".format(outList),
                                       prompt="Is that okay?"):
             return ConverterState.MAIN_MENU
 
-        if outPath.exists():
-            if not self.queryConfirmation("File {0} already exists, overwrite?".format(outPath)):
+        existing = [str(path) for path in outPaths.values() if path.exists()]
+        if len(existing) > 0:
+            if not self.queryConfirmation("File {0} already exists, overwrite?".format(', '.join(existing))):
                 return ConverterState.MAIN_MENU
 
-        with open(outPath, "w+t") as file:
-            file.writelines([
-                "TITLE: {0}\n".format(title),
-                "FCM: NON-DROP FRAME\n",
-                "\n"
-            ])
-
-            counter = 1
-            for t in self.mTimestamps:
-                t.outputEDL(file, counter)
-                counter += 1
-
-        print("Generated EDL file {0}".format(outPath))
+        patched = None
+        patcher = self.mEDLPatcher
+        if 'edl' in outPaths:
+            with self.mStats.phase('serialize'):
+                patched = patcher.save(self.mTimestamps, outPaths['edl'], title)
+            # rebuilding the EDL around events changing length copies the rest of the file
+            self.mStats.setCounter('edlWrittenBytes', patcher.mWrittenBytes)
+            self.mStats.setCounter('edlCopiedBytes', patcher.mCopiedBytes)
+        otherPaths = {name: path for name, path in outPaths.items() if name != 'edl'}
+        if len(otherPaths) > 0: self.writeOutputs(otherPaths, title)
+        print("Generated {0} file{1} {2}".format(', '.join(name.upper() for name in outPaths), "s" if len(outPaths) > 1 else "", outList))
+        if patched != None:
+            copied = ", copying {0} unchanged bytes into a new file".format(patcher.mCopiedBytes) if patcher.mCopiedBytes > 0 else ""
+            print("Updated {0} edited events of the previously generated EDL ({1} bytes written{2})".format(patched, patcher.mWrittenBytes, copied))
         return ConverterState.MAIN_MENU
 
     def processRenameSingle(self):
-        tIndex = self.queryIndex("timestamp", len(self.mTimestamps))
-        if tIndex == 0: return ConverterState.MAIN_MENU
+        tIndex = self.mPager.browse("timestamp to rename")
+        if tIndex == None: return ConverterState.MAIN_MENU
 
-        tIndex -= 1
         timestamp = self.mTimestamps[tIndex]
         print("Will rename timestamp:\n  {0}. {1}".format(tIndex, str(timestamp)))
 
@@ -306,29 +862,26 @@ class TimestampConverter:
                     print("Invalid option: {0}".format(confirmation))
             if confirmation == 'Y': break
 
-        self.delTimestamp(timestamp)
-        timestamp.setName(newName)
-        self.addTimestamp(timestamp, tIndex)
+        self.mJournal.rename(tIndex, newName)
 
         print("\nRenamed timestamp:\n  {0}. {1}".format(tIndex, str(timestamp)))
-        print("Note that timestamp colors are NOT reflected in the input file")
+        self.printEditNote()
 
         return ConverterState.MAIN_MENU
 
     def processEditColorSingle(self):
-        tIndex = self.queryIndex("timestamp", len(self.mTimestamps))
-        if tIndex == 0: return ConverterState.MAIN_MENU
+        tIndex = self.mPager.browse("timestamp to edit")
+        if tIndex == None: return ConverterState.MAIN_MENU
 
-        tIndex -= 1
         timestamp = self.mTimestamps[tIndex]
         print("Will edit color of timestamp:\n  {0}. {1}".format(tIndex, str(timestamp)))
 
         color = self.queryColor()
         if color == TimestampColor.Unknown: return ConverterState.MAIN_MENU
 
-        timestamp.setColor(color)
+        self.mJournal.setColor(tIndex, color)
         print("\nTimestamp edited, now is:\n  {0}. {1}".format(tIndex, str(timestamp)))
-        print("Note that timestamp colors are NOT reflected in the input file")
+        self.printEditNote()
         return ConverterState.MAIN_MENU
 
     def processEditColorNameGroup(self):
@@ -342,51 +895,155 @@ class TimestampConverter:
         if gIndex == 0: return ConverterState.MAIN_MENU
 
         gName = list(self.mTimestampNameGroups.keys())[gIndex - 1]
-        timestampList = self.mTimestampNameGroups[gName]
+        groupRows = self.mTimestampNameGroups[gName]
 
-        print("Will batch-edit color of {0} timestamps titled {1}".format(len(timestampList), gName))
+        print("Will batch-edit color of {0} timestamps titled {1}".format(len(groupRows), gName))
 
         color = self.queryColor()
         if color == TimestampColor.Unknown: return ConverterState.MAIN_MENU
 
-        for t in timestampList:
-            t.setColor(color)
+        with self.mStats.phase('transforms'):
+            self.mJournal.setGroupColor(gName, color)
+        print("Updated {0} timestamps from group {1}".format(len(groupRows), gName))
+        self.printEditNote()
+        return ConverterState.MAIN_MENU
 
-        print("Updated {0} timestamps from group {1}".format(len(timestampList), gName))
-        print("Note that timestamp colors are NOT reflected in the input file")
+    # returns amount of recolored timestamps
+    def applyColorRules(self, rules: ColorRules):
+        rules.resetHits()
+        with self.mStats.phase('transforms'):
+            recolored = rules.applyToTable(self.mTimestamps)
+        for name, hits in rules.hitCounters().items(): self.mStats.setCounter(name, hits)
+        return recolored
+
+    def processColorRules(self):
+        print("\nThis option will recolor all timestamps whose name matches a rule of a rules file, first matching rule wins.")
+        print("Every line of the file is \"COLOR PATTERN\", where PATTERN is a glob (ex. \"Death*\") or a regular expression prefixed with \"re:\"")
+        while True:
+            path = input("Rules file path (Q to cancel): ").strip()
+            if path.capitalize() == 'Q': return ConverterState.MAIN_MENU
+            try:
+                rules = loadColorRules(Path(path))
+                break
+            except Exception as e:
+                print("Could not load rules: {0}".format(e))
+
+        oldColors = array('B', self.mTimestamps.mColors)
+        recolored = self.applyColorRules(rules)
+        self.mJournal.recordColors(oldColors)
+        print(rules.report())
+        print("Updated {0} timestamps".format(recolored))
+        self.printEditNote()
         return ConverterState.MAIN_MENU
 
     def processList(self):
-        print("Available Timestamps:")
-        counter = 1
-        for t in self.mTimestamps:
-            print("  {0}. {1}".format(counter, str(t)))
-            counter += 1
-
+        self.mPager.browse(quitLabel="return to menu")
         return ConverterState.MAIN_MENU
 
-    def processShiftTimestamps(self):
-        print("\nThis option will shift all timestamps forward by provided time.")
-        timeSeconds = 0
+    # returns None when cancelled, or emptyValue when nothing was typed and emptyValue is provided
+    def queryTime(self, prompt: str, allowNegative: bool = False, emptyValue: int | None = None):
         while True:
-            time = input("Provide time shift in \"H:MM:SS\" format (Q to cancel): ")
-            if time.capitalize() == 'Q':
-                return ConverterState.MAIN_MENU
+            time = input("{0} (Q to cancel): ".format(prompt)).strip()
+            if time.capitalize() == 'Q': return None
+            if len(time) == 0 and emptyValue != None: return emptyValue
 
             try:
-                timeSeconds = HMSToSeconds(time)
-                break
+                if allowNegative: return signedHMSToSeconds(time)
+                return HMSToSeconds(time)
             except Exception:
                 print("Incorrect value provided")
 
-        if not self.queryConfirmation(preamble="\nWill shift all timestamps by {0} ({1} seconds)".format(secondsToHMS(timeSeconds), timeSeconds),
+    def processShiftTimestamps(self):
+        print("\nThis option will shift timestamps by provided time.")
+        timeSeconds = self.queryTime("Provide time shift in \"H:MM:SS\" format, \"-H:MM:SS\" shifts backwards", allowNegative=True)
+        if timeSeconds == None: return ConverterState.MAIN_MENU
+
+        windowStart = None
+        windowEnd = None
+        scale = 1.0
+        if self.queryConfirmation("Shift only timestamps within a time window (ex. after a stream restart)?"):
+            windowStart = self.queryTime("Window start in \"H:MM:SS\" format")
+            if windowStart == None: return ConverterState.MAIN_MENU
+            windowEnd = self.queryTime("Window end in \"H:MM:SS\" format (empty for end of the timeline)", emptyValue=-1)
+            if windowEnd == None: return ConverterState.MAIN_MENU
+            if windowEnd < 0: windowEnd = None
+        else:
+            while True:
+                o = input("Time scale factor to correct frame rate drift, applied before the shift (empty for none): ").strip()
+                if len(o) == 0: break
+                try:
+                    scale = float(o)
+                    if scale <= 0: raise ValueError("Scale must be positive")
+                    break
+                except ValueError:
+                    print("Incorrect value provided")
+
+        shiftString = "{0}{1}".format('-' if timeSeconds < 0 else '', secondsToHMS(abs(timeSeconds)))
+        target = "all timestamps"
+        if windowStart != None:
+            target = "timestamps from {0} to {1}".format(secondsToHMS(windowStart), "the end" if windowEnd == None else secondsToHMS(windowEnd))
+        if scale != 1.0:
+            target += " (scaled by {0})".format(scale)
+        if not self.queryConfirmation(preamble="\nWill shift {0} by {1} ({2} seconds)".format(target, shiftString, timeSeconds),
+                                      prompt="Is this okay?"):
+            return ConverterState.MAIN_MENU
+
+        with self.mStats.phase('transforms'):
+            self.mJournal.shift(timeSeconds, windowStart, windowEnd, scale)
+            negativeRows = self.mTimestamps.negativeRows() if timeSeconds < 0 else []
+
+        if len(negativeRows) > 0 and self.queryConfirmation("{0} timestamps fall before 00:00:00. Drop them? Otherwise they are clamped to 00:00:00".format(len(negativeRows))):
+            with self.mStats.phase('transforms'):
+                self.mJournal.dropNegative()
+            print("Dropped {0} timestamps".format(len(negativeRows)))
+
+        print("\nShifted {0} by {1}".format(target, shiftString))
+        return ConverterState.MAIN_MENU
+
+    def processCoalesce(self):
+        print("\nThis option will merge timestamps closer to each other than a time window into one (ex. a hotkey pressed several times in a row).")
+        window = self.queryTime("Provide time window in \"H:MM:SS\" format")
+        if window == None: return ConverterState.MAIN_MENU
+        if window <= 0:
+            print("Time window has to be longer than 0 seconds")
+            return ConverterState.MAIN_MENU
+
+        byName = self.queryConfirmation("Merge only timestamps with the same name? Otherwise any nearby timestamps are merged")
+        keep = None
+        while keep == None:
+            o = input("Which timestamp to keep, [F]irst, [L]ast or first with [C]ount of merged ones in its name (Q to cancel): ").strip().capitalize()
+            match o:
+                case 'F': keep = CoalesceKeep.FIRST
+                case 'L': keep = CoalesceKeep.LAST
+                case 'C': keep = CoalesceKeep.COUNT
+                case 'Q': return ConverterState.MAIN_MENU
+                case _: print("Incorrect value provided")
+
+        target = "timestamps with the same name" if byName else "any timestamps"
+        if not self.queryConfirmation(preamble="\nWill merge {0} within {1} of each other, keeping the {2} one{3}. Timestamps will be sorted by time".format(
+                                          target, secondsToHMS(window), 'last' if keep == CoalesceKeep.LAST else 'first',
+                                          " with merged count" if keep == CoalesceKeep.COUNT else ""),
                                       prompt="Is this okay?"):
             return ConverterState.MAIN_MENU
 
-        for t in self.mTimestamps:
-            t.shiftTimestamp(timeSeconds)
+        count = len(self.mTimestamps)
+        with self.mStats.phase('transforms'):
+            self.mJournal.coalesce(window, byName, keep)
+        removed = count - len(self.mTimestamps)
 
-        print("\nShifted all timestamps by {0}".format(secondsToHMS(timeSeconds)))
+        print("\nMerged {0} timestamps, {1} left".format(removed, len(self.mTimestamps)))
+        return ConverterState.MAIN_MENU
+
+    def processUndo(self):
+        edit = self.mJournal.undo()
+        if edit == None: print("\nNothing to undo")
+        else: print("\nUndid {0}".format(edit))
+        return ConverterState.MAIN_MENU
+
+    def processRedo(self):
+        edit = self.mJournal.redo()
+        if edit == None: print("\nNothing to redo")
+        else: print("\nRedid {0}".format(edit))
         return ConverterState.MAIN_MENU
 
     def mainLoop(self):
@@ -395,8 +1052,18 @@ class TimestampConverter:
             print("Provided file path does not exist")
             exit(1)
 
-        self.readInputFile()
+        start = perf_counter()
+        lineCount = profileCall(self.mProfilePath, self.readInputFile) if self.mProfilePath != None else self.readInputFile()
+        elapsed = perf_counter() - start
+        self.mStats.setCounter('lines', lineCount)
+        self.mStats.setCounter('timestamps', len(self.mTimestamps))
+        self.mStats.setCounter('names', len(self.mTimestampNameGroups))
         print("Timestamp file {0} parsed successfully.".format(self.mInputPath))
+        print("Read {0} lines in {1:.3f}s ({2:.0f} lines/sec)".format(lineCount, elapsed, lineCount / elapsed if elapsed > 0 else 0))
+        if self.mColorRules != None:
+            self.applyColorRules(self.mColorRules)
+            print(self.mColorRules.report())
+        self.openJournal()
 
         state = ConverterState.MAIN_MENU
         while state != ConverterState.EXIT:
@@ -408,29 +1075,214 @@ class TimestampConverter:
                 case ConverterState.EDIT_COLOR_SINGLE: state = self.processEditColorSingle()
                 case ConverterState.EDIT_COLOR_NAME_GROUP: state = self.processEditColorNameGroup()
                 case ConverterState.SHIFT_TIMESTAMPS: state = self.processShiftTimestamps()
+                case ConverterState.COALESCE: state = self.processCoalesce()
+                case ConverterState.COLOR_RULES: state = self.processColorRules()
+                case ConverterState.UNDO: state = self.processUndo()
+                case ConverterState.REDO: state = self.processRedo()
                 case _: pass
 
         print("\nCheers, enjoy your day\n")
 
 
-def main():
+def main(argv: list[str] | None = None):
     try:
         parser = ArgumentParser(
             prog='InfoWriterToEDL',
             description='Program converting InfoWriter log file to DaVinci Resolve-compatible EDL timeline marker list'
         )
-        parser.add_argument('filepath', help='Path to InfoWriter log file. Output will be in the same directory under the same name with .edl extension')
+        parser.add_argument('filepaths', nargs='+', metavar='filepath',
+                            help='Path to InfoWriter log file. Output will be in the same directory under the same name with .edl extension. '
+                                 'Several files or glob patterns can be given with --convert-only, "-" reads stdin and writes stdout')
         parser.add_argument('-s', '--stream', help='Consider stream markers instead of record markers',
                             action='store_true', default=False)
         parser.add_argument('-f', '--full', help='Read full event name - adds event\'s date and time to timestamp name',
                             action='store_true', default=False)
-        args = parser.parse_args()
-
-        TimestampConverter(args.filepath, args.stream).mainLoop()
+        parser.add_argument('--no-cache', help='Do not read nor write the parse cache sidecar (.hhcache) of the input file',
+                            action='store_true', default=False)
+        parser.add_argument('--mmap', help='Read the input through a memory map in interactive mode, classifying raw bytes without decoding skipped lines',
+                            action='store_true', default=False)
+        parser.add_argument('--parse-jobs', help='Amount of worker processes parsing the input in interactive mode, 0 for CPU count (defaults to 1, sequential)',
+                            type=int, default=1)
+        parser.add_argument('--merge', help='Merge all input logs into a single timeline (ex. sessions split by restarts), '
+                                            'with --convert-only into a single EDL named after the first log',
+                            action='store_true', default=False)
+        parser.add_argument('--offset', help='Offset "H:MM:SS" of a merged log, given once per log in input order (missing ones are 0). '
+                                             'Use --offset=-H:MM:SS for negative offsets',
+                            action='append', default=[])
+        parser.add_argument('--no-journal', help='Do not read nor write the edit journal sidecar (.hhjournal) keeping interactive edits of the input file',
+                            action='store_true', default=False)
+        parser.add_argument('--page-size', help='Timestamps per page when listing them in interactive mode (default {0})'.format(DEFAULT_PAGE_SIZE),
+                            type=int, default=DEFAULT_PAGE_SIZE)
+        parser.add_argument('-c', '--convert-only', help='Convert straight to EDL without the interactive menu',
+                            action='store_true', default=False)
+        parser.add_argument('-t', '--title', help='EDL title used with --convert-only, {name} is replaced with input file name (defaults to input file name)')
+        parser.add_argument('-o', '--output', help='Output EDL path used with --convert-only and a single input file, "-" writes stdout. '
+                                                   'With several --formats the suffix of the path is replaced by the suffix of each format')
+        parser.add_argument('-y', '--overwrite', help='Overwrite existing output file when using --convert-only',
+                            action='store_true', default=False)
+        parser.add_argument('-j', '--jobs', help='Amount of worker processes converting files in parallel (defaults to CPU count)',
+                            type=int, default=0)
+        parser.add_argument('--follow', help='Keep following the log as InfoWriter appends to it and append new events to the EDL (implies --convert-only)',
+                            action='store_true', default=False)
+        parser.add_argument('--follow-interval', help='Seconds between checks for new log lines in --follow mode (default 1)',
+                            type=float, default=1.0)
+        parser.add_argument('--shift', help='Shift all timestamps by "H:MM:SS" when using --convert-only. Use --shift=-H:MM:SS to shift backwards')
+        parser.add_argument('--color', help='Color timestamps of given name group when using --convert-only, ex. "Death=Red". Can be repeated',
+                            action='append', default=[], metavar='NAME=COLOR')
+        parser.add_argument('--color-rules', help='Recolor timestamps by a rules file of "COLOR PATTERN" lines (glob, or regular expression prefixed with "re:"), '
+                                                  'first matching rule wins and --color names take precedence. Hits per rule are printed in interactive, --merge and --follow modes '
+                                                  'and counted in --stats otherwise',
+                            metavar='PATH')
+        parser.add_argument('--only-color', help='Only output timestamps of given color (after --color and --color-rules) when using --convert-only. Can be repeated',
+                            action='append', default=[], metavar='COLOR')
+        parser.add_argument('--coalesce', help='Merge timestamps of the same name closer than given seconds to the first of their burst into one when using --convert-only',
+                            type=int, default=0, metavar='SECONDS')
+        parser.add_argument('--coalesce-any-name', help='Make --coalesce merge nearby timestamps of any name, which also keeps kept timestamps at least --coalesce seconds apart',
+                            action='store_true', default=False)
+        parser.add_argument('--coalesce-keep', help='Timestamp kept by --coalesce: first, last or first with the merged count in its name (default first)',
+                            choices=[k.value for k in CoalesceKeep], default=CoalesceKeep.FIRST.value)
+        parser.add_argument('--chapter-spacing', help='Drop timestamps closer than given seconds to the previous kept one when using --convert-only, '
+                                                      'as YouTube requires chapters at least {0} seconds apart (default {0} when given without a value)'.format(YOUTUBE_MIN_CHAPTER_SPACING),
+                            type=int, nargs='?', const=YOUTUBE_MIN_CHAPTER_SPACING, default=0, metavar='SECONDS')
+        parser.add_argument('--sort', help='Order timestamps by time (equal times keep their log order) before numbering events when using --convert-only, '
+                                           'inputs longer than --sort-spill are sorted through temporary files',
+                            action='store_true', default=False)
+        parser.add_argument('--sort-spill', help='Timestamps --sort holds in memory, longer inputs are cut into sorted runs spilled to temporary files '
+                                                 'and merged (default {0})'.format(DEFAULT_SPILL_MARKERS),
+                            type=int, default=DEFAULT_SPILL_MARKERS, metavar='TIMESTAMPS')
+        parser.add_argument('--sort-temp-dir', help='Directory of the --sort temporary files (defaults to the system temporary directory)', metavar='PATH')
+        parser.add_argument('--youtube', help='Write YouTube chapters (.youtube.txt) straight from the log instead of an EDL when using --convert-only, '
+                                              'same as converting the EDL with EDLToYouTubeTimestamp (short for --formats youtube)',
+                            action='store_true', default=False)
+        parser.add_argument('--formats', help='Comma separated export formats, all written in a single pass over the timestamps, named after the input with the '
+                                              'suffix of each format: {0} (default {1})'.format(
+                                                  ', '.join("{0} ({1}, {2})".format(f.mName, f.mDescription, f.mSuffix) for f in EXPORT_FORMATS.values()), ','.join(DEFAULT_EXPORT_FORMATS)),
+                            metavar='FORMAT[,FORMAT...]')
+        parser.add_argument('--stats', help='Print wall time and allocations of each phase and line counts per reader state',
+                            action='store_true', default=False)
+        parser.add_argument('--stats-json', help='Write the --stats statistics as JSON to given path', metavar='PATH')
+        parser.add_argument('--trace-alloc', help='Also trace allocated bytes of each phase with tracemalloc (much slower)',
+                            action='store_true', default=False)
+        parser.add_argument('--profile', help='Dump a cProfile profile of reading the input (interactive) or of the conversion (--convert-only, runs in-process) to given path',
+                            metavar='PATH')
+        args = parser.parse_args(argv)
+
+        paths = expandPaths(args.filepaths)
+        if args.formats and args.youtube: raise Exception("--youtube is short for --formats youtube, give only one of them")
+        formats = parseExportFormats(args.formats) if args.formats else ['youtube'] if args.youtube else list(DEFAULT_EXPORT_FORMATS)
+        colorRules = loadColorRules(Path(args.color_rules)) if args.color_rules else None
+        collectStats = args.stats or args.stats_json != None or args.trace_alloc
+        merger = SessionMerger(paths, [signedHMSToSeconds(o) for o in args.offset], args.stream, args.full) if args.merge else None
+        if args.offset and not args.merge: raise Exception("--offset can only be used with --merge")
+        if args.follow: args.convert_only = True
+        if not args.convert_only:
+            if any(isStdio(path) for path in paths) or isStdio(args.output): raise Exception("stdin and stdout can only be used with --convert-only")
+            if len(paths) > 1 and not args.merge: raise Exception("Interactive mode handles a single file, use --merge or --convert-only for several files")
+            parseJobs = args.parse_jobs if args.parse_jobs > 0 else defaultWorkerCount()
+            stats = PhaseStats(traceAllocations=args.trace_alloc) if collectStats else DISABLED_STATS
+            try:
+                TimestampConverter(paths[0], args.stream, args.full, not args.no_cache, args.mmap, parseJobs, stats, args.profile, merger,
+                                   colorRules, args.page_size, not args.no_journal, formats).mainLoop()
+            finally:
+                if collectStats: reportStats({str(paths[0]): stats.toDict()}, args.stats, args.stats_json)
+            return
+
+        if args.output and len(paths) > 1 and not args.merge: raise Exception("--output can only be used with a single input file or --merge")
+
+        groupColors = {}
+        for c in args.color:
+            name, sep, color = c.rpartition('=')
+            if len(sep) == 0: raise Exception("Invalid --color value {0}, expected NAME=COLOR".format(c))
+            groupColors[name] = TimestampColor(color)
+
+        if args.coalesce < 0: raise Exception("--coalesce window cannot be negative")
+        if args.chapter_spacing < 0: raise Exception("--chapter-spacing cannot be negative")
+        if args.sort_spill < 1: raise Exception("--sort-spill has to be at least 1")
+        options = {
+            'fromStream': args.stream,
+            'includeDateTime': args.full,
+            'title': args.title,
+            'output': args.output,
+            'overwrite': args.overwrite,
+            'formats': formats,
+            'shift': signedHMSToSeconds(args.shift) if args.shift else 0,
+            'groupColors': groupColors,
+            'colorRules': args.color_rules,
+            'onlyColors': [TimestampColor(c) for c in args.only_color],
+            'coalesceWindow': args.coalesce,
+            'coalesceAnyName': args.coalesce_any_name,
+            'coalesceKeep': args.coalesce_keep,
+            'chapterSpacing': args.chapter_spacing,
+            'sort': args.sort,
+            'sortSpill': args.sort_spill,
+            'sortTempDir': args.sort_temp_dir,
+            'stats': collectStats,
+            'traceAllocations': args.trace_alloc,
+        }
+
+        if args.follow:
+            if len(paths) > 1 or args.merge: raise Exception("--follow handles a single file")
+            if collectStats or args.profile: raise Exception("--stats and --profile cannot be used with --follow")
+            if args.coalesce > 0 or args.chapter_spacing > 0 or args.sort: raise Exception("--coalesce, --chapter-spacing and --sort cannot be used with --follow")
+            if formats != ['edl'] or isStdio(paths[0]) or isStdio(args.output): raise Exception("--follow only appends to EDL files")
+            outPath = Path(args.output) if args.output else paths[0].with_suffix(".edl")
+            if outPath.exists() and not args.overwrite: raise Exception("File {0} already exists, use --overwrite to replace it".format(outPath))
+
+            title = paths[0].stem if args.title == None else args.title.replace('{name}', paths[0].stem)
+            InfoWriterFollower(paths[0], outPath, title, args.stream, args.full, pipelineFromOptions(options, colorRules)).follow(args.follow_interval)
+            return
+
+        # as a Unix filter everything but the output goes to stderr
+        filterMode = isStdio(args.output) or any(isStdio(path) for path in paths)
+        with redirect_stdout(stderr) if filterMode else nullcontext():
+            if args.merge:
+                if any(isStdio(path) for path in paths): raise Exception("--merge reads log files, not stdin")
+                outPath = Path(args.output) if args.output else EXPORT_FORMATS[formats[0]].outputPath(paths[0])
+                outPaths = exportPaths(outPath, formats)
+                for path in paths: checkExportPaths(path, outPaths, args.overwrite)
+
+                title = paths[0].stem if args.title == None else args.title.replace('{name}', paths[0].stem)
+                pipeline = pipelineFromOptions(options, colorRules)
+                stats = PhaseStats(traceAllocations=args.trace_alloc) if collectStats else DISABLED_STATS
+                try:
+                    if args.profile: count = profileCall(args.profile, convertMerged, merger, outPath, title, pipeline, stats, formats)
+                    else: count = convertMerged(merger, outPath, title, pipeline, stats, formats)
+                finally:
+                    if collectStats: reportStats({str(outPath): stats.toDict()}, args.stats, args.stats_json)
+                print("Merged {0} logs: {1} timestamps -> {2}".format(len(paths), count, ', '.join(map(str, outPaths.values()))))
+                if colorRules != None: print(colorRules.report())
+                return
+
+            if filterMode:
+                if len(paths) > 1: raise Exception("Only a single input can be converted from stdin or to stdout")
+                stats = PhaseStats(traceAllocations=args.trace_alloc) if collectStats else DISABLED_STATS
+                options['stats'] = False
+                try:
+                    if args.profile: result = profileCall(args.profile, convertFileJob, paths[0], options, stats, colorRules)
+                    else: result = convertFileJob(paths[0], options, stats, colorRules)
+                finally:
+                    if collectStats: reportStats({str(paths[0]): stats.toDict()}, args.stats, args.stats_json)
+                print("{0} timestamps -> {1}".format(result[1], "stdout" if isStdio(result[0]) else result[0]))
+                if colorRules != None: print(colorRules.report())
+                return
+
+        statsByPath = {}
+        try:
+            if args.profile:
+                succeeded = profileCall(args.profile, runBatch, convertFileJob, paths, options, 1, statsByPath)
+            else:
+                succeeded = runBatch(convertFileJob, paths, options, args.jobs, statsByPath)
+        finally:
+            if collectStats: reportStats(statsByPath, args.stats, args.stats_json)
+        if not succeeded:
+            exit(1)
     except Exception as e:
         print("Exception caught by main: {0}".format(e))
+        # error-only path, traceback is not loaded by runs which succeed
+        import traceback
         traceback.print_exception(e)
         exit(1)
 
 if __name__ == "__main__":
+    freezeSupport()
     main()
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+
+
+CHUNK_SIZE = 1 << 23
+
+
+# Memory-maps the file for reading; empty files (which cannot be mapped) give an empty bytes object
+@contextmanager
+def mapFile(path: Path):
+    with open(path, "rb") as file:
+        if file.seek(0, 2) == 0:
+            yield b''
+            return
+        with mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+            yield buffer
+
+# Splits buffer into (start, end) spans of roughly chunkSize bytes holding whole lines. end points
+# at the newline closing the last line of the span (or the buffer end), so spans can be scanned
+# in place with pattern.findall(buffer, start, end) or sliced and split on b'\n'.
+# Only the [bufferStart, bufferEnd) part of the buffer is split when given.
+def iterLineChunks(buffer, chunkSize: int = CHUNK_SIZE, bufferStart: int = 0, bufferEnd: int | None = None):
+    size = len(buffer) if bufferEnd == None else bufferEnd
+    if size <= bufferStart: return
+    if buffer[size - 1] == 0x0A: size -= 1
+    start = bufferStart
+    while True:
+        end = start + chunkSize
+        if end >= size:
+            end = size
+        else:
+            end = buffer.find(b'\n', end, size)
+            if end < 0: end = size
+        yield start, end
+        if end >= size: break
+        start = end + 1
+
+# Splits buffer into at most parts (start, end) ranges of about the same size, each ending right
+# after a newline (or at the buffer end), so the ranges can be parsed independently
+def splitLineRanges(buffer, parts: int):
+    size = len(buffer)
+    ranges = []
+    start = 0
+    for i in range(1, parts):
+        end = buffer.find(b'\n', max(start, size * i // parts))
+        if end < 0: break
+        ranges.append((start, end + 1))
+        start = end + 1
+    if start < size: ranges.append((start, size))
+    return ranges
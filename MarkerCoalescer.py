@@ -0,0 +1,88 @@
+from collections import deque
+from enum import StrEnum
+from heapq import heappop, heappush
+from TimestampTable import TimestampTable
+
+
+class CoalesceKeep(StrEnum):
+    FIRST = 'first'
+    LAST = 'last'
+    COUNT = 'count'
+
+# open burst: [key, start time, first marker, last marker, marker count, creation order]
+KEY, START, FIRST, LAST, COUNT, ORDER = range(6)
+
+
+# Merges bursts of markers (ex. hotkey mashing) closer than window seconds to the first marker of
+# their burst into one marker. Bursts are per name, or across all names with byName of False, which
+# also enforces a minimal spacing between kept markers (ex. YouTube chapters) when keeping first.
+#
+# Markers are (name, timeSeconds, ...) tuples sorted by time. The sweep keeps open bursts in
+# start order and closed ones in a heap ordered by their output time, so output stays sorted and
+# memory only holds markers within the window. O(n log n) overall.
+class MarkerCoalescer:
+    def __init__(self, window: int, byName: bool = True, keep: CoalesceKeep = CoalesceKeep.FIRST):
+        self.mWindow = window
+        self.mByName = byName
+        self.mKeep = keep
+        self.mMergedCount = 0
+
+    def coalesce(self, markers):
+        window = self.mWindow
+        byName = self.mByName
+        openClusters = deque()
+        openByKey: dict = {}
+        closed: list[tuple] = []
+        popOpen = openClusters.popleft
+        order = 0
+        merged = 0
+        try:
+            for marker in markers:
+                timeSeconds = marker[1]
+                while openClusters and timeSeconds - openClusters[0][START] >= window:
+                    self.closeCluster(popOpen(), openByKey, closed)
+
+                # nothing still open, nor started later, can come out before this time
+                bound = min(openClusters[0][START], timeSeconds) if openClusters else timeSeconds
+                while closed and closed[0][0] <= bound:
+                    yield heappop(closed)[2]
+
+                key = marker[0] if byName else None
+                cluster = openByKey.get(key)
+                if cluster == None:
+                    cluster = openByKey[key] = [key, timeSeconds, marker, marker, 1, order]
+                    openClusters.append(cluster)
+                    order += 1
+                else:
+                    cluster[LAST] = marker
+                    cluster[COUNT] += 1
+                    merged += 1
+
+            while openClusters:
+                self.closeCluster(popOpen(), openByKey, closed)
+            while closed:
+                yield heappop(closed)[2]
+        finally:
+            self.mMergedCount += merged
+
+    def closeCluster(self, cluster: list, openByKey: dict, closed: list):
+        del openByKey[cluster[KEY]]
+        if self.mKeep == CoalesceKeep.LAST: marker = cluster[LAST]
+        elif self.mKeep == CoalesceKeep.COUNT and cluster[COUNT] > 1:
+            marker = ("{0} (x{1})".format(cluster[FIRST][0], cluster[COUNT]),) + cluster[FIRST][1:]
+        else: marker = cluster[FIRST]
+        heappush(closed, (marker[1], cluster[ORDER], marker))
+
+
+# Coalesces all rows of table (whatever their order) and compacts it to the kept rows in time
+# order; count-annotated names are written back. Returns amount of removed rows.
+def coalesceTable(table: TimestampTable, coalescer: MarkerCoalescer):
+    rows = sorted(range(len(table)), key=table.getTime)
+    keptRows = []
+    for name, timeSeconds, row in coalescer.coalesce((table.getName(row), table.getTime(row), row) for row in rows):
+        if name != table.getName(row): table.setName(row, name)
+        keptRows.append(row)
+
+    removed = len(table) - len(keptRows)
+    table.compact(keptRows)
+    return removed
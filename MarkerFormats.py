@@ -0,0 +1,257 @@
+from io import TextIOWrapper
+from operator import attrgetter
+from pathlib import Path
+from Timecode import encodeHMS, encodeShortHMS, secondsToHMS
+from TimestampTable import TimestampColor
+
+
+# Output formats shared by the tools: EDL events, YouTube chapters, CSV, JSON, SRT subtitles and
+# FFmpeg metadata chapters, registered by name in EXPORT_FORMATS. Every writer buffers a chunk of
+# markers and serializes it with a single write to its output stream, timecodes of the whole chunk
+# encoded at once. FanOutWriter hands the same chunks to several writers, so one pass over the
+# markers writes all selected formats. Kept apart from the tools so each of them (and the
+# HandyHelpers entry point) only loads the serializers, not the other tool's reader and menus.
+OUTPUT_CHUNK_SIZE = 4096
+
+def formatEDLHeader(title: str):
+    return "TITLE: {0}\nFCM: NON-DROP FRAME\n\n".format(title)
+
+# EDL markers span one frame, from frame 00 to frame 01 of the same second
+EDL_EVENT_FORMAT = "{0:03d}  001      V     C         {1}:00 {1}:01 {1}:00 {1}:01\n |C:ResolveColor{2} |M:{3} |D:1\n\n"
+
+def formatEDLEvent(eventOrdinal: int, name: str, timeSeconds: int, color: TimestampColor):
+    return EDL_EVENT_FORMAT.format(eventOrdinal, secondsToHMS(timeSeconds), color.name, name)
+
+colorNames = attrgetter('name')
+
+
+# Base of the writers: collects (name, timeSeconds, color) markers and hands chunks of chunkSize
+# markers, as parallel lists, to writeChunk() of the format. close() writes the rest and whatever
+# follows the last marker, and returns amount of written markers.
+class ChunkedWriter:
+    def __init__(self, file: TextIOWrapper | None, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        self.mFile = file
+        self.mChunkSize = chunkSize
+        self.mNames: list[str] = []
+        self.mTimes: list[int] = []
+        self.mColors: list[TimestampColor] = []
+        self.mCount = 0
+
+    def write(self, name: str, timeSeconds: int, color: TimestampColor = TimestampColor.Blue):
+        self.mNames.append(name)
+        self.mTimes.append(timeSeconds)
+        self.mColors.append(color)
+        if len(self.mTimes) >= self.mChunkSize:
+            self.flush()
+
+    # writes a chunk of markers given as parallel lists, bypassing the buffer; the lists are not kept
+    def writeColumns(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        self.writeChunk(names, times, colors)
+        self.mCount += len(times)
+
+    def flush(self):
+        self.writeColumns(self.mNames, self.mTimes, self.mColors)
+        self.mNames.clear()
+        self.mTimes.clear()
+        self.mColors.clear()
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+    def close(self):
+        self.flush()
+        self.finish()
+        return self.mCount
+
+
+# EDL serializer, title of None skips the header, so events can be appended to an existing EDL
+# from eventOrdinal
+class EDLWriter(ChunkedWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None, chunkSize: int = OUTPUT_CHUNK_SIZE, eventOrdinal: int = 1):
+        super().__init__(file, chunkSize)
+        self.mHeader = formatEDLHeader(title) if title != None else ""
+        self.mEventOrdinal = eventOrdinal
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        eventFormat = EDL_EVENT_FORMAT.format
+        firstOrdinal = self.mEventOrdinal
+        self.mEventOrdinal += len(times)
+        self.mFile.write(self.mHeader + ''.join([eventFormat(ordinal, timecode, color.name, name) for ordinal, timecode, color, name
+                                                 in zip(range(firstOrdinal, self.mEventOrdinal), encodeHMS(times), colors, names)]))
+        self.mHeader = ""
+
+
+# EDLToYouTubeTimestamp reads names back from the EDL with the space before " |D:", chapters
+# written straight from a log keep that space too, so both paths give the same file
+YOUTUBE_NAME_SUFFIX = ' '
+# YouTube ignores chapter lists with chapters closer than this many seconds
+YOUTUBE_MIN_CHAPTER_SPACING = 10
+
+# YouTube chapters serializer, nameSuffix is appended to every name; chapters have no title
+class YouTubeWriter(ChunkedWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None = None, chunkSize: int = OUTPUT_CHUNK_SIZE, nameSuffix: str = ""):
+        super().__init__(file, chunkSize)
+        self.mNameSuffix = nameSuffix
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        suffix = self.mNameSuffix
+        self.mFile.write(''.join(["{0} {1}{2}\n".format(timecode, name, suffix) for timecode, name in zip(encodeShortHMS(times), names)]))
+
+
+# CSV rows of event ordinal (same as in the EDL), seconds, timecode, name and color, after a header row
+CSV_HEADER = ('event', 'seconds', 'timecode', 'name', 'color')
+
+class CSVWriter(ChunkedWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None = None, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(file, chunkSize)
+        import csv
+        self.mWriter = csv.writer(file, lineterminator='\n')
+        self.mWriter.writerow(CSV_HEADER)
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        first = self.mCount + 1
+        self.mWriter.writerows(zip(range(first, first + len(times)), times, encodeHMS(times), names, map(colorNames, colors)))
+
+
+# {"title": ..., "markers": [{"event", "seconds", "timecode", "name", "color"}, ...]}, streamed out
+# chunk by chunk with a marker per line
+class JSONWriter(ChunkedWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None = None, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(file, chunkSize)
+        from json import dumps
+        self.mDumps = dumps
+        self.mSeparator = '\n'
+        file.write('{{"title": {0}, "markers": ['.format(dumps(title)))
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        if len(times) == 0: return
+        dumps = self.mDumps
+        first = self.mCount + 1
+        self.mFile.write(self.mSeparator + ',\n'.join(['{{"event": {0}, "seconds": {1}, "timecode": "{2}", "name": {3}, "color": "{4}"}}'.format(
+            ordinal, timeSeconds, timecode, dumps(name), color.name)
+            for ordinal, timeSeconds, timecode, name, color in zip(range(first, first + len(times)), times, encodeHMS(times), names, colors)]))
+        self.mSeparator = ',\n'
+
+    def finish(self):
+        self.mFile.write('\n]}\n')
+
+
+# the last chapter has no next marker to end at
+LAST_CHAPTER_SECONDS = 10
+
+# Base of formats made of chapters with an end: a chapter lasts until the next marker (at least a
+# second, for markers out of time order or sharing a time), the last one LAST_CHAPTER_SECONDS.
+# The last marker of a chunk waits for the next chunk; writeChapters() gets names, starts and ends.
+class ChapterWriter(ChunkedWriter):
+    def __init__(self, file: TextIOWrapper, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(file, chunkSize)
+        # (name, start) of the marker waiting for its end
+        self.mPending: tuple | None = None
+        self.mChapterCount = 0
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        if len(times) == 0: return
+        if self.mPending != None:
+            names = [self.mPending[0]] + names
+            times = [self.mPending[1]] + times
+        self.mPending = (names[-1], times[-1])
+        starts = times[:-1]
+        self.writeChapters(names[:-1], starts, [max(end, start + 1) for start, end in zip(starts, times[1:])])
+
+    def finish(self):
+        if self.mPending == None: return
+        name, start = self.mPending
+        self.mPending = None
+        self.writeChapters([name], [start], [start + LAST_CHAPTER_SECONDS])
+
+    def writeChapters(self, names: list[str], starts: list[int], ends: list[int]):
+        raise NotImplementedError
+
+
+# SubRip subtitles showing the name of every chapter for its whole length
+class SRTWriter(ChapterWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None = None, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(file, chunkSize)
+
+    def writeChapters(self, names: list[str], starts: list[int], ends: list[int]):
+        first = self.mChapterCount + 1
+        self.mChapterCount += len(starts)
+        self.mFile.write(''.join(["{0}\n{1},000 --> {2},000\n{3}\n\n".format(cue, start, end, name) for cue, start, end, name
+                                  in zip(range(first, self.mChapterCount + 1), encodeHMS(starts), encodeHMS(ends), names)]))
+
+
+# characters with a meaning in FFmpeg metadata files, escaped with a backslash in values
+FFMETADATA_ESCAPES = str.maketrans({c: '\\' + c for c in '=;#\\\n'})
+
+# FFmpeg metadata with a chapter per marker, muxed in with
+#   ffmpeg -i video.mp4 -i chapters.ffmetadata -map_metadata 1 -codec copy out.mp4
+class FFMetadataWriter(ChapterWriter):
+    def __init__(self, file: TextIOWrapper, title: str | None = None, chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(file, chunkSize)
+        file.write(";FFMETADATA1\n" + ("" if title == None else "title={0}\n".format(title.translate(FFMETADATA_ESCAPES))))
+
+    def writeChapters(self, names: list[str], starts: list[int], ends: list[int]):
+        self.mChapterCount += len(starts)
+        self.mFile.write(''.join(["\n[CHAPTER]\nTIMEBASE=1/1000\nSTART={0}\nEND={1}\ntitle={2}\n".format(start * 1000, end * 1000, name.translate(FFMETADATA_ESCAPES))
+                                  for start, end, name in zip(starts, ends, names)]))
+
+
+# Writes every marker to all writers: markers are buffered once and every chunk goes to each writer.
+# close() closes the writers too
+class FanOutWriter(ChunkedWriter):
+    def __init__(self, writers: list[ChunkedWriter], chunkSize: int = OUTPUT_CHUNK_SIZE):
+        super().__init__(None, chunkSize)
+        self.mWriters = writers
+
+    def writeChunk(self, names: list[str], times: list[int], colors: list[TimestampColor]):
+        for writer in self.mWriters:
+            writer.writeColumns(names, times, colors)
+
+    def finish(self):
+        for writer in self.mWriters:
+            writer.close()
+
+
+# Export format selected by name, written to files with suffix by writerType(file, title, **writerOptions)
+class ExportFormat:
+    def __init__(self, name: str, suffix: str, description: str, writerType: type, **writerOptions):
+        self.mName = name
+        self.mSuffix = suffix
+        self.mDescription = description
+        self.mWriterType = writerType
+        self.mWriterOptions = writerOptions
+
+    def openWriter(self, file: TextIOWrapper, title: str):
+        return self.mWriterType(file, title, **self.mWriterOptions)
+
+    # path with the suffix of its export format (ex. .youtube.txt as a whole), or else its last
+    # suffix, replaced by the suffix of this format
+    def outputPath(self, path: Path):
+        for suffix in sorted((f.mSuffix for f in EXPORT_FORMATS.values()), key=len, reverse=True):
+            if path.name.endswith(suffix) and len(path.name) > len(suffix): return path.with_name(path.name[:-len(suffix)] + self.mSuffix)
+        return path.with_suffix(self.mSuffix)
+
+EXPORT_FORMATS: dict[str, ExportFormat] = {}
+DEFAULT_EXPORT_FORMATS = ('edl',)
+
+def registerExportFormat(exportFormat: ExportFormat):
+    EXPORT_FORMATS[exportFormat.mName] = exportFormat
+
+# comma separated format names, ex. "edl,csv"; returns list of the names
+def parseExportFormats(text: str):
+    names = [name.strip().lower() for name in text.split(',') if len(name.strip()) > 0]
+    if len(names) == 0: raise Exception("No export format given, expected some of: {0}".format(', '.join(EXPORT_FORMATS)))
+    for name in names:
+        if name not in EXPORT_FORMATS: raise Exception("Unknown export format {0}, expected some of: {1}".format(name, ', '.join(EXPORT_FORMATS)))
+    if len(set(names)) < len(names): raise Exception("Export formats {0} list a format twice".format(text))
+    return names
+
+registerExportFormat(ExportFormat('edl', '.edl', 'DaVinci Resolve EDL markers', EDLWriter))
+registerExportFormat(ExportFormat('youtube', '.youtube.txt', 'YouTube chapters', YouTubeWriter, nameSuffix=YOUTUBE_NAME_SUFFIX))
+registerExportFormat(ExportFormat('csv', '.csv', 'CSV table', CSVWriter))
+registerExportFormat(ExportFormat('json', '.json', 'JSON marker list', JSONWriter))
+registerExportFormat(ExportFormat('srt', '.srt', 'SubRip subtitles of chapter names', SRTWriter))
+registerExportFormat(ExportFormat('ffmetadata', '.ffmetadata', 'FFmpeg metadata chapters', FFMetadataWriter))
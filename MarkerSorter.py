@@ -0,0 +1,80 @@
+from contextlib import ExitStack
+from heapq import merge
+from itertools import chain, islice
+from operator import itemgetter
+
+
+# Spill threshold (markers sorted in memory) of MarkerSorter when none is given
+DEFAULT_SPILL_MARKERS = 1 << 20
+# markers per pickled block of a spilled run, a merge holds one block of every merged run
+SPILL_BLOCK_MARKERS = 1024
+# runs merged at once, more runs are merged in several passes
+MERGE_FAN_IN = 128
+
+
+# Sort-on-export stage ordering (name, timeSeconds, ...) markers by time, markers with equal times
+# keep their input order. Up to spillMarkers markers are sorted in memory. Longer inputs fall back
+# to an external merge sort: sorted runs of spillMarkers markers are spilled to temporary files
+# (in tempDir, the system one by default) and k-way merged, MERGE_FAN_IN runs at a time. Memory
+# then holds at most max(spillMarkers, MERGE_FAN_IN * SPILL_BLOCK_MARKERS) markers.
+# heapq.merge takes equal keys from the earlier run first, which keeps the sort stable.
+class MarkerSorter:
+    def __init__(self, spillMarkers: int = DEFAULT_SPILL_MARKERS, tempDir: str | None = None):
+        if spillMarkers < 1: raise Exception("Sort spill threshold has to be at least 1 marker, got {0}".format(spillMarkers))
+        self.mSpillMarkers = spillMarkers
+        self.mTempDir = tempDir
+        # runs spilled to temporary files and merge passes over them, 0 while sorting in memory
+        self.mRunCount = 0
+        self.mMergePasses = 0
+
+    def sort(self, markers):
+        timeOf = itemgetter(1)
+        markers = iter(markers)
+        run = sorted(islice(markers, self.mSpillMarkers), key=timeOf)
+        following = next(markers, None)
+        if following == None:
+            yield from run
+            return
+
+        markers = chain((following,), markers)
+        with ExitStack() as stack:
+            runs = []
+            while len(run) > 0:
+                runs.append(self.spill(stack, run))
+                run = sorted(islice(markers, self.mSpillMarkers), key=timeOf)
+            self.mRunCount += len(runs)
+
+            while len(runs) > MERGE_FAN_IN:
+                merged = []
+                for start in range(0, len(runs), MERGE_FAN_IN):
+                    group = runs[start:start + MERGE_FAN_IN]
+                    merged.append(self.spill(stack, merge(*map(readRun, group), key=timeOf)))
+                    for file in group: file.close()
+                runs = merged
+                self.mMergePasses += 1
+
+            self.mMergePasses += 1
+            yield from merge(*map(readRun, runs), key=timeOf)
+
+    # writes sorted markers to a temporary file closed by stack, returns the file rewound for reading
+    def spill(self, stack: ExitStack, markers):
+        # only loaded once a sort spills, every tool start imports this module
+        from pickle import HIGHEST_PROTOCOL, dump
+        from tempfile import TemporaryFile
+        file = stack.enter_context(TemporaryFile(prefix='hh-sort-', dir=self.mTempDir))
+        markers = iter(markers)
+        while True:
+            block = list(islice(markers, SPILL_BLOCK_MARKERS))
+            if len(block) == 0: break
+            dump(block, file, HIGHEST_PROTOCOL)
+        file.seek(0)
+        return file
+
+def readRun(file):
+    from pickle import load
+    while True:
+        try:
+            block = load(file)
+        except EOFError:
+            return
+        yield from block
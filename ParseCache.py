@@ -0,0 +1,89 @@
+from array import array
+from os import replace
+from pathlib import Path
+from struct import calcsize, pack, unpack_from
+from TimestampTable import TimestampTable
+
+
+# Binary sidecar cache of parsed timestamps, stored next to the source as <source>.hhcache.
+#
+# Layout (little endian):
+#   header - magic, version, source size, source mtime (ns), source content hash, options length,
+#            row count, name count, name table length, source line count
+#   options string, times (int64 per row), name ids (uint32 per row), colors (uint8 per row),
+#   name table (names joined with '\n', utf-8)
+CACHE_MAGIC = b'HHPC'
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.hhcache'
+CACHE_HEADER = '<4sHQq16sHQQQQ'
+CACHE_HEADER_SIZE = calcsize(CACHE_HEADER)
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def cachePathFor(sourcePath: Path):
+    return sourcePath.with_name(sourcePath.name + CACHE_SUFFIX)
+
+# returns (size, mtime in ns, content hash) of the file
+def fileFingerprint(path: Path):
+    # hashlib loads OpenSSL, only runs using the cache import it
+    from hashlib import blake2b
+    stat = path.stat()
+    digest = blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if len(chunk) == 0: break
+            digest.update(chunk)
+    return stat.st_size, stat.st_mtime_ns, digest.digest()
+
+# Fills table with cached timestamps; returns amount of source lines, or None when there is no
+# valid cache for the source fingerprint and parse options
+def loadCache(sourcePath: Path, options: str, fingerprint: tuple, table: TimestampTable):
+    try:
+        data = cachePathFor(sourcePath).read_bytes()
+    except OSError:
+        return None
+
+    if len(data) < CACHE_HEADER_SIZE: return None
+    magic, version, size, mtime, contentHash, optionsLength, rowCount, nameCount, namesLength, lineCount = unpack_from(CACHE_HEADER, data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION: return None
+    if (size, mtime, contentHash) != fingerprint: return None
+
+    view = memoryview(data)
+    offset = CACHE_HEADER_SIZE
+    if bytes(view[offset:offset + optionsLength]) != options.encode(): return None
+    offset += optionsLength
+
+    times = array('q')
+    nameIds = array('I')
+    colors = array('B')
+    for column in (times, nameIds, colors):
+        length = rowCount * column.itemsize
+        column.frombytes(view[offset:offset + length])
+        offset += length
+
+    names = str(view[offset:offset + namesLength], 'utf-8').split('\n') if nameCount > 0 else []
+    if len(names) != nameCount or offset + namesLength != len(data): return None
+
+    table.setColumns(times, colors, nameIds, names)
+    return lineCount
+
+def storeCache(sourcePath: Path, options: str, fingerprint: tuple, table: TimestampTable, lineCount: int):
+    size, mtime, contentHash = fingerprint
+    optionsBytes = options.encode()
+    namesBytes = '\n'.join(table.mNames).encode('utf-8')
+
+    cachePath = cachePathFor(sourcePath)
+    tempPath = cachePath.with_name(cachePath.name + '.tmp')
+    try:
+        with open(tempPath, "wb") as file:
+            file.write(pack(CACHE_HEADER, CACHE_MAGIC, CACHE_VERSION, size, mtime, contentHash, len(optionsBytes),
+                            len(table), len(table.mNames), len(namesBytes), lineCount))
+            file.write(optionsBytes)
+            file.write(table.mTimes.tobytes())
+            file.write(table.mNameIds.tobytes())
+            file.write(table.mColors.tobytes())
+            file.write(namesBytes)
+        replace(tempPath, cachePath)
+    except OSError as e:
+        print("Could not write parse cache {0}: {1}".format(cachePath, e))
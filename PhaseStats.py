@@ -0,0 +1,127 @@
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from sys import getallocatedblocks
+from time import perf_counter
+
+
+# Per-phase instrumentation of a conversion: wall time, call count and allocations of named
+# phases (open, classify, parse, index, transforms, serialize), line counts per reader state
+# and free-form counters. A disabled PhaseStats hands out a shared no-op context, so
+# instrumented code costs one method call per phase when stats are off.
+#
+# Allocations are the net change of live Python memory blocks by default, which is nearly free.
+# With traceAllocations tracemalloc also reports net and peak bytes, at a large slowdown.
+# tracemalloc, json and the profiler are only imported by runs using them, they would make up most
+# of a tool's startup otherwise.
+class PhaseRecord:
+    __slots__ = ('mSeconds', 'mCalls', 'mBlocks', 'mBytes', 'mPeakBytes')
+
+    def __init__(self):
+        self.mSeconds = 0.0
+        self.mCalls = 0
+        self.mBlocks = 0
+        self.mBytes = 0
+        self.mPeakBytes = 0
+
+NO_PHASE = nullcontext()
+
+class PhaseStats:
+    def __init__(self, enabled: bool = True, traceAllocations: bool = False):
+        self.mEnabled = enabled
+        self.mTraceAllocations = traceAllocations and enabled
+        self.mPhases: dict[str, PhaseRecord] = {}
+        self.mLineStates: dict[str, int] = {}
+        self.mCounters: dict[str, int] = {}
+        self.mTracer = None
+        if self.mTraceAllocations:
+            import tracemalloc
+            self.mTracer = tracemalloc
+            if not tracemalloc.is_tracing(): tracemalloc.start()
+
+    def phase(self, name: str):
+        if not self.mEnabled: return NO_PHASE
+        return self.recordPhase(name)
+
+    @contextmanager
+    def recordPhase(self, name: str):
+        record = self.mPhases.get(name)
+        if record == None: record = self.mPhases[name] = PhaseRecord()
+        if self.mTraceAllocations:
+            self.mTracer.reset_peak()
+            startBytes = self.mTracer.get_traced_memory()[0]
+        startBlocks = getallocatedblocks()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            record.mSeconds += perf_counter() - start
+            record.mCalls += 1
+            record.mBlocks += getallocatedblocks() - startBlocks
+            if self.mTraceAllocations:
+                current, peak = self.mTracer.get_traced_memory()
+                record.mBytes += current - startBytes
+                record.mPeakBytes = max(record.mPeakBytes, peak - startBytes)
+
+    # counts is {reader state: amount of lines}
+    def addLineStates(self, counts: dict):
+        if not self.mEnabled: return
+        for state, count in counts.items():
+            self.mLineStates[state.name] = self.mLineStates.get(state.name, 0) + count
+
+    def setCounter(self, name: str, value: int):
+        if self.mEnabled: self.mCounters[name] = value
+
+    def toDict(self):
+        phases = {}
+        for name, record in self.mPhases.items():
+            phase = {'seconds': record.mSeconds, 'calls': record.mCalls, 'allocatedBlocks': record.mBlocks}
+            if self.mTraceAllocations:
+                phase['allocatedBytes'] = record.mBytes
+                phase['peakBytes'] = record.mPeakBytes
+            phases[name] = phase
+        return {'phases': phases, 'lineStates': dict(self.mLineStates), 'counters': dict(self.mCounters)}
+
+    def summary(self):
+        return formatSummary(self.toDict())
+
+
+DISABLED_STATS = PhaseStats(enabled=False)
+
+# Human summary of PhaseStats.toDict() output, which is what worker processes send back
+def formatSummary(stats: dict):
+    lines = ["Phase statistics:"]
+    for name, phase in stats['phases'].items():
+        line = "  {0:12s} {1:10.3f}ms  {2:3d} call(s)  {3:+10d} blocks".format(name, phase['seconds'] * 1000, phase['calls'], phase['allocatedBlocks'])
+        if 'peakBytes' in phase:
+            line += "  {0:+12d} bytes  {1:12d} peak bytes".format(phase['allocatedBytes'], phase['peakBytes'])
+        lines.append(line)
+    if len(stats['lineStates']) > 0:
+        lines.append("Lines per reader state:")
+        lines.extend("  {0:12s} {1:10d}".format(state, count) for state, count in stats['lineStates'].items())
+    if len(stats['counters']) > 0:
+        lines.append("Counters:")
+        lines.extend("  {0:12s} {1:10d}".format(name, value) for name, value in stats['counters'].items())
+    return '\n'.join(lines)
+
+# Prints summaries of {label: PhaseStats.toDict()} and/or writes them as JSON to jsonPath
+def reportStats(statsByLabel: dict[str, dict], printSummary: bool, jsonPath: str | None):
+    if printSummary:
+        for label, stats in statsByLabel.items():
+            print("\n=== {0} ===\n{1}".format(label, formatSummary(stats)))
+    if jsonPath != None:
+        import json
+        Path(jsonPath).write_text(json.dumps(statsByLabel, indent=2))
+        print("Statistics written to {0}".format(jsonPath))
+
+# Runs function under cProfile, dumps the profile to dumpPath (readable with pstats or snakeviz)
+# and prints the hottest functions
+def profileCall(dumpPath: str, function, *args, **kwargs):
+    from cProfile import Profile
+    from pstats import SortKey, Stats
+    profile = Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        profile.dump_stats(dumpPath)
+        print("\nProfile written to {0}, hottest functions:".format(dumpPath))
+        Stats(profile).sort_stats(SortKey.TIME).print_stats(12)
@@ -0,0 +1,139 @@
+from array import array
+from itertools import repeat
+import re
+
+
+# Timecode formatting and parsing shared by both tools. Single value functions keep the old
+# per-marker API, encode*/decode* functions convert whole sequences (or arrays) at once.
+#
+# Formatting goes through lookup tables: DIGITS2 holds "00".."99" and MMSS holds "MM:SS" for every
+# second of an hour, so a timecode is two table lookups and a concatenation. Hours outside 0-99
+# (and negative times) fall back to the "{0:02d}" formatting the tables replace.
+DIGITS2 = tuple("{0:02d}".format(i) for i in range(100))
+MMSS = tuple(DIGITS2[m] + ':' + DIGITS2[s] for m in range(60) for s in range(60))
+HOURS = tuple(d + ':' for d in DIGITS2)
+SHORT_HOURS = ('',) + tuple("{0:d}:".format(hr) for hr in range(1, 100))
+DEFAULT_FPS = 25
+
+# NumPy is only worth converting to for large batches; it is imported by the first such batch, as
+# importing it takes longer than converting a small file
+NUMPY_MIN_SIZE = 4096
+
+HMS_REGEX = re.compile('^(\\d+):(\\d\\d):(\\d\\d)')
+HMSF_REGEX = re.compile('^(\\d+):(\\d\\d):(\\d\\d):(\\d\\d)')
+
+
+def hoursPrefix(hr: int):
+    return HOURS[hr] if 0 <= hr < 100 else "{0:02d}:".format(hr)
+
+# "HH:MM:SS"
+def secondsToHMS(seconds: int):
+    hr, rest = divmod(seconds, 3600)
+    return hoursPrefix(hr) + MMSS[rest]
+
+# "HH:MM:SS:FF"
+def secondsToHMSF(seconds: int, frame: int = 0):
+    hr, rest = divmod(seconds, 3600)
+    return hoursPrefix(hr) + MMSS[rest] + ':' + (DIGITS2[frame] if 0 <= frame < 100 else str(frame))
+
+# "MM:SS" below an hour, "H:MM:SS" above (YouTube chapters)
+def secondsToShortHMS(seconds: int):
+    hr, rest = divmod(seconds, 3600)
+    return (SHORT_HOURS[hr] if 0 <= hr < 100 else "{0:d}:".format(hr)) + MMSS[rest]
+
+def HMSToSeconds(timestamp: str):
+    m = HMS_REGEX.match(timestamp)
+    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+
+# with fps of 0 frames are dropped and whole seconds are returned, otherwise frame-accurate seconds
+def HMSFToSeconds(timestamp: str, fps: int = 0):
+    m = HMSF_REGEX.match(timestamp)
+    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
+    seconds = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+    if fps == 0: return seconds
+    return seconds + int(m.group(4)) / fps
+
+def HMSFToFrames(timestamp: str, fps: int = DEFAULT_FPS):
+    m = HMSF_REGEX.match(timestamp)
+    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
+    return (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))) * fps + int(m.group(4))
+
+# H:MM:SS:FF (or H:MM:SS) timecode to seconds, without the regex; frames are dropped
+def timecodeToSeconds(timecode: str):
+    parts = timecode.split(':')
+    if len(parts) < 3 or len(parts) > 4: raise Exception('Failed to parse timecode {0}'.format(timecode))
+    return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+
+
+class NumpyTables:
+    def __init__(self, numpy):
+        self.mNumpy = numpy
+        self.mHours = numpy.array(HOURS, dtype=object)
+        self.mMMSS = numpy.array(MMSS, dtype=object)
+        self.mShortHours = numpy.array(SHORT_HOURS, dtype=object)
+
+# NumpyTables once loaded, False when NumPy is missing
+numpyTables: NumpyTables | bool | None = None
+
+def loadNumpyTables():
+    global numpyTables
+    if numpyTables == None:
+        try:
+            import numpy
+            numpyTables = NumpyTables(numpy)
+        except ImportError:
+            numpyTables = False
+    return numpyTables
+
+# (NumpyTables, hours, "MM:SS" parts) of every time as NumPy object arrays, or None when the batch
+# is small, NumPy is missing or some time is out of the lookup tables' range
+def numpySplit(seconds):
+    if len(seconds) < NUMPY_MIN_SIZE: return None
+    tables = loadNumpyTables()
+    if tables == False: return None
+    values = tables.mNumpy.asarray(seconds, dtype=tables.mNumpy.int64)
+    if values.min() < 0 or values.max() >= 100 * 3600: return None
+    hr, rest = tables.mNumpy.divmod(values, 3600)
+    return tables, hr, tables.mMMSS[rest]
+
+# list of "HH:MM:SS" for every time in seconds
+def encodeHMS(seconds):
+    split = numpySplit(seconds)
+    if split != None: return (split[0].mHours[split[1]] + split[2]).tolist()
+    return [(HOURS[hr] if 0 <= hr < 100 else hoursPrefix(hr)) + MMSS[rest] for hr, rest in map(divmod, seconds, repeat(3600))]
+
+# list of "HH:MM:SS:FF" for every time in seconds, all with the same frame
+def encodeHMSF(seconds, frame: int = 0):
+    suffix = ':' + (DIGITS2[frame] if 0 <= frame < 100 else str(frame))
+    split = numpySplit(seconds)
+    if split != None: return (split[0].mHours[split[1]] + split[2] + suffix).tolist()
+    return [(HOURS[hr] if 0 <= hr < 100 else hoursPrefix(hr)) + MMSS[rest] + suffix for hr, rest in map(divmod, seconds, repeat(3600))]
+
+# list of YouTube style "MM:SS" / "H:MM:SS" for every time in seconds
+def encodeShortHMS(seconds):
+    split = numpySplit(seconds)
+    if split != None: return (split[0].mShortHours[split[1]] + split[2]).tolist()
+    return [(SHORT_HOURS[hr] if 0 <= hr < 100 else "{0:d}:".format(hr)) + MMSS[rest] for hr, rest in map(divmod, seconds, repeat(3600))]
+
+# array of seconds for every "H:MM:SS" timestamp
+def decodeHMS(timestamps):
+    match = HMS_REGEX.match
+    seconds = array('q')
+    for timestamp in timestamps:
+        m = match(timestamp)
+        if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
+        hr, min, sec = m.groups()
+        seconds.append(int(hr) * 3600 + int(min) * 60 + int(sec))
+    return seconds
+
+# array of frame numbers for every "H:MM:SS:FF" timecode at fps frames per second
+def decodeHMSF(timecodes, fps: int = DEFAULT_FPS):
+    match = HMSF_REGEX.match
+    frames = array('q')
+    for timecode in timecodes:
+        m = match(timecode)
+        if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timecode))
+        hr, min, sec, frame = m.groups()
+        frames.append((int(hr) * 3600 + int(min) * 60 + int(sec)) * fps + int(frame))
+    return frames
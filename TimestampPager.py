@@ -0,0 +1,140 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from sys import stdout
+from Timecode import HMSToSeconds, secondsToHMS
+from TimestampTable import TimestampTable
+
+
+# Paged timestamp listing for the interactive menus. Rows are listed in time order through a
+# sorted time index, which is only rebuilt when the table changed (TimestampTable.mVersion).
+# A time range filter is two bisections of the index, jumping to a time is one more, and a name
+# filter is matched once per distinct name. Only rows of the shown page are formatted, and the
+# whole page is written at once.
+DEFAULT_PAGE_SIZE = 20
+COMMANDS_HELP = "Enter/N next page, P previous, J H:MM:SS jump, R H:MM:SS [H:MM:SS] time range, F TEXT name filter, S SIZE page size"
+
+class TimestampPager:
+    def __init__(self, table: TimestampTable, pageSize: int = DEFAULT_PAGE_SIZE, out=stdout):
+        self.mTable = table
+        self.mPageSize = max(1, pageSize)
+        self.mOut = out
+        self.mVersion = None
+        # rows in time order and their times
+        self.mOrder = array('I')
+        self.mOrderTimes = array('q')
+        # positions into mOrder passing the filters
+        self.mView = range(0)
+        self.mPosition = 0
+        self.mRangeStart: int | None = None
+        self.mRangeEnd: int | None = None
+        self.mNameFilter: str | None = None
+
+    def refresh(self):
+        if self.mVersion == self.mTable.mVersion: return
+        table = self.mTable
+        self.mOrder = array('I', sorted(range(len(table)), key=table.timeSortKey()))
+        timeOf = table.getTime if table.mTransform != None else table.mTimes.__getitem__
+        self.mOrderTimes = array('q', map(timeOf, self.mOrder))
+        self.mVersion = table.mVersion
+        self.applyFilters()
+
+    # time range is inclusive, end of None means until the end of the timeline
+    def setTimeRange(self, start: int | None, end: int | None):
+        self.mRangeStart, self.mRangeEnd = start, end
+        self.applyFilters()
+
+    # case-insensitive name substring, None or empty for all names
+    def setNameFilter(self, text: str | None):
+        self.mNameFilter = text if text else None
+        self.applyFilters()
+
+    def applyFilters(self):
+        times = self.mOrderTimes
+        first = 0 if self.mRangeStart == None else bisect_left(times, self.mRangeStart)
+        last = len(times) if self.mRangeEnd == None else bisect_right(times, self.mRangeEnd)
+        if self.mNameFilter == None:
+            self.mView = range(first, max(first, last))
+        else:
+            names = self.mTable.mNames
+            text = self.mNameFilter.casefold()
+            matching = bytearray(text in name.casefold() for name in names)
+            nameIds = self.mTable.mNameIds
+            order = self.mOrder
+            self.mView = array('I', (position for position in range(first, last) if matching[nameIds[order[position]]]))
+        self.mPosition = 0
+
+    def __len__(self):
+        return len(self.mView)
+
+    # first page starting at or after given time
+    def jump(self, timeSeconds: int):
+        self.mPosition = bisect_left(self.mView, timeSeconds, key=self.mOrderTimes.__getitem__)
+
+    def nextPage(self):
+        if self.mPosition + self.mPageSize >= len(self.mView): return False
+        self.mPosition += self.mPageSize
+        return True
+
+    def previousPage(self):
+        if self.mPosition == 0: return False
+        self.mPosition = max(0, self.mPosition - self.mPageSize)
+        return True
+
+    def pageRows(self):
+        order = self.mOrder
+        return [order[position] for position in self.mView[self.mPosition:self.mPosition + self.mPageSize]]
+
+    def printPage(self):
+        rows = self.pageRows()
+        filters = ""
+        if self.mRangeStart != None or self.mRangeEnd != None:
+            filters += ", from {0} to {1}".format(secondsToHMS(self.mRangeStart or 0), "the end" if self.mRangeEnd == None else secondsToHMS(self.mRangeEnd))
+        if self.mNameFilter != None:
+            filters += ", names containing \"{0}\"".format(self.mNameFilter)
+
+        table = self.mTable
+        lines = ["\nTimestamps {0}-{1} of {2}{3}:\n".format(self.mPosition + 1 if len(rows) > 0 else 0, self.mPosition + len(rows), len(self.mView), filters)]
+        lines.extend("  {0}. {1}\n".format(i + 1, table[row]) for i, row in enumerate(rows))
+        self.mOut.write(''.join(lines))
+        self.mOut.flush()
+
+    # Interactive page browsing. With pickThing, a number picks a row of the shown page.
+    # returns the picked row, or None when the user quit with Q
+    def browse(self, pickThing: str | None = None, quitLabel: str = "return"):
+        self.refresh()
+        showPage = True
+        while True:
+            if showPage: self.printPage()
+            showPage = True
+            rows = self.pageRows()
+            pick = "Pick a {0} (1-{1}), ".format(pickThing, len(rows)) if pickThing != None and len(rows) > 0 else ""
+            o = input("\n{0}{1}, Q to {2}: ".format(pick, COMMANDS_HELP, quitLabel)).strip()
+            command, _, argument = o.partition(' ')
+            argument = argument.strip()
+            try:
+                match command.capitalize():
+                    case 'Q': return None
+                    case '' | 'N':
+                        if not self.nextPage():
+                            print("Already on the last page")
+                            showPage = False
+                    case 'P':
+                        if not self.previousPage():
+                            print("Already on the first page")
+                            showPage = False
+                    case 'J': self.jump(HMSToSeconds(argument))
+                    case 'R':
+                        times = argument.split()
+                        if len(times) > 2: raise ValueError("Expected at most two times")
+                        self.setTimeRange(HMSToSeconds(times[0]) if len(times) > 0 else None,
+                                          HMSToSeconds(times[1]) if len(times) > 1 else None)
+                    case 'F': self.setNameFilter(argument)
+                    case 'S':
+                        self.mPageSize = max(1, int(argument))
+                    case _:
+                        index = int(o)
+                        if pickThing == None or index < 1 or index > len(rows): raise ValueError("Index invalid")
+                        return rows[index - 1]
+            except Exception:
+                print("Incorrect option {0}".format(o))
+                showPage = False
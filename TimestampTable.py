@@ -0,0 +1,290 @@
+from array import array
+from enum import StrEnum
+from itertools import compress, count
+from operator import ne
+from sys import intern
+
+
+class TimestampColor(StrEnum):
+    Unknown = 'UNKNOWN'
+    Blue = 'Blue'
+    Cyan = 'Cyan'
+    Green = 'Green'
+    Yellow = 'Yellow'
+    Red = 'Red'
+    Ping = 'Ping'
+    Purple = 'Purple'
+    Fuchsia = 'Fuchsia'
+    Rose = 'Rose'
+    Lavender = 'Lavender'
+    Sky = 'Sky'
+    Mint = 'Mint'
+    Lemon = 'Lemon'
+    Sand = 'Sand'
+    Cocoa = 'Cocoa'
+    Cream = 'Cream'
+
+# colors are stored as uint8 codes - position of the color in TimestampColor
+COLOR_CODES = list(TimestampColor)
+COLOR_TO_CODE = {c: i for i, c in enumerate(COLOR_CODES)}
+
+# rows per block compared at once by changedRows
+CHANGED_ROWS_BLOCK = 1024
+
+# Rows whose items differ between two columns of the same length and type. Blocks of rows are
+# compared with memcmp (array equality), only differing blocks are compared item by item, so a few
+# changes in a long column cost about as much as a copy of it.
+def changedRows(old: array, new: array):
+    if old == new: return []
+    rows = []
+    for start in range(0, len(old), CHANGED_ROWS_BLOCK):
+        oldBlock, newBlock = old[start:start + CHANGED_ROWS_BLOCK], new[start:start + CHANGED_ROWS_BLOCK]
+        if oldBlock != newBlock: rows.extend(compress(count(start), map(ne, oldBlock, newBlock)))
+    return rows
+
+
+# Lazily applied timeline transform: a sequence of global affine steps (scale, then offset)
+# and windowed shifts. Consecutive global steps are folded together, so a global shift or
+# scale costs O(1) no matter how many timestamps are stored.
+class TimelineTransform:
+    def __init__(self):
+        # each step is (scale, offset) for global steps or (start, end, offset) for windowed ones
+        self.mSteps: list[tuple] = []
+        self.mClampNegative = True
+
+    def scale(self, factor: float):
+        self.addAffine(factor, 0)
+
+    def shift(self, seconds: int):
+        self.addAffine(1.0, seconds)
+
+    def addAffine(self, scale: float, offset: int):
+        if len(self.mSteps) > 0 and len(self.mSteps[-1]) == 2:
+            lastScale, lastOffset = self.mSteps[-1]
+            self.mSteps[-1] = (lastScale * scale, lastOffset * scale + offset)
+        else:
+            self.mSteps.append((scale, offset))
+
+    # shifts timestamps within [start, end) of the current timeline; end of None means until the end
+    def shiftRange(self, start: int, end: int | None, seconds: int):
+        self.mSteps.append((start, end, seconds))
+
+    # global steps with positive scales keep the order of times, so raw times sort the same way
+    def isMonotonic(self):
+        return all(len(step) == 2 and step[0] > 0 for step in self.mSteps)
+
+    def apply(self, timeSeconds: int):
+        t = timeSeconds
+        for step in self.mSteps:
+            if len(step) == 2:
+                t = t * step[0] + step[1]
+            elif t >= step[0] and (step[1] == None or t < step[1]):
+                t += step[2]
+
+        t = round(t)
+        if t < 0 and self.mClampNegative: return 0
+        return t
+
+
+# Lightweight view over a single row of TimestampTable, keeping the old Timestamp API
+class TimestampView:
+    __slots__ = ('mTable', 'mRow')
+
+    def __init__(self, table: 'TimestampTable', row: int):
+        self.mTable = table
+        self.mRow = row
+
+    @property
+    def mName(self):
+        return self.mTable.getName(self.mRow)
+
+    @mName.setter
+    def mName(self, name: str):
+        self.mTable.setName(self.mRow, name)
+
+    @property
+    def mTimeSeconds(self):
+        return self.mTable.getTime(self.mRow)
+
+    @mTimeSeconds.setter
+    def mTimeSeconds(self, timeSeconds: int):
+        self.mTable.setTime(self.mRow, timeSeconds)
+
+    @property
+    def mColor(self):
+        return self.mTable.getColor(self.mRow)
+
+    @mColor.setter
+    def mColor(self, c: TimestampColor):
+        self.mTable.setColor(self.mRow, c)
+
+    def setColor(self, c: TimestampColor):
+        self.mTable.setColor(self.mRow, c)
+
+    def setName(self, name: str):
+        self.mTable.setName(self.mRow, name)
+
+    def getTimestamp(self):
+        return self.mTable.getTime(self.mRow)
+
+    def shiftTimestamp(self, secondsAdd: int):
+        self.mTable.setTime(self.mRow, self.mTable.getRawTime(self.mRow) + secondsAdd)
+
+
+# Columnar timestamp storage. Rows are only appended (or explicitly compacted), so a row
+# number is a stable marker identifier. Names are dictionary-encoded into an interned name
+# table. Times are stored raw and read through an optional TimelineTransform.
+# mVersion changes with every change of rows, names or times (not colors), so derived
+# indexes can tell whether they are stale.
+class TimestampTable:
+    def __init__(self, viewType: type = TimestampView):
+        self.mViewType = viewType
+        self.mTimes = array('q')
+        self.mColors = array('B')
+        self.mNameIds = array('I')
+        self.mNames: list[str] = []
+        self.mNameLookup: dict[str, int] = {}
+        self.mTransform: TimelineTransform | None = None
+        self.mVersion = 0
+
+    def __len__(self):
+        return len(self.mTimes)
+
+    def __getitem__(self, row: int):
+        if row < 0: row += len(self.mTimes)
+        if row < 0 or row >= len(self.mTimes): raise IndexError("Timestamp row {0} out of range".format(row))
+        return self.mViewType(self, row)
+
+    def __iter__(self):
+        viewType = self.mViewType
+        for row in range(len(self.mTimes)):
+            yield viewType(self, row)
+
+    def clear(self):
+        self.mTimes = array('q')
+        self.mColors = array('B')
+        self.mNameIds = array('I')
+        self.mNames.clear()
+        self.mNameLookup.clear()
+        self.mTransform = None
+        self.mVersion += 1
+
+    # replaces the whole table contents; nameIds index into names, which must be unique
+    def setColumns(self, times: array, colors: array, nameIds: array, names: list[str]):
+        self.mTimes, self.mColors, self.mNameIds = times, colors, nameIds
+        self.mNames = [intern(name) for name in names]
+        self.mNameLookup = {name: nameId for nameId, name in enumerate(self.mNames)}
+        self.mTransform = None
+        self.mVersion += 1
+
+    def internName(self, name: str):
+        nameId = self.mNameLookup.get(name)
+        if nameId == None:
+            nameId = len(self.mNames)
+            name = intern(name)
+            self.mNames.append(name)
+            self.mNameLookup[name] = nameId
+        return nameId
+
+    # returns row of the appended timestamp
+    def append(self, name: str, timeSeconds: int, color: TimestampColor = TimestampColor.Blue):
+        self.mTimes.append(timeSeconds)
+        self.mColors.append(COLOR_TO_CODE[color])
+        self.mNameIds.append(self.internName(name))
+        self.mVersion += 1
+        return len(self.mTimes) - 1
+
+    # appends rows in bulk; nameIds index into names, which are local to the given columns
+    def appendColumns(self, times: array, nameIds: array, names: list[str], color: TimestampColor = TimestampColor.Blue):
+        tableIds = [self.internName(name) for name in names]
+        self.mTimes.extend(times)
+        self.mNameIds.extend(map(tableIds.__getitem__, nameIds))
+        self.mColors.extend(bytes([COLOR_TO_CODE[color]]) * len(times))
+        self.mVersion += 1
+
+    def getName(self, row: int):
+        return self.mNames[self.mNameIds[row]]
+
+    def setName(self, row: int, name: str):
+        self.mNameIds[row] = self.internName(name)
+        self.mVersion += 1
+
+    def getTime(self, row: int):
+        if self.mTransform == None: return self.mTimes[row]
+        return self.mTransform.apply(self.mTimes[row])
+
+    # key function sorting rows by time, on raw times whenever the transform keeps their order
+    def timeSortKey(self):
+        if self.mTransform == None or self.mTransform.isMonotonic(): return self.mTimes.__getitem__
+        return self.getTime
+
+    def getRawTime(self, row: int):
+        return self.mTimes[row]
+
+    # sets the raw time, before the timeline transform is applied
+    def setTime(self, row: int, timeSeconds: int):
+        self.mTimes[row] = timeSeconds
+        self.mVersion += 1
+
+    def getTransform(self):
+        if self.mTransform == None: self.mTransform = TimelineTransform()
+        self.mVersion += 1
+        return self.mTransform
+
+    # replaces the transform by one made of given TimelineTransform steps, None removes it
+    def setTransformSteps(self, steps: list[tuple] | None):
+        if steps == None:
+            self.mTransform = None
+        else:
+            self.mTransform = TimelineTransform()
+            self.mTransform.mSteps = list(steps)
+        self.mVersion += 1
+
+    def shiftTimes(self, seconds: int, start: int | None = None, end: int | None = None):
+        if start == None and end == None: self.getTransform().shift(seconds)
+        else: self.getTransform().shiftRange(start or 0, end, seconds)
+
+    def scaleTimes(self, factor: float):
+        self.getTransform().scale(factor)
+
+    # rows whose time, before clamping, would fall before zero
+    def negativeRows(self):
+        if self.mTransform == None: return [row for row, t in enumerate(self.mTimes) if t < 0]
+
+        clamp = self.mTransform.mClampNegative
+        self.mTransform.mClampNegative = False
+        try:
+            return [row for row, t in enumerate(self.mTimes) if self.mTransform.apply(t) < 0]
+        finally:
+            self.mTransform.mClampNegative = clamp
+
+    # keeps only given rows (in given order); returns list mapping old rows to new ones (-1 if dropped)
+    def compact(self, keptRows):
+        mapping = [-1] * len(self.mTimes)
+        times, colors, nameIds = array('q'), array('B'), array('I')
+        for row in keptRows:
+            mapping[row] = len(times)
+            times.append(self.mTimes[row])
+            colors.append(self.mColors[row])
+            nameIds.append(self.mNameIds[row])
+
+        self.mTimes, self.mColors, self.mNameIds = times, colors, nameIds
+        self.mVersion += 1
+        return mapping
+
+    def getColor(self, row: int):
+        return COLOR_CODES[self.mColors[row]]
+
+    def setColor(self, row: int, c: TimestampColor):
+        self.mColors[row] = COLOR_TO_CODE[c]
+
+    # recolors every row with the color of its name id, rows of names with None keep their color
+    def setColorsByNameId(self, colors: list[TimestampColor | None]):
+        codes = [None if c == None else COLOR_TO_CODE[c] for c in colors]
+        if None not in codes:
+            self.mColors = array('B', map(codes.__getitem__, self.mNameIds))
+            return
+
+        for row, nameId in enumerate(self.mNameIds):
+            code = codes[nameId]
+            if code != None: self.mColors[row] = code
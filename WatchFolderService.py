@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from contextlib import ExitStack, contextmanager
+from os import replace, scandir
+from pathlib import Path
+from sys import exit
+from time import monotonic, perf_counter, time
+import asyncio
+from BatchRunner import defaultWorkerCount, freezeSupport
+from EDLToYouTubeTimestamp import EDLTimestampConverter
+from InfoWriterToEDL import TimestampConverter
+from MarkerFormats import EXPORT_FORMATS
+
+
+# Long-running service converting InfoWriter logs (*.txt) and EDLs (*.edl) dropped into a watched
+# directory. The directory is polled, as inotify and friends are not available on every share:
+# a file is converted once its size and mtime stayed the same for the settle time, so recordings
+# and logs still being copied are left alone. Ready files go through a bounded queue to a process
+# pool running the converters; outputs are written to a temporary file and renamed into place.
+#
+# Outputs of a log are named after its stem like the converters name them (x.edl, x.youtube.txt),
+# outputs of an EDL after its whole name (x.edl.youtube.txt), so a log and an EDL of the same name
+# both keep their chapters. Any other clash (ex. logs x.edl.txt and EDL x.edl) fails the later
+# file instead of overwriting the outputs of the first one.
+#
+# Every finished file is appended to a JSON lines ledger in the output directory with the size
+# and mtime it was converted at. On restart the ledger is read back (a torn last line is ignored)
+# and compacted, so only new or changed files are converted again.
+LEDGER_NAME = ".watch-ledger.jsonl"
+STATUS_NAME = ".watch-status.json"
+LOG_SUFFIX = ".txt"
+EDL_SUFFIX = ".edl"
+LATENCY_WINDOW = 256
+
+
+# Writes go to a hidden temporary file next to path, which replaces path only when the block
+# succeeds; readers never see a half written output
+@contextmanager
+def atomicPath(path: Path):
+    tempPath = path.with_name(".{0}.tmp".format(path.name))
+    try:
+        yield tempPath
+        replace(tempPath, path)
+    finally:
+        tempPath.unlink(missing_ok=True)
+
+# {format name: output path} of the conversion of inputPath into outDir
+def logOutputs(inputPath: Path, outDir: Path, options: dict):
+    formats = ['edl', 'youtube'] if options.get('youtube', True) else ['edl']
+    return {name: outDir / (inputPath.stem + EXPORT_FORMATS[name].mSuffix) for name in formats}
+
+def edlOutputs(inputPath: Path, outDir: Path, options: dict):
+    return {'youtube': outDir / (inputPath.name + EXPORT_FORMATS['youtube'].mSuffix)}
+
+# Conversion jobs run in worker processes; each returns (output paths, amount of timestamps)
+def convertLogJob(inputPath: Path, outDir: Path, options: dict):
+    converter = TimestampConverter(inputPath, options.get('fromStream', False), options.get('includeDateTime', False), useCache=False)
+    converter.readInputFile()
+    outputs = logOutputs(inputPath, outDir, options)
+    # both formats are written in one pass over the timestamps
+    with ExitStack() as stack:
+        converter.writeOutputs({name: stack.enter_context(atomicPath(path)) for name, path in outputs.items()}, inputPath.stem)
+    return list(outputs.values()), len(converter.mTimestamps)
+
+def convertEDLJob(inputPath: Path, outDir: Path, options: dict):
+    converter = EDLTimestampConverter(inputPath, useCache=False)
+    converter.readInputFile()
+    outPath = edlOutputs(inputPath, outDir, options)['youtube']
+    with atomicPath(outPath) as tempPath:
+        converter.writeOutput(tempPath)
+    return [outPath], len(converter.mTimestamps)
+
+# input suffix: (job, outputs of the job)
+CONVERSION_JOBS = {LOG_SUFFIX: (convertLogJob, logOutputs), EDL_SUFFIX: (convertEDLJob, edlOutputs)}
+
+
+# Processed files by name: {name: {'size', 'mtime', 'status', ...}}, persisted as JSON lines
+class ConversionLedger:
+    def __init__(self, path: Path):
+        self.mPath = path
+        self.mEntries: dict[str, dict] = {}
+
+    # loads the ledger and rewrites it with a single line per file; returns amount of skipped broken lines
+    def recover(self):
+        import json
+        skipped = 0
+        try:
+            with open(self.mPath, "rt") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        self.mEntries[entry['name']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        skipped += 1
+        except FileNotFoundError:
+            return 0
+
+        with atomicPath(self.mPath) as tempPath:
+            tempPath.write_text(''.join(json.dumps(entry) + '\n' for entry in self.mEntries.values()))
+        return skipped
+
+    def isProcessed(self, name: str, signature: tuple):
+        entry = self.mEntries.get(name)
+        return entry != None and (entry['size'], entry['mtime']) == signature
+
+    def record(self, name: str, signature: tuple, status: str, **details):
+        import json
+        entry = {'name': name, 'size': signature[0], 'mtime': signature[1], 'status': status, 'time': round(time(), 3), **details}
+        self.mEntries[name] = entry
+        with open(self.mPath, "at") as file:
+            file.write(json.dumps(entry) + '\n')
+
+
+class ServiceCounters:
+    def __init__(self):
+        self.mStarted = monotonic()
+        self.mQueued = 0
+        self.mConverted = 0
+        self.mFailed = 0
+        self.mBytes = 0
+        self.mTimestamps = 0
+        # seconds from a file being seen stable to its outputs being in place, and of the conversion alone
+        self.mLatencies: list[float] = []
+        self.mConvertSeconds: list[float] = []
+        self.mMaxLatency = 0.0
+
+    def recordDone(self, ok: bool, size: int, timestamps: int, latency: float, convertSeconds: float):
+        if ok:
+            self.mConverted += 1
+            self.mBytes += size
+            self.mTimestamps += timestamps
+        else:
+            self.mFailed += 1
+        self.mMaxLatency = max(self.mMaxLatency, latency)
+        for values, value in ((self.mLatencies, latency), (self.mConvertSeconds, convertSeconds)):
+            values.append(value)
+            if len(values) > LATENCY_WINDOW: del values[0]
+
+    def toDict(self, queueDepth: int, inFlight: int):
+        uptime = monotonic() - self.mStarted
+        average = lambda values: sum(values) / len(values) if len(values) > 0 else 0.0
+        return {
+            'uptimeSeconds': round(uptime, 3),
+            'queueDepth': queueDepth,
+            'inFlight': inFlight,
+            'queued': self.mQueued,
+            'converted': self.mConverted,
+            'failed': self.mFailed,
+            'filesPerMinute': round(self.mConverted * 60 / uptime, 3) if uptime > 0 else 0.0,
+            'bytesPerSecond': round(self.mBytes / uptime) if uptime > 0 else 0,
+            'timestamps': self.mTimestamps,
+            'averageLatencySeconds': round(average(self.mLatencies), 3),
+            'maxLatencySeconds': round(self.mMaxLatency, 3),
+            'averageConvertSeconds': round(average(self.mConvertSeconds), 3),
+        }
+
+    def summary(self, queueDepth: int, inFlight: int):
+        d = self.toDict(queueDepth, inFlight)
+        return ("queue {queueDepth}, in flight {inFlight}, converted {converted}, failed {failed}, {filesPerMinute:.2f} files/min, "
+                "{bytesPerSecond} B/s, latency avg {averageLatencySeconds:.3f}s max {maxLatencySeconds:.3f}s").format(**d)
+
+
+class WatchFolderService:
+    def __init__(self, watchDir: Path, outDir: Path, options: dict, workers: int = 0, queueSize: int = 64,
+                 interval: float = 2.0, settle: float = 5.0, statusInterval: float = 60.0):
+        self.mWatchDir = watchDir
+        self.mOutDir = outDir
+        self.mOptions = options
+        self.mWorkers = workers if workers > 0 else defaultWorkerCount()
+        self.mQueueSize = queueSize
+        self.mInterval = interval
+        self.mSettle = settle
+        self.mStatusInterval = statusInterval
+        self.mLedger = ConversionLedger(outDir / LEDGER_NAME)
+        self.mCounters = ServiceCounters()
+        # name: (signature, monotonic time the signature was first seen)
+        self.mPending: dict[str, tuple] = {}
+        # names queued or converting, so a slow conversion is not queued twice
+        self.mActive: set[str] = set()
+        # output name: watched file writing it, from the ledger and conversions started since
+        self.mOutputOwners: dict[str, str] = {}
+        self.mInFlight = 0
+        self.mQueue: asyncio.Queue | None = None
+
+    def scanFiles(self):
+        files = {}
+        with scandir(self.mWatchDir) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file(): continue
+                if Path(entry.name).suffix.lower() not in CONVERSION_JOBS: continue
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    # names whose signature did not change for the settle time and which were not converted yet;
+    # with useMtimeAge the file's own mtime age decides, for single scans without earlier polls
+    def stableFiles(self, files: dict[str, tuple], useMtimeAge: bool = False):
+        now = monotonic()
+        ready = []
+        for name in [name for name in self.mPending if name not in files]: del self.mPending[name]
+        for name, signature in files.items():
+            if name in self.mActive or self.mLedger.isProcessed(name, signature): continue
+            if useMtimeAge:
+                if time() - signature[1] / 1e9 >= self.mSettle: ready.append((name, signature, now))
+                continue
+
+            pending = self.mPending.get(name)
+            if pending == None or pending[0] != signature:
+                self.mPending[name] = (signature, now)
+            elif now - pending[1] >= self.mSettle:
+                del self.mPending[name]
+                ready.append((name, signature, now))
+        return ready
+
+    async def enqueue(self, ready: list[tuple]):
+        for name, signature, seen in ready:
+            self.mActive.add(name)
+            self.mCounters.mQueued += 1
+            # blocks while the queue is full, which also pauses scanning
+            await self.mQueue.put((name, signature, seen))
+
+    async def scanLoop(self, once: bool):
+        loop = asyncio.get_running_loop()
+        while True:
+            files = await loop.run_in_executor(None, self.scanFiles)
+            await self.enqueue(self.stableFiles(files, once))
+            if once: return
+            await asyncio.sleep(self.mInterval)
+
+    # runs queued conversions on pool, the process pool of run()
+    async def worker(self, pool):
+        loop = asyncio.get_running_loop()
+        while True:
+            name, signature, seen = await self.mQueue.get()
+            inputPath = self.mWatchDir / name
+            job, jobOutputs = CONVERSION_JOBS[inputPath.suffix.lower()]
+            self.mInFlight += 1
+            start = perf_counter()
+            try:
+                self.claimOutputs(name, jobOutputs(inputPath, self.mOutDir, self.mOptions).values())
+                outputs, count = await loop.run_in_executor(pool, job, inputPath, self.mOutDir, self.mOptions)
+                seconds = perf_counter() - start
+                self.mLedger.record(name, signature, 'ok', timestamps=count, outputs=[p.name for p in outputs], seconds=round(seconds, 3))
+                self.mCounters.recordDone(True, signature[0], count, monotonic() - seen, seconds)
+                print("  OK   {0:9.1f}ms  {1}: {2} timestamps -> {3}".format(seconds * 1000, name, count, ', '.join(p.name for p in outputs)))
+            except Exception as e:
+                seconds = perf_counter() - start
+                # failed files are retried once they change
+                self.mLedger.record(name, signature, 'failed', error=str(e), seconds=round(seconds, 3))
+                self.mCounters.recordDone(False, signature[0], 0, monotonic() - seen, seconds)
+                print("  FAIL {0:9.1f}ms  {1}: {2}".format(seconds * 1000, name, e))
+            finally:
+                self.mInFlight -= 1
+                self.mActive.discard(name)
+                self.mQueue.task_done()
+
+    # raises when another watched file already writes one of outputs
+    def claimOutputs(self, name: str, outputs):
+        for path in outputs:
+            owner = self.mOutputOwners.get(path.name, name)
+            if owner != name: raise Exception("Output {0} is already written for {1}, not overwriting it".format(path.name, owner))
+        for path in outputs: self.mOutputOwners[path.name] = name
+
+    def writeStatus(self):
+        import json
+        status = self.mCounters.toDict(self.mQueue.qsize(), self.mInFlight)
+        statusPath = self.mOutDir / STATUS_NAME
+        with atomicPath(statusPath) as tempPath:
+            tempPath.write_text(json.dumps(status, indent=2))
+
+    async def statusLoop(self):
+        while True:
+            await asyncio.sleep(self.mStatusInterval)
+            self.writeStatus()
+            print("Status: {0}".format(self.mCounters.summary(self.mQueue.qsize(), self.mInFlight)))
+
+    # with once, converts files which are already stable and returns when they are done
+    async def run(self, once: bool = False):
+        self.mOutDir.mkdir(parents=True, exist_ok=True)
+        skipped = self.mLedger.recover()
+        for entry in self.mLedger.mEntries.values():
+            for output in entry.get('outputs', []): self.mOutputOwners[output] = entry['name']
+        print("Watching {0}, writing to {1} with {2} worker(s); {3} files in ledger{4}".format(
+            self.mWatchDir, self.mOutDir, self.mWorkers, len(self.mLedger.mEntries),
+            ", {0} broken ledger lines skipped".format(skipped) if skipped > 0 else ""))
+
+        self.mQueue = asyncio.Queue(self.mQueueSize)
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.mWorkers) as pool:
+            workers = [asyncio.create_task(self.worker(pool)) for _ in range(self.mWorkers)]
+            status = asyncio.create_task(self.statusLoop())
+            try:
+                await self.scanLoop(once)
+                await self.mQueue.join()
+            finally:
+                for task in workers + [status]: task.cancel()
+                await asyncio.gather(*workers, status, return_exceptions=True)
+                self.writeStatus()
+                print("Status: {0}".format(self.mCounters.summary(self.mQueue.qsize(), self.mInFlight)))
+
+
+def main(argv: list[str] | None = None):
+    try:
+        parser = ArgumentParser(
+            prog='WatchFolderService',
+            description='Service watching a directory and converting dropped InfoWriter logs (*.txt) to EDL and YouTube chapters, and EDLs (*.edl) to YouTube chapters'
+        )
+        parser.add_argument('directory', help='Watched directory')
+        parser.add_argument('-o', '--output-dir', help='Output directory, also holding the ledger and status files (defaults to "converted" in the watched directory)')
+        parser.add_argument('-s', '--stream', help='Consider stream markers instead of record markers',
+                            action='store_true', default=False)
+        parser.add_argument('-f', '--full', help='Read full event name - adds event\'s date and time to timestamp name',
+                            action='store_true', default=False)
+        parser.add_argument('--no-youtube', help='Only write EDLs for InfoWriter logs, without YouTube chapters',
+                            action='store_true', default=False)
+        parser.add_argument('-j', '--jobs', help='Amount of worker processes (defaults to CPU count)',
+                            type=int, default=0)
+        parser.add_argument('--queue-size', help='Maximal amount of files waiting for a worker (default 64)',
+                            type=int, default=64)
+        parser.add_argument('--interval', help='Seconds between directory scans (default 2)',
+                            type=float, default=2.0)
+        parser.add_argument('--settle', help='Seconds a file size and mtime must stay the same before it is converted (default 5)',
+                            type=float, default=5.0)
+        parser.add_argument('--status-interval', help='Seconds between status reports (default 60)',
+                            type=float, default=60.0)
+        parser.add_argument('--once', help='Convert files already settled (by mtime age) and exit instead of watching',
+                            action='store_true', default=False)
+        args = parser.parse_args(argv)
+
+        watchDir = Path(args.directory)
+        if not watchDir.is_dir(): raise Exception("Provided directory {0} does not exist".format(watchDir))
+        outDir = Path(args.output_dir) if args.output_dir else watchDir / "converted"
+        if outDir.resolve() == watchDir.resolve(): raise Exception("Output directory has to differ from the watched one")
+        options = {
+            'fromStream': args.stream,
+            'includeDateTime': args.full,
+            'youtube': not args.no_youtube,
+        }
+        service = WatchFolderService(watchDir, outDir, options, args.jobs, max(1, args.queue_size), args.interval, args.settle, args.status_interval)
+        try:
+            asyncio.run(service.run(args.once))
+        except KeyboardInterrupt:
+            print("\nStopped watching {0}".format(watchDir))
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        import traceback
+        traceback.print_exception(e)
+        exit(1)
+
+
+if __name__ == "__main__":
+    freezeSupport()
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from io import StringIO
+from random import Random
+from sys import exit
+from time import perf_counter
+import re
+import sys
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+from EDLToYouTubeTimestamp import EDLEvent, EDLParser
+from InfoWriterToEDL import INFOWRITER_BUFFER_REGEX, InfoWriterParser
+from MarkerFormats import formatEDLEvent, formatEDLHeader
+from Timecode import timecodeToSeconds
+from TimestampTable import COLOR_CODES, TimestampColor
+
+
+# Differential fuzz and linearity check of both readers on pathological marker names of 10 KB and
+# more. The readers are compared with the per-line regex readers of the original tools, kept below
+# as they were: the EDL tokenizer (parseLines, and parseBuffer on raw bytes) and the InfoWriter
+# compiled line regex (parseLines) and bytes findall() scan (parseBuffer) have to read the same
+# markers from random documents. Then lines shaped to make backtracking regexes blow up are timed
+# at growing lengths; the time per byte of every reader may only grow by --slack from shorter to
+# longer lines (cache misses on long lines cost about 2x), where a quadratic reader grows by the
+# length ratio, 16x.
+DEFAULT_NAME_LENGTH = 10 * 1024
+DEFAULT_DOCUMENTS = 20
+MARKERS_PER_DOCUMENT = 20
+# line lengths of the linearity check, in multiples of --name-length
+LENGTH_FACTORS = (1, 2, 4, 8, 16)
+DEFAULT_SLACK = 4.0
+ENCODING = 'utf-8'
+
+# characters the original EDL details regex accepts in names, plus some non-ASCII word characters
+EDL_NAME_CHARS = 'abcXYZ019_ \t\'"!@#$%^&*().,-:;/' + 'éŻ'
+# anything but line breaks goes into InfoWriter names
+INFOWRITER_NAME_CHARS = EDL_NAME_CHARS + '|<=>?[]{}~`+\\'
+# runs repeated within names, pieces of the syntax around them
+NAME_RUNS = (' ', '@', ' @', ':', '0', '|M:', '|D:', ' Time', 'Record ')
+
+
+# Original EDL reader (EDLTimestampConverter.readInputFile before the tokenizer); (name, seconds) markers
+LEGACY_EDL_TIMESTAMP_REGEX = '^(\\d+)\\s+(\\d+)[\\sVC]+([\\d:]+) ([\\d:]+) ([\\d:]+) ([\\d:]+)\\s*$'
+LEGACY_EDL_DETAILS_REGEX = '^\\s*\\|C:([A-Za-z]+)\\s*\\|M:([\\w\\s\'"!@#$%^&*().,-:;]+)\\s*\\|D:(\\d+)*\\s*$'
+
+def legacyHMSToSeconds(timestamp: str):
+    m = re.match('^(\\d+):(\\d\\d):(\\d\\d)', timestamp)
+    if m == None: raise Exception('Failed to parse timestamp in {0}'.format(timestamp))
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+
+def legacyEDLMarkers(lines):
+    markers = []
+    lastTime = -1
+    for line in lines:
+        line = line.rstrip()
+        if len(line) == 0 or line.startswith('TITLE:') or line.startswith('FCM:'): continue
+        if re.match(LEGACY_EDL_TIMESTAMP_REGEX, line) != None:
+            lastTime = legacyHMSToSeconds(re.search(LEGACY_EDL_TIMESTAMP_REGEX, line).group(3))
+        elif re.match(LEGACY_EDL_DETAILS_REGEX, line) != None:
+            if lastTime == -1: raise Exception('Reading DETAILS line without first reading TIMESTAMP line: {0}'.format(line))
+            markers.append((re.search(LEGACY_EDL_DETAILS_REGEX, line).group(2), lastTime))
+            lastTime = -1
+        else:
+            raise Exception("Invalid line found when reading file: {0}".format(line))
+    return markers
+
+# Original InfoWriter reader (TimestampConverter.readInputFile before the single pass regex)
+def legacyInfoWriterMarkers(lines, fromStream: bool, includeDateTime: bool):
+    markers = []
+    lastName = ""
+    for line in lines:
+        line = line.rstrip()
+        if len(line) == 0: continue
+        if line.startswith('EVENT:') or line.startswith('HOTKEY:'):
+            m = re.search('^(?:EVENT|HOTKEY):(.+) @ (.+)$', line)
+            if m == None: raise Exception('Failed to parse line: {0}'.format(line))
+            lastName = m.group(1) + ' @ ' + m.group(2) if includeDateTime else m.group(1)
+            continue
+        m = re.match('^\\d:\\d\\d:\\d\\d (.*) Time.*$', line)
+        if m == None or m.group(1) not in ('Record', 'Stream'): raise Exception("Invalid line found when reading file: {0}".format(line))
+        if (m.group(1) == 'Stream') == fromStream: markers.append((lastName, legacyHMSToSeconds(line.split(' ')[0])))
+    return markers
+
+
+# random name of about length characters, mostly long runs of syntax pieces
+def randomName(random: Random, chars: str, length: int):
+    parts = []
+    size = 0
+    while size < length:
+        part = random.choice(NAME_RUNS) * random.randint(1, 400) if random.random() < 0.6 else ''.join(random.choices(chars, k=random.randint(1, 40)))
+        parts.append(part)
+        size += len(part)
+    return ''.join(parts)[:length]
+
+def randomEDL(random: Random, nameLength: int):
+    colors = [c for c in COLOR_CODES if c != TimestampColor.Unknown]
+    events = []
+    for ordinal in range(1, MARKERS_PER_DOCUMENT + 1):
+        name = randomName(random, EDL_NAME_CHARS, nameLength).replace('|', ' ')
+        events.append(formatEDLEvent(ordinal, name, random.randrange(36000), random.choice(colors)))
+    return formatEDLHeader("Fuzz") + ''.join(events)
+
+def randomInfoWriterLog(random: Random, nameLength: int):
+    lines = []
+    for _ in range(MARKERS_PER_DOCUMENT):
+        time = random.randrange(36000)
+        name = randomName(random, INFOWRITER_NAME_CHARS, nameLength).strip() or 'x'
+        lines.append("{0}:{1} @ 2024-01-01 00:00:00".format(random.choice(('HOTKEY', 'EVENT')), name))
+        for kind in random.sample(('Record', 'Stream'), random.randint(1, 2)):
+            lines.append("{0}:{1:02d}:{2:02d} {3} Time Marker".format(time // 3600, time // 60 % 60, time % 60, kind))
+        lines.append("")
+    return '\n'.join(lines) + '\n'
+
+def edlMarkers(events):
+    return [(event.mName, timecodeToSeconds(event.mSourceIn)) for event in events]
+
+# runs read(text) and adds its time to timings[reader]
+def timed(timings: dict, reader: str, read, text):
+    start = perf_counter()
+    markers = read(text)
+    timings[reader] = timings.get(reader, 0.0) + perf_counter() - start
+    return markers
+
+# returns (amount of compared markers, {reader: seconds spent reading all documents})
+def fuzzDocuments(random: Random, documents: int, nameLength: int):
+    compared = 0
+    timings = {}
+    for document in range(documents):
+        text = randomEDL(random, nameLength)
+        buffer = text.encode(ENCODING)
+        expected = timed(timings, 'EDL original regexes', lambda text: legacyEDLMarkers(StringIO(text)), text)
+        for reader, read, data in (('EDL tokenizer parseLines', lambda text: edlMarkers(EDLParser().parseLines(StringIO(text))), text),
+                                   ('EDL tokenizer parseBuffer', lambda buffer: edlMarkers(EDLParser().parseBuffer(buffer, ENCODING)), buffer)):
+            if timed(timings, reader, read, data) != expected:
+                raise Exception("{0} differs from the original reader on EDL document {1}".format(reader, document))
+        compared += len(expected)
+
+        text = randomInfoWriterLog(random, nameLength)
+        buffer = text.encode(ENCODING)
+        for fromStream in (False, True):
+            for includeDateTime in (False, True):
+                expected = timed(timings, 'InfoWriter original regexes', lambda text: legacyInfoWriterMarkers(StringIO(text), fromStream, includeDateTime), text)
+                for reader, read, data in (
+                        ('InfoWriter regex parseLines', lambda text: list(InfoWriterParser(fromStream, includeDateTime).parseLines(StringIO(text))), text),
+                        ('InfoWriter findall parseBuffer', lambda buffer: list(InfoWriterParser(fromStream, includeDateTime).parseBuffer(buffer, ENCODING)), buffer)):
+                    if timed(timings, reader, read, data) != expected:
+                        raise Exception("{0} differs from the original reader on log {1} (stream={2}, full={3})".format(
+                            reader, document, int(fromStream), int(includeDateTime)))
+                compared += len(expected)
+    return compared, timings
+
+
+# {shape: line of about length characters}; lines the original regexes backtrack on, valid or not
+def pathologicalEDLLines(length: int):
+    return {
+        'spaces name': ' |C:ResolveColorBlue |M:' + ' ' * length + 'x |D:1',
+        'spaces, no |D:': ' |C:ResolveColorBlue |M:' + ' ' * length,
+        'digits duration': ' |C:ResolveColorBlue |M:x |D:' + '1' * length + 'x',
+        'track letters': '001  001      ' + 'V ' * (length // 2) + '00:00:01:00 00:00:01:01',
+    }
+
+def pathologicalInfoWriterLines(length: int):
+    return {
+        'many " @ "': 'HOTKEY:' + 'a @ ' * (length // 4) + 'b',
+        'spaces, no date': 'HOTKEY:' + ' ' * length + '@',
+        'no " Time"': '1:00:00 ' + 'x ' * (length // 2) + 'Tim',
+        'many " Time"': '1:00:00 ' + 'Record Time ' * (length // 12),
+    }
+
+# Classifies and splits EDL lines the way parseLines does, without raising on invalid ones
+def readEDLLines(lines):
+    parser = EDLParser()
+    event = EDLEvent(1, '001', '00:00:00:00', '00:00:00:01', '00:00:00:00', '00:00:00:01')
+    for line in lines:
+        line = line.rstrip()
+        if not parser.parseDetailsLine(line, event): parser.parseTimestampLine(line)
+
+# best of repeat runs of read(data), in nanoseconds per byte of data
+def timePerByte(read, data, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        read(data)
+        best = min(best, perf_counter() - start)
+    return best * 1e9 / sum(map(len, data))
+
+# returns descriptions of readers whose time per byte grew by more than slack
+def checkLinearity(nameLength: int, linesPerRun: int, repeat: int, slack: float):
+    # (reader, shapes, lines to what read() takes, read)
+    readers = [('EDL tokenizer', pathologicalEDLLines, list, readEDLLines),
+               ('InfoWriter compiled regex', pathologicalInfoWriterLines, list, InfoWriterParser().countLineStates),
+               ('InfoWriter bytes findall', pathologicalInfoWriterLines, lambda lines: ['\n'.join(lines).encode(ENCODING)],
+                lambda data: INFOWRITER_BUFFER_REGEX.findall(data[0]))]
+    failures = []
+    for reader, shapes, prepare, read in readers:
+        for shape in shapes(nameLength):
+            costs = [timePerByte(read, prepare([shapes(nameLength * factor)[shape]] * linesPerRun), repeat) for factor in LENGTH_FACTORS]
+            # per line costs make short lines dearer per byte, so only growth towards longer lines counts
+            growth = max(costs[longer] / min(costs[:longer]) for longer in range(1, len(costs)))
+            print("  {0:26s} {1:18s} {2} ns/byte, growth x{3:.2f}{4}".format(
+                reader, shape, ' '.join("{0:7.2f}".format(cost) for cost in costs), growth, "  NOT LINEAR" if growth > slack else ""))
+            if growth > slack: failures.append("{0} on {1}".format(reader, shape))
+    return failures
+
+
+def main():
+    try:
+        parser = ArgumentParser(
+            prog='ParserFuzz',
+            description='Checks the EDL and InfoWriter readers against the original regex readers on random 10 KB marker names '
+                        'and checks that their parse time stays linear on names the original regexes backtrack on'
+        )
+        parser.add_argument('--documents', type=int, default=DEFAULT_DOCUMENTS, help='Random documents of each format (default {0})'.format(DEFAULT_DOCUMENTS))
+        parser.add_argument('--name-length', type=int, default=DEFAULT_NAME_LENGTH, help='Marker name length in characters (default {0})'.format(DEFAULT_NAME_LENGTH))
+        parser.add_argument('--lines', type=int, default=20, help='Pathological lines parsed per timed run (default 20)')
+        parser.add_argument('-r', '--repeat', type=int, default=5, help='Timed runs per line length, the fastest is kept (default 5)')
+        parser.add_argument('--slack', type=float, default=DEFAULT_SLACK,
+                            help='Allowed growth of the time per byte from shorter to up to {0}x longer lines (default {1})'.format(LENGTH_FACTORS[-1], DEFAULT_SLACK))
+        parser.add_argument('--seed', type=int, default=1, help='Random seed of the fuzzed documents (default 1)')
+        args = parser.parse_args()
+
+        start = perf_counter()
+        compared, timings = fuzzDocuments(Random(args.seed), args.documents, args.name_length)
+        print("Compared {0} markers with {1} character names against the original readers in {2:.2f}s".format(compared, args.name_length, perf_counter() - start))
+        for reader, seconds in timings.items():
+            print("  {0:32s} {1:8.1f}ms".format(reader, seconds * 1000))
+
+        print("Time per byte at {0} times {1} character lines:".format(', '.join(map(str, LENGTH_FACTORS)), args.name_length))
+        failures = checkLinearity(args.name_length, args.lines, args.repeat, args.slack)
+        if len(failures) > 0: raise Exception("Parse time grows faster than linear for {0}".format(', '.join(failures)))
+        print("All readers stay linear")
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
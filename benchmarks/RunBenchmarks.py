@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from platform import platform, python_version
+from subprocess import DEVNULL, run
+from sys import exit
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+import sys
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+from EDLPatcher import EDLPatcher
+from EDLToYouTubeTimestamp import EDLTimestampConverter
+from InfoWriterToEDL import MarkerPipeline, TimestampConverter, convertStreaming
+from MarkerCoalescer import MarkerCoalescer, coalesceTable
+from MarkerFormats import EXPORT_FORMATS
+from MarkerSorter import MarkerSorter
+from SyntheticLogs import LogProfile, ensureSamples
+from TimestampTable import TimestampColor
+
+
+# Times the main phases of both tools on synthetic samples of growing size and stores the results
+# as JSON, so runs on different commits can be compared with --compare.
+RESULTS_VERSION = 1
+DEFAULT_SIZES = '1e3,1e4,1e5,1e6,1e7'
+REGRESSION_THRESHOLD = 1.10
+# spill threshold of the sorted conversion, samples above it are sorted through temporary files
+SORT_SPILL_MARKERS = 1 << 18
+# phases faster than this in both runs are only timer noise and never reported as regressions
+NOISE_FLOOR_SECONDS = 0.01
+
+
+def timed(function):
+    start = perf_counter()
+    function()
+    return perf_counter() - start
+
+# returns {phase: seconds} for a single sample; the fastest of repeat runs is kept for each phase
+def benchmarkSample(logPath: Path, edlPath: Path, repeat: int):
+    results: dict[str, float] = {}
+    def record(phase: str, function):
+        results[phase] = min(results.get(phase, float('inf')), timed(function))
+
+    with TemporaryDirectory() as outDir:
+        outDir = Path(outDir)
+        for _ in range(repeat):
+            for phase, fromStream, includeDateTime in (('parse', False, False), ('parse_stream', True, False), ('parse_full', False, True)):
+                converter = TimestampConverter(logPath, fromStream, includeDateTime, useCache=False)
+                record(phase, converter.readInputFile)
+
+            converter = TimestampConverter(logPath, useCache=False)
+            converter.readInputFile()
+            record('index_build', converter.mTimestampNameGroups.rebuild)
+
+            # most frequent groups first, like a user coloring the hotkeys they pressed the most
+            groups = sorted(converter.mTimestampNameGroups.keys(), key=lambda name: -len(converter.mTimestampNameGroups[name]))
+            record('group_recolor', lambda: [converter.setGroupColor(name, TimestampColor.Red) for name in groups[:10]])
+
+            record('edl_write', lambda: converter.writeOutput(outDir / "out.edl", "Benchmark"))
+
+            # saves of the interactive converter after 10 renames and after 10 recolors, which keep
+            # the length of the patched events
+            table = converter.mTimestamps
+            patcher = EDLPatcher()
+            editedRows = range(0, len(table), max(1, len(table) // 10))
+            for row in editedRows: table.setColor(row, TimestampColor.Blue)
+            patcher.save(table, outDir / "patched.edl", "Benchmark")
+            def renameAndSave():
+                for row in editedRows: table.setName(row, "Patched B" if table.getName(row) == "Patched A" else "Patched A")
+                patcher.save(table, outDir / "patched.edl", "Benchmark")
+            def recolorAndSave():
+                for row in editedRows: table.setColor(row, TimestampColor.Cyan if table.getColor(row) == TimestampColor.Blue else TimestampColor.Blue)
+                patcher.save(table, outDir / "patched.edl", "Benchmark")
+            record('edl_patch', renameAndSave)
+            record('edl_patch_recolor', recolorAndSave)
+
+            def shiftAndRead():
+                table = converter.mTimestamps
+                for _ in range(10): table.shiftTimes(7)
+                table.shiftTimes(-3, 3600, 7200)
+                converter.mTimestampNameGroups.sortGroups()
+                for row in range(len(table)): table.getTime(row)
+            record('shift', shiftAndRead)
+            record('coalesce', lambda: coalesceTable(converter.mTimestamps, MarkerCoalescer(60)))
+
+            record('convert_only', lambda: convertStreaming(logPath, outDir / "stream.edl", "Benchmark"))
+            record('convert_sorted', lambda: convertStreaming(logPath, outDir / "sorted.edl", "Benchmark",
+                                                              pipeline=MarkerPipeline(sorter=MarkerSorter(SORT_SPILL_MARKERS))))
+            record('youtube_direct', lambda: convertStreaming(logPath, outDir / "stream.txt", "Benchmark", formats=['youtube']))
+            # every export format from a single parse against a conversion per format
+            formats = list(EXPORT_FORMATS)
+            record('export_all', lambda: convertStreaming(logPath, outDir / "all", "Benchmark", formats=formats))
+            record('export_separate', lambda: [convertStreaming(logPath, outDir / ("one" + EXPORT_FORMATS[name].mSuffix), "Benchmark", formats=[name])
+                                               for name in formats])
+
+            edlConverter = EDLTimestampConverter(edlPath, useCache=False)
+            record('edl_parse', edlConverter.readInputFile)
+            record('youtube_write', lambda: edlConverter.writeOutput(outDir / "out.txt"))
+
+    return results
+
+def gitCommit():
+    try:
+        result = run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, capture_output=True, text=True, stdin=DEVNULL)
+        return result.stdout.strip() if result.returncode == 0 else None
+    except OSError:
+        return None
+
+def parseSizes(sizes: str):
+    return [int(float(size)) for size in sizes.split(',') if len(size.strip()) > 0]
+
+def printResults(size: int, results: dict[str, float]):
+    print("{0:>10d} markers: {1}".format(size, ', '.join("{0} {1:.3f}s".format(phase, seconds) for phase, seconds in results.items())), flush=True)
+
+# prints per phase ratios of two result files; returns True if no phase got slower than the threshold
+def compareResults(oldPath: Path, newPath: Path, threshold: float):
+    old = json.loads(oldPath.read_text())
+    new = json.loads(newPath.read_text())
+    print("Comparing {0} ({1}) -> {2} ({3})".format(oldPath, old.get('commit'), newPath, new.get('commit')))
+    ok = True
+    for size, newResults in new['results'].items():
+        oldResults = old['results'].get(size)
+        if oldResults == None: continue
+        for phase, seconds in newResults.items():
+            if phase not in oldResults: continue
+            ratio = seconds / oldResults[phase] if oldResults[phase] > 0 else float('inf')
+            regressed = ratio > threshold and seconds >= NOISE_FLOOR_SECONDS
+            if regressed: ok = False
+            print("  {0:>10s} {1:14s} {2:9.3f}s -> {3:9.3f}s  x{4:5.2f}{5}".format(size, phase, oldResults[phase], seconds, ratio,
+                                                                                   "  SLOWER" if regressed else ""))
+    return ok
+
+
+def main():
+    try:
+        parser = ArgumentParser(
+            prog='RunBenchmarks',
+            description='Benchmarks parse, index, shift, recolor, coalesce, EDL write and EDL to YouTube conversion on synthetic samples'
+        )
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated marker counts (default {0})'.format(DEFAULT_SIZES))
+        parser.add_argument('--seed', type=int, default=1, help='Random seed of the generated samples (default 1)')
+        parser.add_argument('--names', type=int, default=200, help='Amount of distinct hotkey names (default 200)')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of hotkey name popularity (default 1.1)')
+        parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per phase, the fastest is kept (default 3)')
+        parser.add_argument('-d', '--data-dir', default=str(BENCHMARKS_DIR / 'data'), help='Directory of generated samples, reused between runs')
+        parser.add_argument('-o', '--output', help='JSON results path (defaults to results/<commit>.json next to this script)')
+        parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two JSON result files instead of running benchmarks')
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                            help='Slowdown ratio reported as a regression by --compare (default {0})'.format(REGRESSION_THRESHOLD))
+        args = parser.parse_args()
+
+        if args.compare:
+            if not compareResults(Path(args.compare[0]), Path(args.compare[1]), args.threshold): exit(1)
+            return
+
+        commit = gitCommit()
+        report = {
+            'version': RESULTS_VERSION,
+            'commit': commit,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': python_version(),
+            'platform': platform(),
+            'seed': args.seed,
+            'names': args.names,
+            'skew': args.skew,
+            'repeat': args.repeat,
+            'results': {},
+        }
+        for size in parseSizes(args.sizes):
+            logPath, edlPath = ensureSamples(LogProfile(size, args.seed, args.names, args.skew), Path(args.data_dir))
+            results = benchmarkSample(logPath, edlPath, args.repeat)
+            report['results'][str(size)] = results
+            printResults(size, results)
+
+        outPath = Path(args.output) if args.output else BENCHMARKS_DIR / 'results' / "{0}.json".format(commit or 'local')
+        outPath.parent.mkdir(parents=True, exist_ok=True)
+        outPath.write_text(json.dumps(report, indent=2))
+        print("Results written to {0}".format(outPath))
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from platform import platform, python_version
+from random import Random
+from sys import exit
+from time import perf_counter
+import json
+import sys
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+from MarkerSorter import DEFAULT_SPILL_MARKERS, MarkerSorter
+from RunBenchmarks import gitCommit
+from TimestampTable import TimestampColor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Checks and times the sort-on-export stage (MarkerSorter) on a long stream of out-of-order
+# markers, optionally under an address space cap (Unix only) small enough that sorting in memory
+# would fail. Markers are generated on the fly and the sorted output is verified as it streams
+# out, so neither side holds the whole timeline: output times must not decrease and markers with
+# equal times must keep their generation order.
+RESULTS_VERSION = 1
+DEFAULT_MARKERS = 10 ** 7
+NAMES = ['Marker {0}'.format(i) for i in range(100)]
+
+
+# (name, timeSeconds, color, sequence) markers: a roughly chronological log with many equal times,
+# where a tenth of the markers jump back in time by up to an hour (ex. merged or shifted sessions)
+def generateMarkers(count: int, seed: int):
+    random = Random(seed)
+    color = TimestampColor.Blue
+    for sequence in range(count):
+        timeSeconds = sequence // 4
+        if random.random() < 0.1: timeSeconds = max(0, timeSeconds - random.randrange(3600))
+        yield NAMES[sequence % len(NAMES)], timeSeconds, color, sequence
+
+# returns amount of verified markers
+def verifySorted(markers):
+    lastTime, lastSequence = -1, -1
+    count = 0
+    for name, timeSeconds, color, sequence in markers:
+        if timeSeconds < lastTime: raise Exception("Marker {0} at {1}s came after {2}s".format(sequence, timeSeconds, lastTime))
+        if timeSeconds == lastTime and sequence < lastSequence:
+            raise Exception("Markers {0} and {1} with equal times lost their order".format(lastSequence, sequence))
+        lastTime, lastSequence = timeSeconds, sequence
+        count += 1
+    return count
+
+def peakMemoryMB():
+    if resource == None: return None
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    try:
+        parser = ArgumentParser(
+            prog='SortBenchmark',
+            description='Verifies and times sorting of out-of-order markers on export, spilling sorted runs to temporary files beyond a memory budget'
+        )
+        parser.add_argument('-n', '--markers', type=float, default=DEFAULT_MARKERS, help='Amount of sorted markers (default 1e7)')
+        parser.add_argument('--spill', type=float, default=DEFAULT_SPILL_MARKERS,
+                            help='Markers sorted in memory before spilling runs, the sort spill threshold (default {0})'.format(DEFAULT_SPILL_MARKERS))
+        parser.add_argument('--memory-cap', type=int, help='Address space limit of this process in MB (Unix only), ex. 256 to prove sorting stays within it')
+        parser.add_argument('--temp-dir', help='Directory of the spilled runs (defaults to the system temporary directory)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed of the generated markers (default 1)')
+        parser.add_argument('-o', '--output', help='JSON results path (defaults to results/sort-<commit>.json next to this script)')
+        args = parser.parse_args()
+
+        count, spill = int(args.markers), int(args.spill)
+        if args.memory_cap:
+            if resource == None: raise Exception("--memory-cap needs the resource module, which this platform lacks")
+            cap = args.memory_cap << 20
+            resource.setrlimit(resource.RLIMIT_AS, (cap, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+        sorter = MarkerSorter(spill, args.temp_dir)
+        start = perf_counter()
+        verified = verifySorted(sorter.sort(generateMarkers(count, args.seed)))
+        seconds = perf_counter() - start
+        if verified != count: raise Exception("Sorted {0} markers out of {1}".format(verified, count))
+
+        report = {
+            'version': RESULTS_VERSION,
+            'commit': gitCommit(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': python_version(),
+            'platform': platform(),
+            'markers': count,
+            'spillMarkers': spill,
+            'memoryCapMB': args.memory_cap,
+            'seconds': seconds,
+            'runs': sorter.mRunCount,
+            'mergePasses': sorter.mMergePasses,
+            'peakMemoryMB': peakMemoryMB(),
+        }
+        print("Sorted and verified {0} markers in {1:.2f}s ({2:.2f}us per marker), {3} spilled runs, {4} merge passes{5}".format(
+            count, seconds, seconds * 1e6 / max(count, 1), sorter.mRunCount, sorter.mMergePasses,
+            "" if report['peakMemoryMB'] == None else ", peak memory {0:.0f}MB".format(report['peakMemoryMB'])))
+
+        outPath = Path(args.output) if args.output else BENCHMARKS_DIR / 'results' / "sort-{0}.json".format(report['commit'] or 'local')
+        outPath.parent.mkdir(parents=True, exist_ok=True)
+        outPath.write_text(json.dumps(report, indent=2))
+        print("Results written to {0}".format(outPath))
+    except MemoryError:
+        print("Exception caught by main: ran out of memory, lower --spill or raise --memory-cap")
+        exit(1)
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
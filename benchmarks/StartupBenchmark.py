@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from math import sqrt
+from pathlib import Path
+from platform import platform, python_version
+from subprocess import DEVNULL, PIPE, run
+from sys import exit, executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+import sys
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+from RunBenchmarks import gitCommit
+from SyntheticLogs import LogProfile, ensureSamples
+
+
+# Cold start latency of the tools: hyperfine-style wall clock timing of whole processes converting
+# a small sample (warmup runs, then mean, deviation, min and max of the measured ones) and the
+# import time breakdown of python -X importtime. Scripts are run with the current interpreter from
+# --root (this checkout by default, so other commits can be measured from a worktree); frozen
+# executables are timed too when --frozen points at the PyInstaller output directory.
+RESULTS_VERSION = 1
+SAMPLE_MARKERS = 100
+TOOLS = ('InfoWriterToEDL', 'EDLToYouTubeTimestamp')
+ENTRY_POINT = 'HandyHelpers'
+# commands of the warm batch run, per command time is the run time divided by this
+BATCH_COMMANDS = 20
+
+
+def timeCommand(argv: list[str], runs: int, warmup: int, inputText: str | None = None):
+    samples = []
+    for i in range(warmup + runs):
+        start = perf_counter()
+        result = run(argv, input=inputText, stdin=None if inputText != None else DEVNULL, stdout=DEVNULL, stderr=PIPE, text=True)
+        seconds = perf_counter() - start
+        if result.returncode != 0: raise Exception("{0} failed with {1}: {2}".format(' '.join(argv), result.returncode, result.stderr.strip()))
+        if i >= warmup: samples.append(seconds)
+
+    mean = sum(samples) / len(samples)
+    deviation = sqrt(sum((s - mean) ** 2 for s in samples) / (len(samples) - 1)) if len(samples) > 1 else 0.0
+    return {'mean': mean, 'stddev': deviation, 'min': min(samples), 'max': max(samples), 'runs': len(samples)}
+
+# returns (total microseconds, [(self us, cumulative us, module)] of the slowest modules by self time)
+def importTimes(root: Path, module: str, top: int):
+    result = run([executable, '-X', 'importtime', '-c', 'import {0}'.format(module)], cwd=root, stdin=DEVNULL, stdout=DEVNULL, stderr=PIPE, text=True)
+    if result.returncode != 0: raise Exception("Importing {0} failed: {1}".format(module, result.stderr.strip()))
+
+    modules = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line: continue
+        selfTime, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        modules.append((int(selfTime), int(cumulative), name.strip()))
+        if name == module: total = int(cumulative)
+    modules.sort(reverse=True)
+    return total, modules[:top]
+
+def printTiming(label: str, timing: dict):
+    print("  {0:44s} {1:8.1f}ms ± {2:6.1f}ms  (min {3:7.1f}ms, max {4:7.1f}ms, {5} runs)".format(
+        label, timing['mean'] * 1000, timing['stddev'] * 1000, timing['min'] * 1000, timing['max'] * 1000, timing['runs']), flush=True)
+
+def frozenExecutable(directory: Path, name: str):
+    for candidate in (directory / name, directory / (name + '.exe')):
+        if candidate.exists(): return candidate
+    return None
+
+
+def main():
+    try:
+        parser = ArgumentParser(
+            prog='StartupBenchmark',
+            description='Measures cold start latency of InfoWriterToEDL and EDLToYouTubeTimestamp scripts and frozen executables'
+        )
+        parser.add_argument('-r', '--runs', type=int, default=20, help='Measured runs per command (default 20)')
+        parser.add_argument('-w', '--warmup', type=int, default=3, help='Unmeasured runs before measuring, warming the file system cache (default 3)')
+        parser.add_argument('--root', default=str(BENCHMARKS_DIR.parent), help='Directory with the scripts (defaults to this checkout)')
+        parser.add_argument('--frozen', help='PyInstaller output directory with the executables, ex. dist/handy-helpers')
+        parser.add_argument('--top', type=int, default=10, help='Slowest modules listed per -X importtime breakdown (default 10)')
+        parser.add_argument('-d', '--data-dir', default=str(BENCHMARKS_DIR / 'data'), help='Directory of generated samples, reused between runs')
+        parser.add_argument('-o', '--output', help='JSON results path (defaults to results/startup-<commit>.json next to this script)')
+        args = parser.parse_args()
+
+        root = Path(args.root).resolve()
+        logPath, edlPath = ensureSamples(LogProfile(SAMPLE_MARKERS), Path(args.data_dir))
+        inputs = {'InfoWriterToEDL': logPath, 'EDLToYouTubeTimestamp': edlPath}
+        commands = {'InfoWriterToEDL': 'infowriter', 'EDLToYouTubeTimestamp': 'youtube'}
+        report = {
+            'version': RESULTS_VERSION,
+            'commit': gitCommit(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': python_version(),
+            'platform': platform(),
+            'root': str(root),
+            'timings': {},
+            'imports': {},
+        }
+
+        hasEntryPoint = (root / (ENTRY_POINT + '.py')).exists()
+        with TemporaryDirectory() as outDir:
+            def convertArgs(tool: str):
+                return ['-c', '-y', '--no-cache', '-j', '1', '-o', str(Path(outDir) / (tool + '.out')), str(inputs[tool])]
+
+            def measure(label: str, argv: list[str], inputText: str | None = None):
+                timing = timeCommand(argv, args.runs, args.warmup, inputText)
+                report['timings'][label] = timing
+                printTiming(label, timing)
+                return timing
+
+            print("Wall clock, converting {0} markers:".format(SAMPLE_MARKERS))
+            measure('python (no imports)', [executable, '-c', 'pass'])
+            for tool in TOOLS:
+                measure("{0} --help".format(tool), [executable, str(root / (tool + '.py')), '--help'])
+                measure("{0} script".format(tool), [executable, str(root / (tool + '.py'))] + convertArgs(tool))
+                if hasEntryPoint:
+                    measure("{0} {1} script".format(ENTRY_POINT, commands[tool]), [executable, str(root / (ENTRY_POINT + '.py')), commands[tool]] + convertArgs(tool))
+                    batch = ''.join("{0} {1}\n".format(commands[tool], ' '.join('"{0}"'.format(a) for a in convertArgs(tool))) for _ in range(BATCH_COMMANDS))
+                    timing = measure("{0} batch x{1}".format(ENTRY_POINT, BATCH_COMMANDS), [executable, str(root / (ENTRY_POINT + '.py')), 'batch'], batch)
+                    print("  {0:44s} {1:8.1f}ms per file".format('', timing['mean'] * 1000 / BATCH_COMMANDS))
+
+                if args.frozen:
+                    executablePath = frozenExecutable(Path(args.frozen), tool)
+                    if executablePath == None: print("  {0} executable not found in {1}".format(tool, args.frozen))
+                    else: measure("{0} frozen".format(tool), [str(executablePath)] + convertArgs(tool))
+
+        print("\nImport time (-X importtime):")
+        for tool in TOOLS + ((ENTRY_POINT,) if hasEntryPoint else ()):
+            total, modules = importTimes(root, tool, args.top)
+            report['imports'][tool] = {'totalMicroseconds': total, 'slowest': [{'module': m, 'self': s, 'cumulative': c} for s, c, m in modules]}
+            print("  {0}: {1:.1f}ms".format(tool, total / 1000))
+            for selfTime, cumulative, module in modules:
+                print("    {0:8.1f}ms self {1:8.1f}ms cumulative  {2}".format(selfTime / 1000, cumulative / 1000, module))
+
+        outPath = Path(args.output) if args.output else BENCHMARKS_DIR / 'results' / "startup-{0}.json".format(report['commit'] or 'local')
+        outPath.parent.mkdir(parents=True, exist_ok=True)
+        outPath.write_text(json.dumps(report, indent=2))
+        print("Results written to {0}".format(outPath))
+    except Exception as e:
+        print("Exception caught by main: {0}".format(e))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
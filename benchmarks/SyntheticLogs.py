@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+from random import Random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from MarkerFormats import formatEDLEvent, formatEDLHeader
+from TimestampTable import TimestampColor
+
+
+# Seeded generator of realistic InfoWriter logs and matching EDL marker lists. Same seed and
+# parameters always give byte-identical files, so benchmark runs on different commits compare.
+#
+# Logs mix EVENT lines (fixed OBS-like events and scene changes) with HOTKEY markers whose names
+# follow a Zipf distribution, like real sessions where a few hotkeys are pressed most of the time.
+# Every marker has a Record time line; a Stream time line is added for part of them, and the
+# date suffix used by --full is always present.
+GENERATOR_VERSION = 1
+WRITE_BATCH_SIZE = 1 << 14
+EVENT_NAMES = ['START RECORDING', 'START STREAMING', 'SCENE CHANGED TO Gameplay', 'SCENE CHANGED TO Chatting',
+               'SCENE CHANGED TO BRB', 'PAUSE RECORDING', 'RESUME RECORDING']
+SESSION_START = datetime(2024, 1, 1, 18, 0, 0)
+
+
+class LogProfile:
+    def __init__(self, markers: int, seed: int = 1, names: int = 200, skew: float = 1.1, hotkeyRatio: float = 0.8,
+                 streamRatio: float = 0.5):
+        self.mMarkers = markers
+        self.mSeed = seed
+        self.mNames = names
+        self.mSkew = skew
+        self.mHotkeyRatio = hotkeyRatio
+        self.mStreamRatio = streamRatio
+
+    # file name stem unique for the generated content
+    def stem(self):
+        return "iw{0}_m{1}_n{2}_z{3:g}_h{4:g}_s{5:g}_r{6}".format(GENERATOR_VERSION, self.mMarkers, self.mNames, self.mSkew,
+                                                                 self.mHotkeyRatio, self.mStreamRatio, self.mSeed)
+
+    def hotkeyNames(self):
+        return ["Hotkey {0}".format(i + 1) for i in range(self.mNames)]
+
+    # cumulative Zipf weights of hotkey names, for Random.choices
+    def hotkeyWeights(self):
+        return list(accumulate(1.0 / (rank + 1) ** self.mSkew for rank in range(self.mNames)))
+
+
+# yields (kind, name, record seconds, stream seconds or None, wall clock datetime) per marker
+def iterMarkers(profile: LogProfile):
+    rnd = Random(profile.mSeed)
+    names = profile.hotkeyNames()
+    weights = profile.hotkeyWeights()
+    recordTime = 0
+    streamOffset = rnd.randint(0, 3600)
+    remaining = profile.mMarkers
+    while remaining > 0:
+        batch = min(remaining, WRITE_BATCH_SIZE)
+        remaining -= batch
+        for hotkeyName in rnd.choices(names, cum_weights=weights, k=batch):
+            recordTime += rnd.randint(1, 45)
+            if rnd.random() < profile.mHotkeyRatio: kind, name = 'HOTKEY', hotkeyName
+            else: kind, name = 'EVENT', rnd.choice(EVENT_NAMES)
+            streamTime = recordTime + streamOffset if rnd.random() < profile.mStreamRatio else None
+            yield kind, name, recordTime, streamTime, SESSION_START + timedelta(seconds=recordTime)
+
+def secondsToLogTime(seconds: int):
+    m, sec = divmod(seconds, 60)
+    hr, min = divmod(m, 60)
+    return "{0:d}:{1:02d}:{2:02d}".format(hr, min, sec)
+
+def writeInfoWriterLog(profile: LogProfile, path: Path):
+    with open(path, "w", newline='\n') as file:
+        lines = []
+        for kind, name, recordTime, streamTime, wallClock in iterMarkers(profile):
+            lines.append("{0}:{1} @ {2:%Y-%m-%d %H:%M:%S}\n".format(kind, name, wallClock))
+            lines.append("{0} Record Time Marker\n".format(secondsToLogTime(recordTime)))
+            if streamTime != None: lines.append("{0} Stream Time Marker\n".format(secondsToLogTime(streamTime)))
+            lines.append("\n")
+            if len(lines) >= WRITE_BATCH_SIZE:
+                file.write(''.join(lines))
+                lines.clear()
+        file.write(''.join(lines))
+
+# EDL with the log's Record markers, as InfoWriterToEDL would export them, colored per name
+def writeEDL(profile: LogProfile, path: Path):
+    colors = [c for c in TimestampColor if c != TimestampColor.Unknown]
+    nameColors = {}
+    with open(path, "w", newline='\n') as file:
+        events = [formatEDLHeader(profile.stem())]
+        ordinal = 1
+        for kind, name, recordTime, streamTime, wallClock in iterMarkers(profile):
+            color = nameColors.get(name)
+            if color == None: color = nameColors[name] = colors[len(nameColors) % len(colors)]
+            events.append(formatEDLEvent(ordinal, name, recordTime, color))
+            ordinal += 1
+            if len(events) >= WRITE_BATCH_SIZE:
+                file.write(''.join(events))
+                events.clear()
+        file.write(''.join(events))
+
+# returns (log path, EDL path) of the profile in directory, generating files which do not exist yet
+def ensureSamples(profile: LogProfile, directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    logPath = directory / (profile.stem() + ".txt")
+    edlPath = directory / (profile.stem() + ".edl")
+    for path, write in ((logPath, writeInfoWriterLog), (edlPath, writeEDL)):
+        if path.exists(): continue
+        tempPath = path.with_name(path.name + ".tmp")
+        write(profile, tempPath)
+        tempPath.replace(path)
+    return logPath, edlPath
+
+
+def main():
+    parser = ArgumentParser(
+        prog='SyntheticLogs',
+        description='Generates seeded synthetic InfoWriter logs and matching EDL files for benchmarking'
+    )
+    parser.add_argument('markers', type=int, help='Amount of markers to generate')
+    parser.add_argument('-d', '--directory', default='.', help='Output directory (defaults to current directory)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default 1)')
+    parser.add_argument('--names', type=int, default=200, help='Amount of distinct hotkey names (default 200)')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of hotkey name popularity, 0 for uniform (default 1.1)')
+    parser.add_argument('--hotkey-ratio', type=float, default=0.8, help='Share of HOTKEY markers, the rest are EVENTs (default 0.8)')
+    parser.add_argument('--stream-ratio', type=float, default=0.5, help='Share of markers with a Stream time line (default 0.5)')
+    args = parser.parse_args()
+
+    profile = LogProfile(args.markers, args.seed, args.names, args.skew, args.hotkey_ratio, args.stream_ratio)
+    for path in ensureSamples(profile, Path(args.directory)):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
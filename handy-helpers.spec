@@ -1,5 +1,8 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# optimize=2 compiles the bundled modules without asserts and docstrings, which none of the tools
+# rely on. HandyHelpers imports the tools by name when their command runs, hence hiddenimports.
+
 
 InfoWriterToEDL = Analysis(
     ['InfoWriterToEDL.py'],
@@ -12,7 +15,7 @@ InfoWriterToEDL = Analysis(
     runtime_hooks=[],
     excludes=[],
     noarchive=False,
-    optimize=0,
+    optimize=2,
 )
 InfoWriterToEDL_pyz = PYZ(InfoWriterToEDL.pure)
 
@@ -45,7 +48,7 @@ EDLToYouTubeTimestamp = Analysis(
     runtime_hooks=[],
     excludes=[],
     noarchive=False,
-    optimize=0,
+    optimize=2,
 )
 EDLToYouTubeTimestamp_pyz = PYZ(EDLToYouTubeTimestamp.pure)
 
@@ -67,13 +70,85 @@ EDLToYouTubeTimestamp_exe = EXE(
     entitlements_file=None,
 )
 
+WatchFolderService = Analysis(
+    ['WatchFolderService.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=2,
+)
+WatchFolderService_pyz = PYZ(WatchFolderService.pure)
+
+WatchFolderService_exe = EXE(
+    WatchFolderService_pyz,
+    WatchFolderService.scripts,
+    [],
+    exclude_binaries=True,
+    name='WatchFolderService',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+HandyHelpers = Analysis(
+    ['HandyHelpers.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=['InfoWriterToEDL', 'EDLToYouTubeTimestamp', 'WatchFolderService'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=2,
+)
+HandyHelpers_pyz = PYZ(HandyHelpers.pure)
+
+HandyHelpers_exe = EXE(
+    HandyHelpers_pyz,
+    HandyHelpers.scripts,
+    [],
+    exclude_binaries=True,
+    name='HandyHelpers',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
 coll = COLLECT(
     InfoWriterToEDL_exe,
     EDLToYouTubeTimestamp_exe,
+    WatchFolderService_exe,
+    HandyHelpers_exe,
     InfoWriterToEDL.binaries,
     InfoWriterToEDL.datas,
     EDLToYouTubeTimestamp.binaries,
     EDLToYouTubeTimestamp.datas,
+    WatchFolderService.binaries,
+    WatchFolderService.datas,
+    HandyHelpers.binaries,
+    HandyHelpers.datas,
     strip=False,
     upx=True,
     upx_exclude=[],